@@ -1,10 +1,14 @@
 from __future__ import print_function, division 
 from .tcpipclient import connect
 from .tcpipclient_parsed import connect_parse
+from .tcpipclient_async import connect_parse_async, serve_agents
+from .framing import FrameDecoder, iter_frames, iter_packets
 from . import templatetalkfactory 
 from . import templatewhisperfactory 
 from . import contentbuilder 
 from .gameinfoparser import GameInfoParser
-from .read_log import read_log
+from .read_log import read_log, read_logs, iter_log
+# the offline tools (aiwolfpy.ingest, .query, .features, .scoring, ...) are
+# imported from their modules, agents do not load them
 
 
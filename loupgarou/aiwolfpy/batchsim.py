@@ -0,0 +1,407 @@
+# -*- coding: utf-8 -*-
+"""
+BatchSim
+
+Self-play of thousands of games at once: the game loop of aiwolfpy.server
+(deal, talks, vote and execution, divine, guard, attack) on NumPy arrays with
+a leading game dimension, and the decisions of villager_agent.SampleAgent as
+array functions over them, for screening heuristics before protocol runs.
+
+What is public is shared by every player of a game:
+
+    E [game, target, speaker]   ESTIMATE talks, +1 VILLAGER, -1 WEREWOLF
+    H [game, target, speaker]   votes, COMINGOUT, DIVINED, IDENTIFIED, GUARDED
+
+so that a player's info_table is estimate_weight * E + vote_weight * H, and
+minimal_score is a batched matmul of it with the column weights of each
+player (seer_value, medium_value, bg_value of the uncontested claimants,
+suspect_value of contested ones, negative for the black list). Each player
+has its own parameters (AgentParams or dicts of aiwolfpy.params names, one
+set per entry of params, chosen by assign), so a candidate can play against
+the defaults.
+
+Not mirrored: the role inference, the Monte Carlo and endgame searches and
+the opening book; ties are broken by the lowest index as np.argmin does.
+Every living player talks in each of the maxTalk rounds of a day, as
+SampleAgent never says Over.
+
+The players are therefore SampleAgent's fallbacks, what it does when its
+inference has no beliefs (RoleInference.solve returning None): vote and
+attack its current target, divine by minimal_score, guard the uncontested
+claimant. Village win rates of 15 player games, the protocol ones on
+aiwolfpy.server without timeLimit (time_budget=None):
+
+    SampleAgent, fallbacks only    0.965 of 200 games
+    batchsim                       0.979 of 20000 games
+    SampleAgent                    0.227 of 300 games
+
+SampleAgent as it plays votes, attacks and guards by the search over the
+worlds of its inference, which reads claims and reported results but not
+the table, so the parameters reach its talks and the seer's reports much
+more than its decisions. Confirm what a sweep finds here with protocol games
+(aiwolfpy.sweep --tournament).
+
+usage: python -m aiwolfpy.batchsim [-g GAMES] [-b BATCH] [-n PLAYERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import time
+from .params import DEFAULTS
+from .server import ROLES, ROLE_NUM_MAPS, DEFAULT_SETTING
+
+VILLAGER, SEER, MEDIUM, BODYGUARD, POSSESSED, WEREWOLF = range(len(ROLES))
+VILLAGE, WEREWOLVES = 0, 1
+# SampleAgent's constants
+DEFAULT_PARAMS = DEFAULTS
+
+
+def _pick(mask, rng):
+    # a random True index of each row of mask [..., N], -1 where there is none
+    import numpy as np
+    keys = np.where(mask, rng.random_sample(mask.shape), -1.0)
+    choice = keys.argmax(axis=-1)
+    return np.where(mask.any(axis=-1), choice, -1)
+
+
+def _plurality(votes, valid, n, rng):
+    '''
+    most voted target of each game (random among ties), -1 without votes;
+    votes [B, N] target of each voter, valid [B, N] votes that count
+    '''
+    import numpy as np
+    b = np.arange(votes.shape[0])[:, None]
+    counts = np.zeros((votes.shape[0], n))
+    np.add.at(counts, (np.broadcast_to(b, votes.shape)[valid], votes[valid]), 1)
+    choice = (counts + rng.random_sample(counts.shape) * 0.5).argmax(axis=1)
+    return np.where(counts.max(axis=1) > 0, choice, -1)
+
+
+class BatchGames(object):
+
+    def __init__(self, size, player_num=15, role_num_map=None, params=None, assign=None, seed=None):
+        import numpy as np
+        self.rng = np.random.RandomState(seed)
+        self.size, self.n = size, player_num
+        role_num_map = role_num_map or ROLE_NUM_MAPS[player_num]
+        deck = np.repeat(np.arange(len(ROLES)), [role_num_map.get(r, 0) for r in ROLES])
+        if len(deck) != player_num:
+            raise ValueError("no roleNumMap for {0} players".format(player_num))
+        self.role = deck[self.rng.random_sample((size, player_num)).argsort(axis=1)].astype(np.int8)
+        self.wolves_total = int(role_num_map.get("WEREWOLF", 0))
+        # parameters of each player, [B, N] per name
+        params = params or [{}]
+        assign = np.zeros((size, player_num), dtype=np.int8) if assign is None else np.asarray(assign)
+        self.assign = np.broadcast_to(assign, (size, player_num))
+        self.p = {}
+        params = [ps.as_dict() if hasattr(ps, "as_dict") else ps for ps in params]
+        for name, default in DEFAULT_PARAMS.items():
+            values = np.array([ps.get(name, default) for ps in params], dtype=np.float32)
+            self.p[name] = values[self.assign]
+        self.alive = np.ones((size, player_num), dtype=bool)
+        self.winner = np.full(size, -1, dtype=np.int8)
+        self.days = np.zeros(size, dtype=np.int16)
+        self.day = 0
+        self.E = np.zeros((size, player_num, player_num), dtype=np.float32)
+        self.H = np.zeros((size, player_num, player_num), dtype=np.float32)
+        # claims seen in talks
+        self.claims = np.zeros((3, size, player_num), dtype=bool)
+        # accused[b, o, s]: s said it divined o as a werewolf
+        self.accused = np.zeros((size, player_num, player_num), dtype=bool)
+        # known[b, o, t]: what o learned of t by divine or identify, +1 human, -1 werewolf
+        self.known = np.zeros((size, player_num, player_num), dtype=np.int8)
+        self.guarded = np.full(size, -1)
+        self.no_dead = np.zeros(size, dtype=bool)
+        self.b = np.arange(size)
+
+    # views
+
+    def running(self):
+        return self.winner < 0
+
+    def view(self):
+        '''
+        column weights W [B, o, s], black and white lists [B, o, s] of each player
+        '''
+        import numpy as np
+        n, role, p = self.n, self.role, self.p
+        eye = np.eye(n, dtype=bool)[None]
+        black = self.known == -1
+        for claimed, own in zip(self.claims, (SEER, MEDIUM, BODYGUARD)):
+            # the holder of a role knows every other claimant is lying
+            black |= (role == own)[:, :, None] & claimed[:, None, :]
+        black |= self.accused & (role != WEREWOLF)[:, :, None]
+        black &= ~eye
+        W = np.ones((self.size, n, n), dtype=np.float32)
+        white = np.zeros_like(black)
+        suspect = np.zeros_like(black)
+        for claimed, name in zip(self.claims, ("seer_value", "medium_value", "bg_value")):
+            total = claimed.sum(axis=1)
+            if not total.any():
+                continue
+            uncontested = (total == 1)[:, None, None] & claimed[:, None, :] & ~black
+            np.multiply(W, p[name][:, :, None], out=W, where=uncontested)
+            contested = (total > 1)[:, None, None] & claimed[:, None, :] & ~black
+            clear = contested.sum(axis=2, keepdims=True) == 1
+            white |= contested & clear
+            suspect |= contested & ~clear
+        np.negative(W, out=W, where=black)
+        np.multiply(W, p["suspect_value"][:, :, None], out=W, where=suspect)
+        # our own talks are skipped
+        W[:, eye[0]] = 0
+        return W, black, white
+
+    def scores(self, W, white):
+        '''
+        minimal_score before the choice: [B, o, t]
+        '''
+        import numpy as np
+        E = np.matmul(W, self.E.transpose(0, 2, 1))
+        H = np.matmul(W, self.H.transpose(0, 2, 1))
+        p = self.p
+        S = p["estimate_weight"][:, :, None] * E + p["vote_weight"][:, :, None] * H
+        np.multiply(S, p["white_value"][:, :, None], out=S, where=white)
+        return S
+
+    def targets(self):
+        '''
+        current target of each player [B, N]: a living black-listed player
+        first, then the lowest score (highest for the possessed), for the
+        werewolves the human whose statements are closest to the truth
+        '''
+        import numpy as np
+        W, black, white = self.view()
+        S = self.scores(W, white)
+        n = self.n
+        others = self.alive[:, None, :] & ~np.eye(n, dtype=bool)[None]
+        low = np.where(others, S, np.inf).argmin(axis=2)
+        high = np.where(others, S, -np.inf).argmax(axis=2)
+        living_black = black & others
+        first_black = np.where(living_black.any(axis=2), living_black.argmax(axis=2), -1)
+        target = np.where(first_black >= 0, first_black, low)
+        target = np.where((self.role == POSSESSED) & (first_black < 0), high, target)
+        # sum_t |100 truth_t - table_ts| = 100 N - sum_t truth_t table_ts while |table| < 100
+        truth = np.where(self.role == WEREWOLF, -1.0, 1.0).astype(np.float32)
+        agree_e = np.einsum("bt,bts->bs", truth, self.E)
+        agree_h = np.einsum("bt,bts->bs", truth, self.H)
+        p = self.p
+        agree = p["estimate_weight"][:, :, None] * agree_e[:, None, :] + p["vote_weight"][:, :, None] * agree_h[:, None, :]
+        prey = others & (self.role != WEREWOLF)[:, None, :]
+        wolf_target = np.where(prey, agree, -np.inf).argmax(axis=2)
+        target = np.where(self.role == WEREWOLF, wolf_target, target)
+        return target, black, white
+
+    # phases
+
+    def say(self, table, target, speaker, value, mask):
+        import numpy as np
+        b = np.broadcast_to(self.b[:, None], mask.shape)[mask]
+        np.add.at(table, (b, target[mask], speaker[mask]), value)
+
+    def talk_round(self):
+        import numpy as np
+        n, role, p = self.n, self.role, self.p
+        target, black, white = self.targets()
+        speaking = self.alive & self.running()[:, None]
+        u = self.rng.random_sample((self.size, n))
+        me = np.broadcast_to(np.arange(n), (self.size, n))
+        wolf = role == WEREWOLF
+        self.say(self.E, target, me, -1, speaking & wolf & (u < p["wolf_estimate_p"]))
+        self.say(self.H, target, me, -1, speaking & wolf & (u > p["wolf_comingout_p"]))
+        rest = speaking & ~wolf
+
+        # a seer or medium who knows half of the werewolves reveals them
+        own = self.known
+        known_wolves = (own == -1).sum(axis=2)
+        reveal = rest & ((role == SEER) | (role == MEDIUM)) & (known_wolves >= 0.5 * self.wolves_total)
+        human = _pick(own == 1, self.rng)
+        living_wolf = _pick((own == -1) & self.alive[:, None, :], self.rng)
+        any_wolf = _pick(own == -1, self.rng)
+        say_human = reveal & (u < p["reveal_villager_p"]) & (human >= 0)
+        say_wolf = reveal & ~say_human & (living_wolf >= 0)
+        say_identified = reveal & ~say_human & ~say_wolf & (role == MEDIUM)
+        self.say(self.H, human, me, 1, say_human)
+        self.say(self.H, living_wolf, me, -1, say_wolf)
+        self.say(self.H, any_wolf, me, -1, say_identified)
+        self.claims[0] |= say_human | say_wolf
+        self.claims[1] |= say_identified
+        b = np.broadcast_to(self.b[:, None], say_wolf.shape)
+        self.accused[b[say_wolf], living_wolf[say_wolf], me[say_wolf]] = True
+        rest &= ~(say_human | say_wolf | say_identified)
+
+        # a bodyguard after a night without dead says whom it guarded
+        guard_talk = rest & (role == BODYGUARD) & (self.no_dead & (self.guarded >= 0))[:, None]
+        self.say(self.H, np.broadcast_to(self.guarded[:, None], (self.size, n)), me, 1, guard_talk)
+        self.claims[2] |= guard_talk
+        rest &= ~guard_talk
+
+        target_black = black[self.b[:, None], me, target]
+        estimate = rest & (u > p["estimate_p"])
+        self.say(self.H, target, me, -1, estimate & target_black)
+        self.say(self.E, target, me, -1, estimate & ~target_black)
+        friend = _pick(white, self.rng)
+        praise = rest & ~estimate & (u < p["estimate_villager_p"]) & (friend >= 0)
+        self.say(self.E, friend, me, 1, praise)
+        self.say(self.H, me, me, 1, rest & ~estimate & ~praise)
+
+    def vote(self):
+        import numpy as np
+        target, _, _ = self.targets()
+        voting = self.alive & self.running()[:, None]
+        self.say(self.H, target, np.broadcast_to(np.arange(self.n), target.shape), -1, voting)
+        executed = _plurality(target, voting, self.n, self.rng)
+        hit = executed >= 0
+        self.alive[self.b[hit], executed[hit]] = False
+        # the medium identifies the executed player
+        medium = (self.role == MEDIUM) & self.alive
+        has = hit & medium.any(axis=1)
+        m = medium.argmax(axis=1)
+        species = np.where(self.role[self.b, executed] == WEREWOLF, -1, 1)
+        self.known[self.b[has], m[has], executed[has]] = species[has]
+
+    def divine(self):
+        import numpy as np
+        W, _, white = self.view()
+        S = np.abs(self.scores(W, white))
+        seer = (self.role == SEER) & self.alive & self.running()[:, None]
+        has = seer.any(axis=1)
+        s = seer.argmax(axis=1)
+        mine = self.known[self.b, s]
+        candidates = self.alive & (mine == 0)
+        candidates[self.b, s] = False
+        choice = np.where(candidates, S[self.b, s], np.inf).argmin(axis=1)
+        has &= candidates.any(axis=1)
+        species = np.where(self.role[self.b, choice] == WEREWOLF, -1, 1)
+        self.known[self.b[has], s[has], choice[has]] = species[has]
+
+    def guard(self):
+        '''
+        the uncontested seer claimant, else the uncontested medium claimant,
+        else no one (SampleAgent guards itself, which the server refuses)
+        '''
+        import numpy as np
+        bodyguard = (self.role == BODYGUARD) & self.alive & self.running()[:, None]
+        has = bodyguard.any(axis=1)
+        g = bodyguard.argmax(axis=1)
+        others = self.alive.copy()
+        others[self.b, g] = False
+        choice = np.full(self.size, -1)
+        for claimed in (self.claims[1], self.claims[0]):
+            uncontested = (claimed.sum(axis=1) == 1)
+            claimant = claimed.argmax(axis=1)
+            ok = uncontested & others[self.b, claimant]
+            choice = np.where(ok, claimant, choice)
+        self.guarded = np.where(has, choice, -1)
+
+    def attack(self):
+        import numpy as np
+        target, _, _ = self.targets()
+        wolves = (self.role == WEREWOLF) & self.alive & self.running()[:, None]
+        attacked = _plurality(target, wolves, self.n, self.rng)
+        hit = (attacked >= 0) & (attacked != self.guarded)
+        self.alive[self.b[hit], attacked[hit]] = False
+        self.no_dead = ~hit
+
+    def check(self):
+        import numpy as np
+        wolves = (self.alive & (self.role == WEREWOLF)).sum(axis=1)
+        humans = (self.alive & (self.role != WEREWOLF)).sum(axis=1)
+        running = self.running()
+        self.winner[running & (wolves == 0)] = VILLAGE
+        self.winner[running & (wolves > 0) & (wolves >= humans)] = WEREWOLVES
+        self.days[running] = self.day
+
+    def play(self, talks=DEFAULT_SETTING["maxTalk"], max_days=20):
+        '''
+        play every game to its end (or max_days), returns the winners [B]
+        '''
+        self.divine()
+        for day in range(1, max_days + 1):
+            self.day = day
+            if not self.running().any():
+                break
+            for _ in range(talks):
+                self.talk_round()
+            self.vote()
+            self.divine()
+            self.guard()
+            self.attack()
+            self.check()
+            running = self.running()
+            if 0 < running.sum() < 0.75 * len(running):
+                self.retire(running)
+        self.retire(self.running() & False)
+        return self.winner
+
+    def retire(self, keep):
+        '''
+        drop the games not in keep from the state, the later days run on the
+        games still going; once all are dropped, role, assign, winner and
+        days are back to the whole batch
+        '''
+        import numpy as np
+        if not hasattr(self, "result"):
+            self.result = {"index": np.arange(self.size), "role": self.role, "assign": self.assign,
+                           "winner": self.winner.copy(), "days": self.days.copy()}
+            self.index = self.result["index"]
+        gone = self.index[~keep]
+        self.result["winner"][gone] = self.winner[~keep]
+        self.result["days"][gone] = self.days[~keep]
+        if not keep.any():
+            for name in ("role", "assign", "winner", "days"):
+                setattr(self, name, self.result[name])
+            self.size = len(self.role)
+            return
+        for name in ("index", "role", "assign", "alive", "winner", "days", "E", "H", "accused", "known",
+                     "guarded", "no_dead"):
+            setattr(self, name, getattr(self, name)[keep])
+        self.claims = self.claims[:, keep]
+        self.p = dict((name, values[keep]) for name, values in self.p.items())
+        self.size = int(keep.sum())
+        self.b = np.arange(self.size)
+
+    def won(self):
+        '''
+        [B, N] players whose team won
+        '''
+        import numpy as np
+        team = np.where((self.role == WEREWOLF) | (self.role == POSSESSED), WEREWOLVES, VILLAGE)
+        return team == self.winner[:, None]
+
+
+def simulate(games, player_num=15, role_num_map=None, params=None, assign=None, seed=None, batch=1024,
+             talks=DEFAULT_SETTING["maxTalk"]):
+    '''
+    winner [G], days [G], role [G, N], won [G, N] of games played in batches
+    '''
+    import numpy as np
+    rng = np.random.RandomState(seed)
+    parts = []
+    for start in range(0, games, batch):
+        size = min(batch, games - start)
+        part_assign = None if assign is None else np.asarray(assign)[start:start + size] \
+            if np.ndim(assign) == 2 else assign
+        sim = BatchGames(size, player_num, role_num_map, params, part_assign, rng.randint(1 << 31))
+        sim.play(talks)
+        parts.append({"winner": sim.winner, "days": sim.days, "role": sim.role, "won": sim.won()})
+    return dict((k, np.concatenate([p[k] for p in parts])) for k in parts[0])
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="batched self-play of the sample agent's heuristics")
+    argparser.add_argument("-g", type=int, dest="games", default=100000)
+    argparser.add_argument("-b", type=int, dest="batch", default=1024)
+    argparser.add_argument("-n", type=int, dest="players", default=15)
+    argparser.add_argument("-s", type=int, dest="seed", default=0)
+    args = argparser.parse_args(argv)
+    start = time.perf_counter()
+    result = simulate(args.games, args.players, seed=args.seed, batch=args.batch)
+    elapsed = time.perf_counter() - start
+    village = float((result["winner"] == VILLAGE).mean())
+    print("{0} games in {1:.1f} s: {2:.0f} games/s ({3:.2f} M/hour), village won {4:.3f}, {5:.2f} days".format(
+        args.games, elapsed, args.games / elapsed, args.games / elapsed * 3600 / 1e6, village,
+        result["days"].mean()))
+
+
+if __name__ == '__main__':
+    main()
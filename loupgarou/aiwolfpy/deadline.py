@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+"""
+Deadline
+
+Response budget for one request, derived from gameSetting["timeLimit"].
+Agents reach it as self.deadline and can check remaining() inside longer
+searches, and offer() the best answer found so far: if the budget runs out
+before the agent returns, that answer is sent instead.
+"""
+
+from __future__ import print_function, division
+import json
+from time import perf_counter
+from . import contentbuilder as cb
+
+# requests that must be answered within timeLimit
+DECISION_REQUESTS = ('VOTE', 'ATTACK', 'GUARD', 'DIVINE', 'TALK', 'WHISPER')
+TARGET_REQUESTS = ('VOTE', 'ATTACK', 'GUARD', 'DIVINE')
+
+
+class Deadline(object):
+
+    def __init__(self, fraction=0.8):
+        # fraction of timeLimit granted to the agent
+        self.fraction = fraction
+        self.limit = None
+        self.expires = None
+        self.best = None
+
+    def configure(self, game_setting):
+        # timeLimit is in ms, -1 when the server does not enforce one
+        time_limit = (game_setting or {}).get("timeLimit", -1)
+        if time_limit is None or time_limit <= 0 or self.fraction is None:
+            self.limit = None
+        else:
+            self.limit = time_limit / 1000.0 * self.fraction
+
+    def start(self, t_recv=None):
+        if t_recv is None:
+            t_recv = perf_counter()
+        self.expires = None if self.limit is None else t_recv + self.limit
+        self.best = None
+
+    def remaining(self):
+        # seconds left, inf when there is no time limit
+        if self.expires is None:
+            return float('inf')
+        return max(0.0, self.expires - perf_counter())
+
+    def expired(self):
+        return self.remaining() <= 0.0
+
+    def offer(self, answer):
+        # agentIdx for VOTE/ATTACK/GUARD/DIVINE, text for TALK/WHISPER
+        self.best = answer
+
+
+def fallback_answer(request, deadline, agent, base_info):
+    # best offered answer, else the cached target, else Skip / any living agent
+    answer = deadline.best
+    if request in TARGET_REQUESTS:
+        if answer is None:
+            answer = getattr(agent, "current_target", None)
+        if answer is None:
+            me = base_info.get("agentIdx")
+            alive = [int(k) for k, v in base_info.get("statusMap", {}).items() if v == "ALIVE" and int(k) != me]
+            answer = min(alive) if alive else me
+        return json.dumps({'agentIdx':int(answer)}, separators=(',', ':'))
+    if answer is None:
+        answer = cb.skip()
+    return answer
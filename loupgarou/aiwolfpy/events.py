@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+"""
+Events
+
+Typed records emitted by GameInfoParser next to its rows, for agents that
+do not want a DataFrame. Every event has day and agent; the other fields
+depend on the type. row() gives back the (day, type, idx, turn, agent, text)
+row the parser stores, and to_frame() builds a DataFrame (importing pandas
+only then).
+"""
+
+from __future__ import print_function, division
+
+
+def _agent(i):
+    return 'Agent[' + "{0:02d}".format(i) + ']'
+
+
+class Event(object):
+    __slots__ = ("day", "agent")
+    type = None
+
+    def __init__(self, day, agent):
+        self.day = day
+        self.agent = agent
+
+    def _values(self):
+        return [getattr(self, k) for c in type(self).__mro__ for k in getattr(c, "__slots__", ())]
+
+    def __repr__(self):
+        names = [k for c in reversed(type(self).__mro__) for k in getattr(c, "__slots__", ())]
+        return type(self).__name__ + "(" + ", ".join(k + "=" + repr(getattr(self, k)) for k in names) + ")"
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self._values() == other._values()
+
+    def __ne__(self, other):
+        return not self == other
+
+    def row(self):
+        return (self.day, self.type, 0, 0, self.agent, self.text())
+
+    def text(self):
+        return 'Over'
+
+
+class Initialize(Event):
+    # a role known at INITIALIZE (own role, fellow werewolves)
+    __slots__ = ("role",)
+    type = "initialize"
+
+    def __init__(self, day, agent, role):
+        Event.__init__(self, day, agent)
+        self.role = role
+
+    def row(self):
+        return (self.day, self.type, self.agent, 0, self.agent, self.text())
+
+    def text(self):
+        return 'COMINGOUT ' + _agent(self.agent) + ' ' + self.role
+
+
+class Finish(Initialize):
+    # roles revealed at FINISH
+    __slots__ = ()
+    type = "finish"
+
+
+class Talk(Event):
+    __slots__ = ("idx", "turn", "content")
+    type = "talk"
+
+    def __init__(self, day, agent, idx, turn, content):
+        Event.__init__(self, day, agent)
+        self.idx = idx
+        self.turn = turn
+        self.content = content
+
+    def row(self):
+        return (self.day, self.type, self.idx, self.turn, self.agent, self.content)
+
+    def text(self):
+        return self.content
+
+
+class Whisper(Talk):
+    __slots__ = ()
+    type = "whisper"
+
+
+class Vote(Event):
+    # turn is -1 for a revote
+    __slots__ = ("target", "turn")
+    type = "vote"
+
+    def __init__(self, day, agent, target, turn=0):
+        Event.__init__(self, day, agent)
+        self.target = target
+        self.turn = turn
+
+    def row(self):
+        return (self.day, self.type, 0, self.turn, self.agent, self.text())
+
+    def text(self):
+        return 'VOTE ' + _agent(self.target)
+
+
+class AttackVote(Vote):
+    __slots__ = ()
+    type = "attack_vote"
+
+    def text(self):
+        return 'ATTACK ' + _agent(self.target)
+
+
+class Execute(Event):
+    __slots__ = ()
+    type = "execute"
+
+
+class Dead(Event):
+    # idx is the position in lastDeadAgentList
+    __slots__ = ("idx",)
+    type = "dead"
+
+    def __init__(self, day, agent, idx=0):
+        Event.__init__(self, day, agent)
+        self.idx = idx
+
+    def row(self):
+        return (self.day, self.type, self.idx, 0, self.agent, 'Over')
+
+
+class Divine(Event):
+    __slots__ = ("target", "species")
+    type = "divine"
+
+    def __init__(self, day, agent, target, species):
+        Event.__init__(self, day, agent)
+        self.target = target
+        self.species = species
+
+    def text(self):
+        return 'DIVINED ' + _agent(self.target) + ' ' + self.species
+
+
+class Identify(Divine):
+    __slots__ = ()
+    type = "identify"
+
+    def text(self):
+        return 'IDENTIFIED ' + _agent(self.target) + ' ' + self.species
+
+
+class Guard(Event):
+    __slots__ = ("target",)
+    type = "guard"
+
+    def __init__(self, day, agent, target):
+        Event.__init__(self, day, agent)
+        self.target = target
+
+    def text(self):
+        return 'GUARDED ' + _agent(self.target)
+
+
+class Attack(Guard):
+    __slots__ = ()
+    type = "attack"
+
+    def text(self):
+        return 'ATTACK ' + _agent(self.target)
+
+
+EVENT_TYPES = dict((cls.type, cls) for cls in (Initialize, Finish, Talk, Whisper, Vote, AttackVote,
+                                                Execute, Dead, Divine, Identify, Guard, Attack))
+
+
+def to_frame(events):
+    import pandas as pd
+    rows = [e.row() for e in events]
+    columns = ("day", "type", "idx", "turn", "agent", "text")
+    return pd.DataFrame(dict((c, [r[i] for r in rows]) for i, c in enumerate(columns)),
+                        columns=list(columns))
@@ -0,0 +1,348 @@
+# -*- coding: utf-8 -*-
+"""
+Features
+
+Dense per-(game, day, agent) features of game logs, to train suspicion
+scorers. Everything is counted with bincount on the integer columns of the
+log cache (or of a read_log frame), never row by row:
+
+    X[game, day, agent, feature]   int16, FEATURES below
+    V[game, day, voter, target]    int8, votes cast on the day
+    y[game, agent]                 int8, true role (ROLES of aiwolfpy.query), -1 for no player
+
+Features of a day are what is known during its talks: talks and claims up to
+and including the day, votes and deaths up to the day before. Agents are
+0-based here (Agent[01] is 0). The true roles come from the initialize rows
+of a log, or the finish rows of a game played.
+
+featurize(cache_dir) computes the features of every shard of an ingested
+cache, in a process pool with workers > 0, and saves them next to the shard
+(features-X.npy ...). They are reused while their shape and FEATURES do not
+change; load_features concatenates them.
+
+usage: python -m aiwolfpy.features CACHE_DIR [-j WORKERS] [--days DAYS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import time
+from .query import Corpus, ROLES, ROLE_CODE, text_fields
+from .vocab import TYPE_CODE, TextVocabulary
+
+CLAIMED = ("SEER", "MEDIUM", "BODYGUARD", "VILLAGER", "WEREWOLF", "POSSESSED")
+FEATURES = (
+    "alive",
+    "talks",                # on the day
+    "votes_received",
+    "votes_cast",
+    "estimated_werewolf",   # ESTIMATE WEREWOLF by others
+    "estimated_human",      # ESTIMATE of another role by others
+    "estimates_werewolf",   # ESTIMATE WEREWOLF made
+    "divined_werewolf",     # DIVINED/IDENTIFIED WEREWOLF reported by others
+    "divined_human",
+    "reports",              # DIVINED/IDENTIFIED made
+    "claims",               # COMINGOUT of itself
+) + tuple("co_" + r for r in CLAIMED) + (
+    "claim_conflict",       # players sharing one of its claims
+)
+FEATURE_INDEX = dict((f, i) for i, f in enumerate(FEATURES))
+# counted on their day only, the others accumulate
+DAILY = ("talks",)
+ARRAYS = ("X", "V", "y", "game")
+
+
+def featurize_columns(cols, verb_codes, targets, roles, verb_code, days, players):
+    '''
+    features of the games in cols (day, type, idx, agent, text ids, game),
+    game ids must be contiguous
+    '''
+    import numpy as np
+    game = np.asarray(cols["game"], dtype=np.int64)
+    if not len(game):
+        return empty(days, players)
+    first = int(game.min())
+    games = int(game.max()) - first + 1
+    g = game - first
+    day = np.asarray(cols["day"], dtype=np.int64)
+    type_ = np.asarray(cols["type"])
+    agent = np.asarray(cols["agent"], dtype=np.int64) - 1
+    text = np.asarray(cols["text"])
+    verb, target, role = verb_codes[text], targets[text].astype(np.int64) - 1, roles[text]
+    F = len(FEATURES)
+    shape = (games, days, players, F)
+    # flat indices of every count, one bincount at the end
+    flats = []
+
+    def add(mask, who, feature, shift=0):
+        d = day + shift
+        mask = mask & (d >= 0) & (d < days) & (who >= 0) & (who < players)
+        flats.append(((g[mask] * days + d[mask]) * players + who[mask]) * F + FEATURE_INDEX[feature])
+
+    def verb_is(name):
+        return verb == verb_code.get(name, -2)
+
+    talk = type_ == TYPE_CODE["talk"]
+    add(talk, agent, "talks")
+    # server logs put the voter in idx and the target in agent, a game played in
+    # agent with idx 0: the target is in the text for both
+    vote = type_ == TYPE_CODE["vote"]
+    idx = np.asarray(cols["idx"], dtype=np.int64)
+    voter = np.where(idx > 0, idx - 1, agent)
+    add(vote, target, "votes_received", 1)
+    add(vote, voter, "votes_cast", 1)
+    werewolf = role == ROLE_CODE["WEREWOLF"]
+    human = (role >= 0) & ~werewolf
+    by_other = talk & (target >= 0) & (target != agent)
+    estimate = by_other & verb_is("ESTIMATE")
+    add(estimate & werewolf, target, "estimated_werewolf")
+    add(estimate & human, target, "estimated_human")
+    add(talk & verb_is("ESTIMATE") & werewolf, agent, "estimates_werewolf")
+    report = talk & (verb_is("DIVINED") | verb_is("IDENTIFIED"))
+    add(report & by_other & werewolf, target, "divined_werewolf")
+    add(report & by_other & human, target, "divined_human")
+    add(report, agent, "reports")
+    comingout = talk & verb_is("COMINGOUT") & (target == agent)
+    add(comingout, agent, "claims")
+    for r in CLAIMED:
+        add(comingout & (role == ROLE_CODE[r]), agent, "co_" + r)
+    died = (type_ == TYPE_CODE["execute"]) | (type_ == TYPE_CODE["dead"])
+    # "alive" counts deaths for now
+    add(died, agent, "alive", 1)
+
+    X = np.bincount(np.concatenate(flats), minlength=games * days * players * F).reshape(shape)
+    daily = [FEATURE_INDEX[f] for f in DAILY]
+    cumulative = [i for i in range(F) if i not in daily]
+    X[:, :, :, cumulative] = X[:, :, :, cumulative].cumsum(axis=1)
+
+    # true roles, finish rows over initialize rows
+    y = np.full((games, players), -1, dtype=np.int8)
+    for name in ("initialize", "finish"):
+        rows = (type_ == TYPE_CODE.get(name, -1)) & (agent >= 0) & (agent < players)
+        y[g[rows], agent[rows]] = role[rows]
+    present = (y >= 0)[:, None, :]
+    alive = FEATURE_INDEX["alive"]
+    X[:, :, :, alive] = present & (X[:, :, :, alive] == 0)
+
+    co = [FEATURE_INDEX["co_" + r] for r in CLAIMED]
+    claimed = X[:, :, :, co] > 0
+    sharing = claimed.sum(axis=2, keepdims=True) - 1
+    X[:, :, :, FEATURE_INDEX["claim_conflict"]] = (claimed * sharing).sum(axis=3)
+
+    V = np.zeros(games * days * players * players, dtype=np.int64)
+    ok = vote & (day < days) & (voter >= 0) & (voter < players) & (target >= 0) & (target < players)
+    flat = ((g[ok] * days + day[ok]) * players + voter[ok]) * players + target[ok]
+    V += np.bincount(flat, minlength=len(V))
+    return {
+        "X": np.minimum(X, np.iinfo(np.int16).max).astype(np.int16),
+        "V": np.minimum(V, np.iinfo(np.int8).max).astype(np.int8).reshape(games, days, players, players),
+        "y": y,
+        "game": np.arange(first, first + games, dtype=np.int32),
+    }
+
+
+def empty(days, players):
+    import numpy as np
+    return {
+        "X": np.zeros((0, days, players, len(FEATURES)), dtype=np.int16),
+        "V": np.zeros((0, days, players, players), dtype=np.int8),
+        "y": np.zeros((0, players), dtype=np.int8),
+        "game": np.zeros(0, dtype=np.int32),
+    }
+
+
+def featurize_frame(frame, days=None, players=None):
+    '''
+    features of a read_log or read_logs frame (plain or categorical), or of
+    the frame of a game played
+    '''
+    import numpy as np
+    if hasattr(frame["type"], "cat"):
+        type_ = frame["type"].cat.codes.values
+    else:
+        type_ = np.array([TYPE_CODE[t] for t in frame["type"]], dtype=np.int8)
+    if hasattr(frame["text"], "cat"):
+        # categorical frames use the ids of their vocabulary, its texts are the categories
+        text = frame["text"].cat.codes.values
+        strings = list(frame["text"].cat.categories)
+    else:
+        vocab = TextVocabulary()
+        text = np.array([vocab.intern(t) for t in frame["text"]], dtype=np.int32)
+        strings = vocab.strings
+    cols = {
+        "game": frame["game"].values if "game" in frame else np.zeros(len(frame), dtype=np.int32),
+        "day": frame["day"].values,
+        "type": type_,
+        "idx": np.array([int(i) for i in frame["idx"]], dtype=np.int64),
+        "agent": frame["agent"].values,
+        "text": text,
+    }
+    verbs, verb_codes, targets, roles = text_fields(strings)
+    if days is None:
+        days = int(cols["day"].max()) + 1 if len(frame) else 1
+    if players is None:
+        players = int(cols["agent"].max()) if len(frame) else 0
+    return featurize_columns(cols, verb_codes, targets, roles, dict((v, i) for i, v in enumerate(verbs)),
+                             days, players)
+
+
+class IncrementalFeatures(object):
+    '''
+    the row of X for the current day of a game being played, updated from the
+    rows of each diff only. Votes and deaths count as soon as they are seen,
+    which during a day's talks is what the batch features give.
+    '''
+
+    def __init__(self, players):
+        import numpy as np
+        self.players = players
+        self.counts = np.zeros((players, len(FEATURES)), dtype=np.int32)
+        self.dead = np.zeros(players, dtype=bool)
+        self.day = 0
+        # text -> (verb, 0-based target, role code)
+        self.texts = {}
+
+    def _fields(self, text):
+        fields = self.texts.get(text)
+        if fields is None:
+            verbs, verb_codes, targets, roles = text_fields([text])
+            fields = self.texts[text] = (verbs[verb_codes[0]], int(targets[0]) - 1, int(roles[0]))
+        return fields
+
+    def _add(self, who, feature):
+        if 0 <= who < self.players:
+            self.counts[who, FEATURE_INDEX[feature]] += 1
+
+    def update(self, diff):
+        # diff: the diff_data frame (or dict of columns) of an update
+        days = diff["day"].tolist()
+        types = diff["type"].tolist()
+        idxs = diff["idx"].tolist()
+        agents = diff["agent"].tolist()
+        texts = diff["text"].tolist()
+        talks = FEATURE_INDEX["talks"]
+        for day, type_, idx, agent, text in zip(days, types, idxs, agents, texts):
+            if day > self.day:
+                self.day = day
+                self.counts[:, talks] = 0
+            agent -= 1
+            if type_ == "talk":
+                verb, target, role = self._fields(text)
+                self._add(agent, "talks")
+                werewolf = role == ROLE_CODE["WEREWOLF"]
+                by_other = 0 <= target != agent
+                if verb == "ESTIMATE":
+                    if by_other and role >= 0:
+                        self._add(target, "estimated_werewolf" if werewolf else "estimated_human")
+                    if werewolf:
+                        self._add(agent, "estimates_werewolf")
+                elif verb in ("DIVINED", "IDENTIFIED"):
+                    if by_other and role >= 0:
+                        self._add(target, "divined_werewolf" if werewolf else "divined_human")
+                    self._add(agent, "reports")
+                elif verb == "COMINGOUT" and target == agent:
+                    self._add(agent, "claims")
+                    if role >= 0 and ROLES[role] in CLAIMED:
+                        self._add(agent, "co_" + ROLES[role])
+            elif type_ == "vote":
+                _, target, _ = self._fields(text)
+                idx = int(idx)
+                self._add(target, "votes_received")
+                self._add(idx - 1 if idx > 0 else agent, "votes_cast")
+            elif type_ in ("execute", "dead"):
+                if 0 <= agent < self.players:
+                    self.dead[agent] = True
+
+    def vector(self):
+        # X[game, day] of the current day, as float64 [players, F]
+        import numpy as np
+        X = self.counts.astype(np.float64)
+        X[:, FEATURE_INDEX["alive"]] = ~self.dead
+        claimed = X[:, [FEATURE_INDEX["co_" + r] for r in CLAIMED]] > 0
+        X[:, FEATURE_INDEX["claim_conflict"]] = (claimed * (claimed.sum(axis=0) - 1)).sum(axis=1)
+        return X
+
+
+def _paths(corpus, shard):
+    directory = os.path.join(corpus.cache_dir, "shard-{0:05d}".format(shard))
+    return dict((a, os.path.join(directory, "features-" + a + ".npy")) for a in ARRAYS), \
+        os.path.join(directory, "features.json")
+
+
+def _featurize_shard(corpus, shard, days, players, force):
+    import numpy as np
+    paths, meta_path = _paths(corpus, shard)
+    meta = {"features": list(FEATURES), "days": days, "players": players}
+    if not force and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            if json.load(f) == meta:
+                return False
+    s = corpus.shard(shard)
+    cols = dict((c, s.column(c)) for c in ("game", "day", "type", "idx", "agent", "text"))
+    arrays = featurize_columns(cols, corpus.verb_codes, corpus.targets, corpus.roles, corpus.verb_code,
+                               days, players)
+    for a in ARRAYS:
+        np.save(paths[a], arrays[a])
+    # written last: an interrupted shard is computed again
+    with open(meta_path, "w") as f:
+        json.dump(meta, f)
+    return True
+
+
+def _extent(corpus, shard):
+    s = corpus.shard(shard)
+    day, agent = s.column("day"), s.column("agent")
+    return (int(day.max()) + 1 if len(day) else 1), (int(agent.max()) if len(agent) else 0)
+
+
+def featurize(cache_dir, workers=0, days=None, players=None, force=False):
+    '''
+    compute (or keep) the features of every shard of a cache, days and players
+    default to the largest of the cache. Returns the number of shards computed.
+    '''
+    corpus = Corpus(cache_dir, workers=workers)
+    try:
+        if days is None or players is None:
+            extents = corpus.map_shards(_extent)
+            days = days or max([e[0] for e in extents] or [1])
+            players = players or max([e[1] for e in extents] or [0])
+        return sum(corpus.map_shards(_featurize_shard, days, players, force))
+    finally:
+        corpus.close()
+
+
+def load_features(cache_dir, mmap=False):
+    '''
+    X, V, y and game of every shard, concatenated (mmap=True gives one dict of
+    memory-mapped arrays per shard instead)
+    '''
+    import numpy as np
+    corpus = Corpus(cache_dir)
+    parts = []
+    for shard in range(len(corpus.cache.shards)):
+        paths, _ = _paths(corpus, shard)
+        parts.append(dict((a, np.load(paths[a], mmap_mode="r" if mmap else None)) for a in ARRAYS))
+    if mmap:
+        return parts
+    return dict((a, np.concatenate([p[a] for p in parts])) for a in ARRAYS)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="features of the games of a log cache")
+    argparser.add_argument("cache_dir")
+    argparser.add_argument("-j", type=int, dest="workers", default=0, help="processes (0: none)")
+    argparser.add_argument("--days", type=int, default=None)
+    argparser.add_argument("--players", type=int, default=None)
+    argparser.add_argument("--force", action="store_true", help="compute shards already done again")
+    args = argparser.parse_args(argv)
+    t0 = time.perf_counter()
+    computed = featurize(args.cache_dir, args.workers, args.days, args.players, args.force)
+    elapsed = time.perf_counter() - t0
+    games = len(Corpus(args.cache_dir))
+    print("{0} shards computed, {1} games in {2:.2f} s ({3:.0f} games/s)".format(
+        computed, games, elapsed, games / max(elapsed, 1e-9)))
+
+
+if __name__ == '__main__':
+    main()
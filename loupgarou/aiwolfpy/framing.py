@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""
+Framing
+
+Newline-framed packet decoder for the AIWolf socket protocol.
+The server terminates every JSON packet with '\\n', so frames are split on
+raw bytes before decoding: a multibyte UTF-8 character split across two
+recv calls is decoded only once its frame is complete.
+"""
+
+from __future__ import print_function, division
+import json
+
+
+class FrameDecoder(object):
+
+    def __init__(self, bufsize=65536):
+        # preallocated receive buffer, data lives in buf[start:end]
+        self.buf = bytearray(bufsize)
+        self.view = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        # everything in buf[start:scan] is known to contain no newline
+        self.scan = 0
+
+    def _reserve(self, size):
+        # make room for at least size more bytes after end
+        if len(self.buf) - self.end >= size:
+            return
+        pending = self.end - self.start
+        if self.start > 0 and len(self.buf) - pending >= size:
+            # only the incomplete frame is moved to the front
+            self.buf[:pending] = self.buf[self.start:self.end]
+        else:
+            # incomplete frame does not fit, grow geometrically
+            new_buf = bytearray(max(2 * len(self.buf), pending + size))
+            new_buf[:pending] = self.buf[self.start:self.end]
+            self.view.release()
+            self.buf = new_buf
+            self.view = memoryview(self.buf)
+        self.scan -= self.start
+        self.end = pending
+        self.start = 0
+
+    def recv_from(self, sock, size=8192):
+        # receive directly into the buffer, returns 0 on EOF
+        self._reserve(size)
+        n = sock.recv_into(self.view[self.end:self.end + size])
+        self.end += n
+        return n
+
+    def feed(self, data):
+        # append bytes received by other means (asyncio, recorded traffic)
+        n = len(data)
+        self._reserve(n)
+        self.buf[self.end:self.end + n] = data
+        self.end += n
+        return n
+
+    def frames(self):
+        # yield every complete frame as str, each byte is scanned once
+        buf = self.buf
+        while True:
+            pos = buf.find(b'\n', self.scan, self.end)
+            if pos < 0:
+                self.scan = self.end
+                break
+            frame = buf[self.start:pos]
+            self.start = pos + 1
+            self.scan = self.start
+            if frame.strip():
+                yield frame.decode('utf-8')
+        if self.start == self.end:
+            # buffer drained, rewind for free
+            self.start = self.end = self.scan = 0
+
+    def flush(self):
+        # trailing frame without newline (connection closed by server)
+        frame = self.buf[self.start:self.end]
+        self.start = self.end = self.scan = 0
+        if frame.strip():
+            return frame.decode('utf-8')
+        return None
+
+
+def iter_frames(sock, bufsize=65536, recvsize=8192):
+    # yield frames received on sock until EOF
+    decoder = FrameDecoder(bufsize)
+    while decoder.recv_from(sock, recvsize) > 0:
+        for frame in decoder.frames():
+            yield frame
+    frame = decoder.flush()
+    if frame is not None:
+        yield frame
+
+
+def iter_packets(sock, bufsize=65536, recvsize=8192):
+    # yield decoded json packets received on sock until EOF
+    for frame in iter_frames(sock, bufsize, recvsize):
+        yield json.loads(frame)
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+"""
+GameHistory
+
+Row stores behind GameInfoParser. Both keep the columns
+day, type, idx, turn, agent, text.
+
+ListHistory: one Python list per column (the original pd_dict).
+ColumnarHistory: typed, preallocated NumPy arrays grown geometrically, with
+type as a small integer code and text as an interned id, so a diff is a
+zero-copy slice and a DataFrame is only built when asked for.
+
+With categorical=True, frame() returns type and text as pandas Categoricals
+whose codes are the type codes and the interned text ids. Texts are interned
+in a vocabulary of the store (a new one per game) unless one is given.
+
+numpy and pandas are imported on first use, so the list store works
+without them.
+"""
+
+from __future__ import print_function, division
+from .vocab import TYPES, TYPE_CODE, TextVocabulary, type_categorical
+
+COLUMNS = ("day", "type", "idx", "turn", "agent", "text")
+
+
+class ListHistory(object):
+
+    def __init__(self, vocab=None):
+        self.vocab = TextVocabulary() if vocab is None else vocab
+        self.pd_dict = {"day":[], "type":[], "idx":[], "turn":[], "agent":[], "text":[]}
+
+    def __len__(self):
+        return len(self.pd_dict["day"])
+
+    def append(self, day, type_, idx, turn, agent, text):
+        self.pd_dict["day"].append(day)
+        self.pd_dict["type"].append(type_)
+        self.pd_dict["idx"].append(idx)
+        self.pd_dict["turn"].append(turn)
+        self.pd_dict["agent"].append(agent)
+        self.pd_dict["text"].append(text)
+
+    def columns(self, start=0, end=None):
+        return dict((c, self.pd_dict[c][start:end]) for c in COLUMNS)
+
+    def frame(self, start=0, end=None, categorical=False):
+        import pandas as pd
+        cols = self.columns(start, end)
+        if categorical:
+            intern = self.vocab.intern
+            cols["type"] = type_categorical([TYPE_CODE[t] for t in cols["type"]])
+            cols["text"] = self.vocab.categorical([intern(t) for t in cols["text"]])
+        return pd.DataFrame(cols)
+
+
+class ColumnarHistory(object):
+
+    DTYPES = (("day", "int16"), ("type", "int8"), ("idx", "int16"),
+              ("turn", "int16"), ("agent", "int16"), ("text", "int32"))
+
+    def __init__(self, capacity=256, vocab=None):
+        import numpy as np
+        self.np = np
+        self.vocab = TextVocabulary() if vocab is None else vocab
+        self.size = 0
+        self.arrays = dict((c, np.empty(capacity, dtype=t)) for c, t in self.DTYPES)
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        for c, a in self.arrays.items():
+            new_a = self.np.empty(2 * len(a), dtype=a.dtype)
+            new_a[:self.size] = a[:self.size]
+            self.arrays[c] = new_a
+
+    def append(self, day, type_, idx, turn, agent, text):
+        if self.size == len(self.arrays["day"]):
+            self._grow()
+        i = self.size
+        a = self.arrays
+        a["day"][i] = day
+        a["type"][i] = TYPE_CODE[type_]
+        a["idx"][i] = idx
+        a["turn"][i] = turn
+        a["agent"][i] = agent
+        a["text"][i] = self.vocab.intern(text)
+        self.size = i + 1
+
+    def columns(self, start=0, end=None):
+        # views into the arrays, valid until the rows are overwritten (never)
+        end = self.size if end is None else min(end, self.size)
+        return dict((c, a[start:end]) for c, a in self.arrays.items())
+
+    def frame(self, start=0, end=None, categorical=False):
+        import pandas as pd
+        cols = self.columns(start, end)
+        if categorical:
+            type_col = type_categorical(cols["type"])
+            text_col = self.vocab.categorical(cols["text"])
+        else:
+            type_col = [TYPES[c] for c in cols["type"]]
+            text_col = self.vocab.decode(cols["text"])
+        return pd.DataFrame({
+            "day":cols["day"],
+            "type":type_col,
+            "idx":cols["idx"],
+            "turn":cols["turn"],
+            "agent":cols["agent"],
+            "text":text_col,
+        })
+
+
+BACKENDS = {"list": ListHistory, "columnar": ColumnarHistory}
@@ -1,11 +1,48 @@
 from __future__ import print_function, division 
-import pandas as pd
 import json
+from .gamehistory import BACKENDS
+from .events import (EVENT_TYPES, Initialize, Finish, Talk, Whisper, Vote, AttackVote,
+                     Execute, Dead, Divine, Identify, Guard, Attack)
 
 class GameInfoParser(object):
     
-    def __init__(self):
-        self.pd_dict = {"day":[], "type":[], "idx":[], "turn":[], "agent":[], "text":[]}   
+    def __init__(self, backend="list", events=False, categorical=False):
+        # "list" (python lists) or "columnar" (numpy arrays), see gamehistory
+        self.backend = backend
+        # frames with type and text as pandas Categoricals
+        self.categorical = categorical
+        # keep events for get_events_diff, turned on by subscribe too
+        self.events_on = events
+        self.subscribers = {}
+        self._new_history()
+        
+    def _new_history(self):
+        self.history = BACKENDS[self.backend]()
+        self._append = self.history.append
+        # the list backend still exposes its lists as pd_dict
+        self.pd_dict = getattr(self.history, "pd_dict", None)
+        self.events = []
+        
+    def _add(self, event):
+        self._append(*event.row())
+        if self.events_on:
+            self.events.append(event)
+            for callback in self.subscribers.get(type(event), ()):
+                callback(event)
+        
+    def subscribe(self, event_type, callback):
+        # event_type is an Event class or its row type ("talk", "vote", ...)
+        if not isinstance(event_type, type):
+            event_type = EVENT_TYPES[event_type]
+        self.subscribers.setdefault(event_type, []).append(callback)
+        self.events_on = True
+        
+    def get_events_diff(self):
+        # events since the last call, pandas is never touched
+        ret = self.events
+        self.events = []
+        self.rows_returned = len(self.history)
+        return ret
         
     # pandas
     def initialize(self, game_info, game_setting):
@@ -13,7 +50,7 @@ class GameInfoParser(object):
         self.agentIdx = game_info['agent']
         self.myRole =  game_info["roleMap"][str(self.agentIdx)]
         # ROLEMAP on INITIAL
-        self.pd_dict = {"day":[], "type":[], "idx":[], "turn":[], "agent":[], "text":[]}
+        self._new_history()
         self.finish_cnt = 0 
         self.night_info = 0
         self.len_wl = 0
@@ -22,29 +59,23 @@ class GameInfoParser(object):
         self.rows_returned = 0
         
         for k in game_info["roleMap"].keys():
-            self.pd_dict["day"].append(game_info["day"])
-            self.pd_dict["type"].append('initialize')
-            self.pd_dict["idx"].append(int(k))
-            self.pd_dict["turn"].append(0)
-            self.pd_dict["agent"].append(int(k))
-            self.pd_dict["text"].append('COMINGOUT Agent[' + "{0:02d}".format(int(k)) + '] ' + game_info["roleMap"][k])
+            self._add(Initialize(game_info["day"], int(k), game_info["roleMap"][k]))
             
         
     def get_gamedf(self):
-        return pd.DataFrame(self.pd_dict)
+        # full game, built on demand
+        return self.history.frame(categorical=self.categorical)
         
     def get_gamedf_diff(self):
-        ret_df = pd.DataFrame({
-            "day":self.pd_dict["day"][self.rows_returned:], 
-            "type":self.pd_dict["type"][self.rows_returned:], 
-            "idx":self.pd_dict["idx"][self.rows_returned:], 
-            "turn":self.pd_dict["turn"][self.rows_returned:], 
-            "agent":self.pd_dict["agent"][self.rows_returned:], 
-            "text":self.pd_dict["text"][self.rows_returned:]
-        })
-        self.rows_returned = len(self.pd_dict["day"])
+        ret_df = self.history.frame(self.rows_returned, categorical=self.categorical)
+        self.rows_returned = len(self.history)
         return ret_df
         
+    def get_diff_arrays(self):
+        # rows since the last diff as a dict of columns (array views for "columnar")
+        ret = self.history.columns(self.rows_returned)
+        self.rows_returned = len(self.history)
+        return ret
         
                 
     def update(self, game_info, talk_history, whisper_history, request):
@@ -59,12 +90,7 @@ class GameInfoParser(object):
             #print("INSIDE GameInfoParser - TALK")
             #print(json.dumps(game_info, indent=4))
             for t in talk_history:
-                self.pd_dict["day"].append(t["day"])
-                self.pd_dict["type"].append("talk")
-                self.pd_dict["idx"].append(t["idx"])
-                self.pd_dict["turn"].append(t["turn"])
-                self.pd_dict["agent"].append(t["agent"])
-                self.pd_dict["text"].append(t["text"])
+                self._add(Talk(t["day"], t["agent"], t["idx"], t["turn"], t["text"]))
             
         # whisper
         # update whisperlist
@@ -84,80 +110,40 @@ class GameInfoParser(object):
             if self.night_info == 0:
                 # valid vote
                 for v in game_info['voteList']:
-                    self.pd_dict["day"].append(v["day"])
-                    self.pd_dict["type"].append("vote")
-                    self.pd_dict["idx"].append(0)
-                    self.pd_dict["turn"].append(0)
-                    self.pd_dict["agent"].append(v["agent"])
-                    self.pd_dict["text"].append('VOTE Agent[' + "{0:02d}".format(v["target"]) + ']')
+                    self._add(Vote(v["day"], v["agent"], v["target"]))
                     
             # EXECUTE
             if game_info['executedAgent'] != -1 and self.night_info == 0:
-                self.pd_dict["day"].append(game_info['day'] - 1)
-                self.pd_dict["type"].append("execute")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(game_info['executedAgent'])
-                self.pd_dict["text"].append('Over')
+                self._add(Execute(game_info['day'] - 1, game_info['executedAgent']))
                 
             # IDENTIFY
             if game_info['mediumResult'] is not None:
                 m = game_info['mediumResult']
-                self.pd_dict["day"].append(m['day'])
-                self.pd_dict["type"].append("identify")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(game_info['agent'])
-                self.pd_dict["text"].append('IDENTIFIED Agent[' + "{0:02d}".format(m['target']) + '] ' + m['result'])
+                self._add(Identify(m['day'], game_info['agent'], m['target'], m['result']))
                 
             # DIVINE
             if game_info['divineResult'] is not None:
                 d = game_info['divineResult']
                 #print(json.dumps(d, indent=4))
-                self.pd_dict["day"].append(d['day'] - 1)
-                self.pd_dict["type"].append("divine")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(d['agent'])
-                self.pd_dict["text"].append('DIVINED Agent[' + "{0:02d}".format(d['target']) + '] ' + d['result'])
+                self._add(Divine(d['day'] - 1, d['agent'], d['target'], d['result']))
                 
             # GUARD
             if game_info['guardedAgent'] != -1:
-                self.pd_dict["day"].append(game_info['day'] - 1)
-                self.pd_dict["type"].append("guard")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(game_info['agent'])
-                self.pd_dict["text"].append('GUARDED Agent[' + "{0:02d}".format(game_info['guardedAgent']) + ']')
+                self._add(Guard(game_info['day'] - 1, game_info['agent'], game_info['guardedAgent']))
                 
             # ATTACK_VOTE
             # valid attack_vote
             for v in game_info['attackVoteList']:
-                self.pd_dict["day"].append(v["day"])
-                self.pd_dict["type"].append("attack_vote")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(v["agent"])
-                self.pd_dict["text"].append('ATTACK Agent[' + "{0:02d}".format(v["target"]) + ']')
+                self._add(AttackVote(v["day"], v["agent"], v["target"]))
                                 
             # ATTACK
             if game_info['attackedAgent'] != -1:
-                self.pd_dict["day"].append(game_info['day'] - 1)
-                self.pd_dict["type"].append("attack")
-                self.pd_dict["idx"].append(0)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(game_info['agent'])
-                self.pd_dict["text"].append('ATTACK Agent[' + "{0:02d}".format(game_info['attackedAgent']) + ']')
+                self._add(Attack(game_info['day'] - 1, game_info['agent'], game_info['attackedAgent']))
                 
             # DEAD
             # if len(game_info['lastDeadAgentList']) > 0:
             for i in range(len(game_info['lastDeadAgentList'])):
-                self.pd_dict["day"].append(game_info['day'])
-                self.pd_dict["type"].append("dead")
-                self.pd_dict["idx"].append(i)
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(game_info['lastDeadAgentList'][i])
-                self.pd_dict["text"].append('Over')
+                self._add(Dead(game_info['day'], game_info['lastDeadAgentList'][i], i))
                 
             self.night_info = 0
             self.len_wl = 0
@@ -170,22 +156,12 @@ class GameInfoParser(object):
                 #print("INSIDE GameInfoParser - latestVoteList")
                 #print(json.dumps(game_info, indent=4))
                 for v in game_info['latestVoteList']:
-                    self.pd_dict["day"].append(v["day"])
-                    self.pd_dict["type"].append("vote")
-                    self.pd_dict["idx"].append(0)
-                    self.pd_dict["turn"].append(0)
-                    self.pd_dict["agent"].append(v["agent"])
-                    self.pd_dict["text"].append('VOTE Agent[' + "{0:02d}".format(v["target"]) + ']')
+                    self._add(Vote(v["day"], v["agent"], v["target"]))
                     
             # EXECUTE
             if 'latestExecutedAgent' in game_info.keys():
                 if game_info['latestExecutedAgent'] != -1:
-                    self.pd_dict["day"].append(game_info['day'])
-                    self.pd_dict["type"].append("execute")
-                    self.pd_dict["idx"].append(0)
-                    self.pd_dict["turn"].append(0)
-                    self.pd_dict["agent"].append(game_info['latestExecutedAgent'])
-                    self.pd_dict["text"].append('Over')
+                    self._add(Execute(game_info['day'], game_info['latestExecutedAgent']))
             
             self.night_info = 1
             
@@ -198,12 +174,7 @@ class GameInfoParser(object):
                 #print(json.dumps(game_info, indent=4))
                 # valid vote
                 for v in game_info['latestVoteList']:
-                    self.pd_dict["day"].append(v["day"])
-                    self.pd_dict["type"].append("vote")
-                    self.pd_dict["idx"].append(0)
-                    self.pd_dict["turn"].append(-1)
-                    self.pd_dict["agent"].append(v["agent"])
-                    self.pd_dict["text"].append('VOTE Agent[' + "{0:02d}".format(v["target"]) + ']')
+                    self._add(Vote(v["day"], v["agent"], v["target"], -1))
                     
         # REATTACKVOTE
         elif request == 'ATTACK':
@@ -212,23 +183,13 @@ class GameInfoParser(object):
             #print(json.dumps(game_info, indent=4))
             if 'latestAttackVoteList' in game_info.keys():
                 for v in game_info['latestAttackVoteList']:
-                    self.pd_dict["day"].append(v["day"])
-                    self.pd_dict["type"].append("attack_vote")
-                    self.pd_dict["idx"].append(0)
-                    self.pd_dict["turn"].append(-1)
-                    self.pd_dict["agent"].append(v["agent"])
-                    self.pd_dict["text"].append('ATTACK Agent[' + "{0:02d}".format(v["target"]) + ']')
+                    self._add(AttackVote(v["day"], v["agent"], v["target"], -1))
         
         # FINISH
         elif request == 'FINISH' and self.finish_cnt == 0:
             # get full roleMap
             for k in game_info["roleMap"].keys():
-                self.pd_dict["day"].append(game_info["day"])
-                self.pd_dict["type"].append('finish')
-                self.pd_dict["idx"].append(int(k))
-                self.pd_dict["turn"].append(0)
-                self.pd_dict["agent"].append(int(k))
-                self.pd_dict["text"].append('COMINGOUT Agent[' + "{0:02d}".format(int(k)) + '] ' + game_info["roleMap"][k])
+                self._add(Finish(game_info["day"], int(k), game_info["roleMap"][k]))
             self.finish_cnt += 1
             
         # WHISPERLIST
@@ -236,12 +197,7 @@ class GameInfoParser(object):
             if len(game_info['whisperList']) > self.len_wl:
                 for i in range(self.len_wl, len(game_info['whisperList'])):
                     w = game_info['whisperList'][i]
-                    self.pd_dict["day"].append(w["day"])
-                    self.pd_dict["type"].append("whisper")
-                    self.pd_dict["idx"].append(w["idx"])
-                    self.pd_dict["turn"].append(w["turn"])
-                    self.pd_dict["agent"].append(w["agent"])
-                    self.pd_dict["text"].append(w["text"])
+                    self._add(Whisper(w["day"], w["agent"], w["idx"], w["turn"], w["text"]))
                     self.len_wl = len(game_info['whisperList'])  
                     
                     
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""
+Ingest
+
+Bulk ingestion of server logs (plain or gzip) into a columnar cache that
+later analyses memory-map instead of parsing CSV again. Logs are parsed by
+iter_log in a process pool, one game per log; game ids follow the order of
+the logs given. Texts are interned into one vocabulary shared by all games.
+
+Layout of a cache directory:
+    vocab.json       texts by id (the text column holds ids)
+    logs.json        source log of each game id
+    games.npy        game, shard, start, stop of each game
+    shard-00000/     day.npy type.npy idx.npy turn.npy agent.npy text.npy game.npy
+
+usage: python -m aiwolfpy.ingest CACHE_DIR LOG_OR_DIR [...] [-j WORKERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import sys
+import time
+from .read_log import iter_log
+from .vocab import TYPES, TYPE_CODE, TextVocabulary, type_categorical
+from .gamehistory import COLUMNS, ColumnarHistory
+
+DTYPES = dict(ColumnarHistory.DTYPES, game="int32")
+SHARD_COLUMNS = COLUMNS + ("game",)
+GAMES_DTYPE = [("game", "int32"), ("shard", "int32"), ("start", "int64"), ("stop", "int64")]
+LOG_SUFFIXES = (".log", ".log.gz", ".csv", ".csv.gz")
+
+
+def parse_log(log_path):
+    '''
+    columns of one log as arrays, text as ids into the returned strings
+    '''
+    import numpy as np
+    rows = list(iter_log(log_path))
+    strings = {}
+    if rows:
+        day, type_, idx, turn, agent, text = zip(*rows)
+    else:
+        day = type_ = idx = turn = agent = text = ()
+    columns = {
+        "day": np.array(day, dtype=DTYPES["day"]),
+        "type": np.array([TYPE_CODE[t] for t in type_], dtype=DTYPES["type"]),
+        # the medium of identify rows comes as a string
+        "idx": np.array([int(i) for i in idx], dtype=DTYPES["idx"]),
+        "turn": np.array(turn, dtype=DTYPES["turn"]),
+        "agent": np.array(agent, dtype=DTYPES["agent"]),
+        "text": np.array([strings.setdefault(t, len(strings)) for t in text], dtype=DTYPES["text"]),
+    }
+    return log_path, columns, list(strings)
+
+
+class _ShardWriter(object):
+    # buffers games and writes a shard every shard_rows rows
+
+    def __init__(self, cache_dir, shard_rows):
+        self.cache_dir = cache_dir
+        self.shard_rows = shard_rows
+        self.shard = 0
+        self.pending = []
+        self.pending_rows = 0
+        self.games = []
+
+    def add(self, game, columns):
+        n = len(columns["day"])
+        self.games.append((game, self.shard, self.pending_rows, self.pending_rows + n))
+        self.pending.append((game, columns))
+        self.pending_rows += n
+        if self.pending_rows >= self.shard_rows:
+            self.flush()
+
+    def flush(self):
+        import numpy as np
+        if not self.pending:
+            return
+        path = os.path.join(self.cache_dir, "shard-{0:05d}".format(self.shard))
+        if not os.path.isdir(path):
+            os.makedirs(path)
+        for c in COLUMNS:
+            np.save(os.path.join(path, c + ".npy"), np.concatenate([cols[c] for _, cols in self.pending]))
+        np.save(os.path.join(path, "game.npy"), np.concatenate(
+            [np.full(len(cols["day"]), game, dtype=DTYPES["game"]) for game, cols in self.pending]))
+        self.shard += 1
+        self.pending = []
+        self.pending_rows = 0
+
+    def close(self):
+        import numpy as np
+        self.flush()
+        np.save(os.path.join(self.cache_dir, "games.npy"), np.array(self.games, dtype=GAMES_DTYPE))
+
+
+def find_logs(paths):
+    # files as given, directories walked for logs, sorted
+    logs = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = []
+            for root, _, files in os.walk(path):
+                found.extend(os.path.join(root, f) for f in files if f.endswith(LOG_SUFFIXES))
+            logs.extend(sorted(found))
+        else:
+            logs.append(path)
+    return logs
+
+
+def ingest(log_paths, cache_dir, workers=None, shard_rows=1 << 22, chunksize=8, vocab=None):
+    '''
+    parse log_paths into a columnar cache in cache_dir, workers=0 parses in
+    this process, None uses every core
+    '''
+    import numpy as np
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    vocab = TextVocabulary() if vocab is None else vocab
+    writer = _ShardWriter(cache_dir, shard_rows)
+    logs = []
+    rows = 0
+    start = time.perf_counter()
+    pool = None
+    if workers == 0:
+        results = map(parse_log, log_paths)
+    else:
+        from multiprocessing import Pool
+        pool = Pool(workers)
+        results = pool.imap(parse_log, log_paths, chunksize)
+    try:
+        for game, (path, columns, strings) in enumerate(results):
+            # local text ids -> ids of the shared vocabulary
+            if strings:
+                remap = np.array([vocab.intern(s) for s in strings], dtype=DTYPES["text"])
+                columns["text"] = remap[columns["text"]]
+            writer.add(game, columns)
+            logs.append(path)
+            rows += len(columns["day"])
+    finally:
+        if pool is not None:
+            pool.close()
+            pool.join()
+    writer.close()
+    with open(os.path.join(cache_dir, "vocab.json"), "w") as f:
+        json.dump(vocab.strings, f)
+    with open(os.path.join(cache_dir, "logs.json"), "w") as f:
+        json.dump(logs, f)
+    return {"games": len(logs), "rows": rows, "shards": writer.shard, "seconds": time.perf_counter() - start}
+
+
+class LogCache(object):
+    # a cache written by ingest, shards memory-mapped by default
+
+    def __init__(self, cache_dir, mmap=True):
+        import numpy as np
+        self.cache_dir = cache_dir
+        with open(os.path.join(cache_dir, "vocab.json")) as f:
+            self.vocab = TextVocabulary(json.load(f))
+        with open(os.path.join(cache_dir, "logs.json")) as f:
+            self.logs = json.load(f)
+        self.games = np.load(os.path.join(cache_dir, "games.npy"))
+        mode = "r" if mmap else None
+        self.shards = []
+        shard_count = int(self.games["shard"].max()) + 1 if len(self.games) else 0
+        for shard in range(shard_count):
+            path = os.path.join(cache_dir, "shard-{0:05d}".format(shard))
+            self.shards.append(dict((c, np.load(os.path.join(path, c + ".npy"), mmap_mode=mode))
+                                    for c in SHARD_COLUMNS))
+
+    def __len__(self):
+        return len(self.games)
+
+    def columns(self, game):
+        # views on the rows of one game
+        _, shard, start, stop = self.games[game]
+        return dict((c, a[start:stop]) for c, a in self.shards[shard].items())
+
+    def iter_games(self):
+        for game in range(len(self.games)):
+            yield game, self.columns(game)
+
+    def frame(self, game, categorical=False):
+        # the DataFrame read_log gives for the game's log
+        import pandas as pd
+        cols = self.columns(game)
+        if categorical:
+            type_col = type_categorical(cols["type"])
+            text_col = self.vocab.categorical(cols["text"])
+        else:
+            type_col = [TYPES[c] for c in cols["type"]]
+            text_col = self.vocab.decode(cols["text"])
+        return pd.DataFrame({
+            "day":cols["day"],
+            "type":type_col,
+            "idx":cols["idx"],
+            "turn":cols["turn"],
+            "agent":cols["agent"],
+            "text":text_col,
+        })
+
+
+def load_cache(cache_dir, mmap=True):
+    return LogCache(cache_dir, mmap)
+
+
+def peak_rss():
+    '''
+    peak resident set size in MB of this process and of its finished children
+    '''
+    try:
+        import resource
+    except ImportError:
+        return None, None
+    # KB on Linux, bytes on macOS
+    scale = 1024.0 * 1024.0 if sys.platform == "darwin" else 1024.0
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="ingest AIWolf server logs into a columnar cache")
+    argparser.add_argument("cache_dir")
+    argparser.add_argument("logs", nargs="+", help="log files or directories of logs")
+    argparser.add_argument("-j", type=int, dest="workers", default=None, help="processes (0: none, default: all cores)")
+    argparser.add_argument("--shard-rows", type=int, dest="shard_rows", default=1 << 22)
+    args = argparser.parse_args(argv)
+    logs = find_logs(args.logs)
+    stats = ingest(logs, args.cache_dir, workers=args.workers, shard_rows=args.shard_rows)
+    self_rss, children_rss = peak_rss()
+    print("{0} games, {1} rows, {2} shards in {3:.2f} s: {4:.0f} logs/s, {5:.0f} rows/s".format(
+        stats["games"], stats["rows"], stats["shards"], stats["seconds"],
+        stats["games"] / max(stats["seconds"], 1e-9), stats["rows"] / max(stats["seconds"], 1e-9)))
+    if self_rss is not None:
+        print("peak RSS: {0:.0f} MB (main), {1:.0f} MB (largest worker)".format(self_rss, children_rss))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Latency
+
+HDR-style latency histograms: values are recorded in microseconds into
+log-linear buckets (constant relative error, about 1% with 7 sub-bucket
+bits), so recording is O(1) and percentiles need no sorted samples.
+"""
+
+from __future__ import print_function, division
+
+
+class LatencyHistogram(object):
+
+    def __init__(self, sub_bucket_bits=7):
+        self.sub_bits = sub_bucket_bits
+        self.sub_count = 1 << sub_bucket_bits
+        self.half_count = self.sub_count >> 1
+        self.counts = [0] * self.sub_count
+        self.total = 0
+        self.sum = 0
+        self.min = None
+        self.max = 0
+
+    def _index(self, v):
+        if v < self.sub_count:
+            return v
+        shift = v.bit_length() - self.sub_bits
+        return self.sub_count + (shift - 1) * self.half_count + (v >> shift) - self.half_count
+
+    def _value(self, index):
+        # highest value that falls into the bucket
+        if index < self.sub_count:
+            return index
+        shift, sub = divmod(index - self.sub_count, self.half_count)
+        shift += 1
+        return ((sub + self.half_count + 1) << shift) - 1
+
+    def record(self, seconds):
+        v = int(seconds * 1e6)
+        if v < 0:
+            v = 0
+        i = self._index(v)
+        if i >= len(self.counts):
+            self.counts.extend([0] * (i + 1 - len(self.counts)))
+        self.counts[i] += 1
+        self.total += 1
+        self.sum += v
+        if self.min is None or v < self.min:
+            self.min = v
+        if v > self.max:
+            self.max = v
+
+    def percentile(self, p):
+        # in microseconds
+        if self.total == 0:
+            return 0
+        rank = max(1, int(round(p / 100.0 * self.total)))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(self._value(i), self.max)
+        return self.max
+
+    def mean(self):
+        return self.sum / self.total if self.total else 0
+
+
+class LatencyRecorder(object):
+    # one histogram per (request, stage)
+
+    STAGES = ("parse", "agent", "send", "total")
+
+    def __init__(self):
+        self.histograms = {}
+
+    def record(self, request, stage, seconds):
+        key = (request, stage)
+        h = self.histograms.get(key)
+        if h is None:
+            h = self.histograms[key] = LatencyHistogram()
+        h.record(seconds)
+
+    def report(self, percentiles=(50, 90, 99)):
+        header = "{0:<17s}{1:<7s}{2:>7s}".format("request", "stage", "count")
+        for p in percentiles:
+            header += "{0:>10s}".format("p" + str(p))
+        header += "{0:>10s}".format("max")
+        lines = [header + "  (ms)"]
+        for request in sorted(set(r for r, _ in self.histograms)):
+            for stage in self.STAGES:
+                h = self.histograms.get((request, stage))
+                if h is None:
+                    continue
+                line = "{0:<17s}{1:<7s}{2:>7d}".format(request, stage, h.total)
+                for p in percentiles:
+                    line += "{0:>10.3f}".format(h.percentile(p) / 1000.0)
+                line += "{0:>10.3f}".format(h.max / 1000.0)
+                lines.append(line)
+        return "\n".join(lines)
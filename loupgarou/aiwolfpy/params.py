@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""
+Params
+
+The tunable constants of villager_agent.SampleAgent, in one object shared by
+the agent, aiwolfpy.batchsim and aiwolfpy.sweep:
+
+    seer_value, medium_value, bg_value   weight of what the uncontested
+                                         seer, medium, bodyguard say
+    suspect_value                        weight of players in a conflict
+    white_value                          score multiplier of the white list
+    estimate_weight, vote_weight         info_table points of an ESTIMATE,
+                                         of a vote or another statement
+    wolf_estimate_p, wolf_comingout_p    talk probabilities of a werewolf
+    reveal_villager_p                    of a seer revealing a human
+    estimate_p, estimate_villager_p      of the others
+
+Saved as a JSON object of the values that differ from the defaults.
+"""
+
+from __future__ import print_function, division
+import json
+
+DEFAULTS = {
+    "seer_value": 2.0,
+    "medium_value": 2.0,
+    "bg_value": 1.5,
+    "suspect_value": 0.2,
+    "white_value": 1.4,
+    "estimate_weight": 0.5,
+    "vote_weight": 1.0,
+    "wolf_estimate_p": 0.35,
+    "wolf_comingout_p": 0.6,
+    "reveal_villager_p": 0.3,
+    "estimate_p": 0.3,
+    "estimate_villager_p": 0.1,
+}
+
+
+class AgentParams(object):
+
+    def __init__(self, **values):
+        for name in values:
+            if name not in DEFAULTS:
+                raise ValueError("unknown parameter " + name)
+        for name, default in DEFAULTS.items():
+            setattr(self, name, float(values.get(name, default)))
+
+    def as_dict(self):
+        return dict((name, getattr(self, name)) for name in DEFAULTS)
+
+    def changed(self):
+        # values that differ from the defaults
+        return dict((name, value) for name, value in self.as_dict().items() if value != DEFAULTS[name])
+
+    def key(self):
+        '''
+        canonical text of the values, the same for equal parameters
+        '''
+        return json.dumps(self.as_dict(), sort_keys=True)
+
+    def __repr__(self):
+        return "AgentParams({0})".format(", ".join("{0}={1!r}".format(k, v) for k, v in sorted(self.changed().items())))
+
+
+def load_params(path):
+    with open(path) as f:
+        return AgentParams(**json.load(f))
+
+
+def save_params(params, path):
+    with open(path, "w") as f:
+        json.dump(params.changed(), f, sort_keys=True)
@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""
+Priors
+
+Empirical priors and an opening book compiled from an ingested log cache,
+for the decisions of day 1 that are made without information:
+
+    claims.npy   int32 [role, day, order, 2]: claims of a role first made on
+                 the day as the order-th claim of the game, and how many were
+                 genuine
+    book.npy     one row per (setting, my role, decision, option): games and
+                 wins, sorted by key for binary search
+
+A setting is playerNum and roleNumMap. The decisions of the book:
+
+    TALK     role claimed on day 1 (-1 none)
+    DIVINE   who the seer divined on night 1 (SILENT, CLAIMER, SEER_CLAIM)
+    GUARD    who the bodyguard guarded on night 1 (same classes)
+
+where CLAIMER is a player who claimed SEER, MEDIUM or BODYGUARD on day 1 and
+SEER_CLAIM one who claimed SEER. load_priors memory-maps both arrays, so an
+agent opens them in microseconds, and lookups are array indexing and one
+searchsorted.
+
+usage: python -m aiwolfpy.priors CACHE_DIR PRIORS_DIR [-j WORKERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import time
+import zlib
+from .query import Corpus, ROLES, ROLE_CODE
+
+MAX_DAY = 16
+MAX_ORDER = 4
+TALK, DIVINE, GUARD = 0, 1, 2
+DECISIONS = ("TALK", "DIVINE", "GUARD")
+SILENT, CLAIMER, SEER_CLAIM = 0, 1, 2
+TARGETS = ("SILENT", "CLAIMER", "SEER_CLAIM")
+SPECIAL = ("SEER", "MEDIUM", "BODYGUARD")
+BOOK_DTYPE = [("key", "u8"), ("option", "i1"), ("games", "i4"), ("wins", "i4")]
+
+
+def setting_key(player_num, role_num_map):
+    '''
+    32-bit key of a setting, roleNumMap as a dict of role -> count
+    '''
+    text = ",".join("{0}={1}".format(r, n) for r, n in sorted(role_num_map.items()) if n > 0)
+    return zlib.crc32(("{0}:".format(player_num) + text).encode()) & 0xffffffff
+
+
+def book_key(setting, role, decision):
+    return setting << 16 | ROLE_CODE[role] << 8 | decision
+
+
+def _shard_priors(corpus, shard):
+    '''
+    claim counts [role, day, order, 2] and book counts {(key, option): [games, wins]}
+    '''
+    import numpy as np
+    from .query import _players
+    from .vocab import TYPE_CODE
+    p = _players(corpus, shard)
+    claims = np.zeros((len(ROLES), MAX_DAY, MAX_ORDER, 2), dtype=np.int64)
+    made = p["claim"] >= 0
+    day = np.clip(p["claim_day"][made], 0, MAX_DAY - 1)
+    order = np.clip(p["claim_order"][made], 1, MAX_ORDER) - 1
+    genuine = p["claim"][made] == p["role"][made]
+    np.add.at(claims, (p["claim"][made], day, order, 0), 1)
+    np.add.at(claims, (p["claim"][made], day, order, 1), genuine)
+
+    # setting of each game, from the true roles of its players
+    games, pos = np.unique(p["game"], return_inverse=True)
+    counts = np.bincount(pos * len(ROLES) + p["role"], minlength=len(games) * len(ROLES))
+    counts = counts.reshape(len(games), len(ROLES))
+    settings = np.array([setting_key(int(row.sum()), dict(zip(ROLES, row.tolist()))) for row in counts],
+                        dtype=np.uint64)
+    setting = settings[pos]
+    book = {}
+
+    def count(rows, decision, options):
+        keys = (setting[rows] << np.uint64(16)) | (p["role"][rows].astype(np.uint64) << np.uint64(8)) \
+            | np.uint64(decision)
+        for key, option, won in zip(keys.tolist(), options.tolist(), p["won"][rows].tolist()):
+            entry = book.setdefault((key, option), [0, 0])
+            entry[0] += 1
+            entry[1] += won
+
+    day1 = made & (p["claim_day"] <= 1)
+    count(np.arange(len(p["game"])), TALK, np.where(day1, p["claim"], -1))
+
+    # the first divine and guard after the talks of day 1: the class of their target
+    s = corpus.shard(shard)
+    special = day1 & np.isin(p["claim"], [ROLE_CODE[r] for r in SPECIAL])
+    target_class = np.where(special, np.where(p["claim"] == ROLE_CODE["SEER"], SEER_CLAIM, CLAIMER), SILENT)
+    slot = dict(zip(zip(p["game"].tolist(), p["agent"].tolist()), range(len(p["game"]))))
+    for type_name, decision in (("divine", DIVINE), ("guard", GUARD)):
+        rows = np.flatnonzero((s.column("type") == TYPE_CODE[type_name]) & (s.column("day") == 1))
+        actor, target = [], []
+        seen = set()
+        for game, idx, agent in zip(s.column("game")[rows].tolist(), s.column("idx")[rows].tolist(),
+                                    s.column("agent")[rows].tolist()):
+            # server logs: the seer or bodyguard in idx, the target in agent
+            if game in seen or (game, idx) not in slot or (game, agent) not in slot:
+                continue
+            seen.add(game)
+            actor.append(slot[(game, idx)])
+            target.append(slot[(game, agent)])
+        if actor:
+            count(np.array(actor), decision, target_class[np.array(target)])
+    return claims, book
+
+
+def build_priors(cache_dir, out_dir, workers=0):
+    import numpy as np
+    corpus = Corpus(cache_dir, workers=workers)
+    try:
+        parts = corpus.map_shards(_shard_priors)
+    finally:
+        corpus.close()
+    claims = np.zeros((len(ROLES), MAX_DAY, MAX_ORDER, 2), dtype=np.int64)
+    book = {}
+    for shard_claims, shard_book in parts:
+        claims += shard_claims
+        for key, (games, wins) in shard_book.items():
+            entry = book.setdefault(key, [0, 0])
+            entry[0] += games
+            entry[1] += wins
+    rows = np.array([(key, option, games, wins) for (key, option), (games, wins) in book.items()],
+                    dtype=BOOK_DTYPE)
+    rows.sort(order=["key", "option"])
+    if not os.path.isdir(out_dir):
+        os.makedirs(out_dir)
+    np.save(os.path.join(out_dir, "claims.npy"), claims.astype(np.int32))
+    np.save(os.path.join(out_dir, "book.npy"), rows)
+    with open(os.path.join(out_dir, "priors.json"), "w") as f:
+        json.dump({"roles": list(ROLES), "games": len(corpus)}, f)
+    return {"games": len(corpus), "claims": int(claims[..., 0].sum()), "book": len(rows)}
+
+
+class Priors(object):
+
+    def __init__(self, path, mmap=True):
+        import numpy as np
+        with open(os.path.join(path, "priors.json")) as f:
+            meta = json.load(f)
+        if meta["roles"] != list(ROLES):
+            raise ValueError("priors " + path + " were built with other role codes")
+        mode = "r" if mmap else None
+        self.claims = np.load(os.path.join(path, "claims.npy"), mmap_mode=mode)
+        self.book = np.load(os.path.join(path, "book.npy"), mmap_mode=mode)
+
+    def genuine(self, role, day, order):
+        '''
+        probability that the order-th claim (1 first) of role, made on day, is
+        genuine, with a uniform prior
+        '''
+        claims, genuine = self.claims[ROLE_CODE[role], min(max(day, 0), MAX_DAY - 1),
+                                      min(max(order, 1), MAX_ORDER) - 1]
+        return (genuine + 1.0) / (claims + 2.0)
+
+    def options(self, player_num, role_num_map, role, decision):
+        # (option, games, wins) rows of one decision
+        key = book_key(setting_key(player_num, role_num_map), role, decision)
+        keys = self.book["key"]
+        lo, hi = keys.searchsorted(key, "left"), keys.searchsorted(key, "right")
+        return self.book[lo:hi]
+
+    def best(self, player_num, role_num_map, role, decision, min_games=30):
+        '''
+        option with the best win rate (uniform prior) among those played in
+        min_games games or more, None if there is none
+        '''
+        best, best_rate = None, -1.0
+        for option, games, wins in self.options(player_num, role_num_map, role, decision)[["option", "games", "wins"]].tolist():
+            rate = (wins + 1.0) / (games + 2.0)
+            if games >= min_games and rate > best_rate:
+                best, best_rate = option, rate
+        return best
+
+    def opening(self, player_num, role_num_map, role, min_games=30):
+        '''
+        the book's choice for each decision of the role, {decision name: option}
+        '''
+        opening = {}
+        for decision, name in enumerate(DECISIONS):
+            option = self.best(player_num, role_num_map, role, decision, min_games)
+            if option is not None:
+                opening[name] = option
+        return opening
+
+
+def load_priors(path, mmap=True):
+    return Priors(path, mmap)
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="compile priors and an opening book from a log cache")
+    argparser.add_argument("cache_dir")
+    argparser.add_argument("priors_dir")
+    argparser.add_argument("-j", type=int, dest="workers", default=0, help="processes (0: none)")
+    args = argparser.parse_args(argv)
+    t0 = time.perf_counter()
+    stats = build_priors(args.cache_dir, args.priors_dir, args.workers)
+    print("{0} games, {1} claims, {2} book rows in {3:.2f} s".format(
+        stats["games"], stats["claims"], stats["book"], time.perf_counter() - t0))
+
+
+if __name__ == '__main__':
+    main()
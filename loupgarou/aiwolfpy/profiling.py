@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+Profiling
+
+Opt-in spans over the stages of a request in ParsedSession: JSON decode,
+GameInfoParser.update, the diff (DataFrame construction), the agent callbacks
+and, inside the agent, whatever it marks with span() or @spanned. Every seat
+has its own Profiler, off unless a directory is configured. A request that is
+not sampled costs one attribute test per span.
+
+At FINISH the spans of the game are written to the directory, one file per
+process, game and seat:
+
+    chrome     PID-gameNNN-agentNN.json, Chrome trace events (chrome://tracing,
+               https://ui.perfetto.dev), one track per seat
+    collapsed  PID-gameNNN-agentNN.folded, "VOTE;update;minimal_score 1234"
+               lines of self time in us for flamegraph.pl or speedscope
+
+Requests are sampled per type, one in N ("TALK=10,WHISPER=10,*=1", 0 for
+never). cProfile can be run on one game of each seat, its stats are written
+next to the spans as PID-gameNNN-agentNN.prof (pstats). Games are numbered
+per seat in the process, 1 first, whether they are played on one connection
+or on a session each (aiwolfpy.server.play, tournament workers).
+
+Configured from LOUPGAROU_PROFILE (directory), LOUPGAROU_PROFILE_FORMAT,
+LOUPGAROU_PROFILE_SAMPLE and LOUPGAROU_PROFILE_GAME, so that tournament
+workers inherit it, or with configure().
+"""
+
+from __future__ import print_function, division
+import json
+import os
+import threading
+from time import perf_counter
+
+
+FORMATS = ("chrome", "collapsed")
+
+# configure() / environment, read when a session is created
+SETTINGS = {"path": None, "format": "chrome", "sample": {}, "game": None}
+
+# games started in this process per seat, sessions come and go between games
+_GAMES = {}
+_GAMES_LOCK = threading.Lock()
+
+
+def parse_sample(text):
+    '''
+    "TALK=10,VOTE=1,*=2" -> {"TALK": 10, "VOTE": 1, "*": 2}
+    '''
+    sample = {}
+    for item in text.split(","):
+        item = item.strip()
+        if item:
+            request, _, every = item.partition("=")
+            sample[request.strip().upper() if request.strip() != "*" else "*"] = int(every)
+    return sample
+
+
+def configure(path=None, fmt=None, sample=None, game=None):
+    # arguments left to None keep their setting, a game alone profiles into "."
+    if fmt is not None:
+        if fmt not in FORMATS:
+            raise ValueError("unknown profile format " + fmt)
+        SETTINGS["format"] = fmt
+    if sample is not None:
+        SETTINGS["sample"] = parse_sample(sample) if isinstance(sample, str) else dict(sample)
+    if game is not None:
+        SETTINGS["game"] = game
+        if path is None and SETTINGS["path"] is None:
+            path = "."
+    if path is not None:
+        SETTINGS["path"] = path
+
+
+class _NullSpan(object):
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL = _NullSpan()
+
+
+class _Span(object):
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter(self.name)
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler._exit()
+        return False
+
+
+class Profiler(object):
+    # spans of one seat, sampled per request and written at FINISH
+
+    def __init__(self, path=None, fmt="chrome", sample=None, game=None):
+        self.path = path
+        self.format = fmt
+        self.every = dict(sample or {})
+        self.cprofile_game = game
+        self.seat = 0
+        self.game = 0
+        self.counts = {}
+        self.active = False
+        # (path of names, start, end) of the sampled requests of this game
+        self.spans = []
+        self._stack = []
+        self._cprofile = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_settings(cls):
+        return cls(SETTINGS["path"], SETTINGS["format"], SETTINGS["sample"], SETTINGS["game"])
+
+    def start_game(self, seat):
+        self.seat = seat
+        with _GAMES_LOCK:
+            self.game = _GAMES[seat] = _GAMES.get(seat, 0) + 1
+        self.spans = []
+        if self.path is not None and self.game == self.cprofile_game:
+            import cProfile
+            self._cprofile = cProfile.Profile()
+
+    def begin(self, request, t_start):
+        # the request becomes the root of the spans if it is sampled
+        if self.path is None:
+            return
+        n = self.counts.get(request, 0)
+        self.counts[request] = n + 1
+        every = self.every.get(request, self.every.get("*", 1))
+        self.active = every > 0 and n % every == 0
+        if self.active:
+            self._stack = [((request,), t_start)]
+
+    def add(self, name, t_start, t_end):
+        # a span measured by the caller, under the root
+        if self.active:
+            self.spans.append((self._stack[0][0] + (name,), t_start, t_end))
+
+    def span(self, name):
+        return _Span(self, name) if self.active else _NULL
+
+    def _enter(self, name):
+        with self._lock:
+            parent = self._stack[-1][0] if self._stack else ("late",)
+            self._stack.append((parent + (name,), perf_counter()))
+
+    def _exit(self):
+        t_end = perf_counter()
+        with self._lock:
+            if self._stack:
+                names, t_start = self._stack.pop()
+                self.spans.append((names, t_start, t_end))
+
+    def end(self, t_end):
+        # closes the root; spans of a decision that outlives it stay open
+        if self.active:
+            with self._lock:
+                names, t_start = self._stack[0]
+                self.spans.append((names, t_start, t_end))
+                self._stack = self._stack[1:]
+            self.active = False
+
+    def cprofiled(self):
+        '''
+        context that runs cProfile during the profiled game, on the calling thread
+        '''
+        return self._cprofile if self._cprofile is not None else _NULL
+
+    def finish(self):
+        '''
+        writes the spans (and the cProfile stats) of the game, returns the paths
+        '''
+        if self.path is None:
+            return []
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path)
+        base = os.path.join(self.path, "{0}-game{1:03d}-agent{2:02d}".format(os.getpid(), self.game, self.seat))
+        written = []
+        if self.spans:
+            if self.format == "collapsed":
+                written.append(base + ".folded")
+                write_collapsed(self.spans, written[-1])
+            else:
+                written.append(base + ".json")
+                write_chrome(self.spans, written[-1], os.getpid(), self.seat)
+        if self._cprofile is not None:
+            written.append(base + ".prof")
+            self._cprofile.dump_stats(written[-1])
+            self._cprofile = None
+        self.spans = []
+        return written
+
+
+# a profiler that is never active, for agents outside a session
+OFF = Profiler()
+
+
+def spanned(name):
+    '''
+    decorator of agent methods, a span over the call when self.profiler is active
+    '''
+    def decorate(method):
+        def wrapper(self, *args, **kwargs):
+            with self.profiler.span(name):
+                return method(self, *args, **kwargs)
+        wrapper.__name__ = method.__name__
+        wrapper.__doc__ = method.__doc__
+        return wrapper
+    return decorate
+
+
+def self_times(spans):
+    '''
+    {path of names: self time in us}, the time of a span minus its children's
+    '''
+    totals = {}
+    for names, t_start, t_end in spans:
+        us = (t_end - t_start) * 1e6
+        totals[names] = totals.get(names, 0.0) + us
+        if len(names) > 1:
+            totals[names[:-1]] = totals.get(names[:-1], 0.0) - us
+    return totals
+
+
+def write_collapsed(spans, path):
+    with open(path, "w") as f:
+        for names, us in sorted(self_times(spans).items()):
+            if us >= 1:
+                f.write("{0} {1}\n".format(";".join(names), int(round(us))))
+
+
+def write_chrome(spans, path, pid, tid):
+    events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": tid,
+               "args": {"name": "Agent[{0:02d}]".format(tid)}}]
+    for names, t_start, t_end in sorted(spans, key=lambda s: (s[1], -s[2])):
+        events.append({"name": names[-1], "cat": names[0], "ph": "X", "pid": pid, "tid": tid,
+                       "ts": round(t_start * 1e6, 3), "dur": round((t_end - t_start) * 1e6, 3)})
+    with open(path, "w") as f:
+        f.write(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}, separators=(",", ":")))
+
+
+configure(os.environ.get("LOUPGAROU_PROFILE"), os.environ.get("LOUPGAROU_PROFILE_FORMAT"),
+          os.environ.get("LOUPGAROU_PROFILE_SAMPLE"),
+          int(os.environ["LOUPGAROU_PROFILE_GAME"]) if os.environ.get("LOUPGAROU_PROFILE_GAME") else None)
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+"""
+Query
+
+Aggregate queries over a log cache written by aiwolfpy.ingest. Rows can be
+filtered on game, day, type, agent, target, role and verb: target, role and
+verb come from the text (looked up once per vocabulary id, never per row),
+and each of them has a secondary index per shard (a stable argsort saved
+next to the shard as index-<field>.npy, built on first use), so a filter is
+a few binary searches. The other filters are applied on the rows found.
+Shards are queried in parallel by a process pool when workers > 0, each
+process memory-mapping the cache once.
+
+Game tables are also built per shard: players() (true role, first role
+claimed, whether the player won) and games() (length in days, winner).
+
+usage: python -m aiwolfpy.query CACHE_DIR count|groupby|seer-claims|game-length|index [...]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+from .ingest import LogCache
+from .vocab import TYPES, TYPE_CODE, verb_target
+
+FIELDS = ("game", "day", "type", "agent", "target", "role", "verb", "turn", "idx")
+INDEXED = ("day", "type", "agent", "target", "role", "verb")
+# role (or species) named in a text
+ROLES = ("VILLAGER", "SEER", "MEDIUM", "BODYGUARD", "POSSESSED", "WEREWOLF", "FREEMASON", "FOX", "HUMAN")
+ROLE_CODE = dict((r, i) for i, r in enumerate(ROLES))
+WEREWOLF_TEAM = (ROLE_CODE["WEREWOLF"], ROLE_CODE["POSSESSED"])
+VILLAGE, WEREWOLVES = 0, 1
+
+
+def text_fields(strings):
+    '''
+    verbs, and the verb code, target and role code of every text id
+    '''
+    import numpy as np
+    verbs, verb_codes, targets = verb_target(strings)
+    roles = np.full(len(strings), -1, dtype=np.int8)
+    for i, text in enumerate(strings):
+        word = text.rsplit(' ', 1)[-1]
+        if word in ROLE_CODE:
+            roles[i] = ROLE_CODE[word]
+    return verbs, verb_codes, targets, roles
+
+
+class _Shard(object):
+
+    def __init__(self, corpus, shard):
+        self.corpus = corpus
+        self.number = shard
+        self.path = os.path.join(corpus.cache.cache_dir, "shard-{0:05d}".format(shard))
+        self.arrays = corpus.cache.shards[shard]
+        self.derived = {}
+        self.indexes = {}
+
+    def __len__(self):
+        return len(self.arrays["day"])
+
+    def column(self, field):
+        if field in self.arrays:
+            return self.arrays[field]
+        col = self.derived.get(field)
+        if col is None:
+            lookup = {"verb": self.corpus.verb_codes, "target": self.corpus.targets,
+                      "role": self.corpus.roles}[field]
+            col = self.derived[field] = lookup[self.arrays["text"]]
+        return col
+
+    def index(self, field):
+        # (row order sorting the field, the sorted field)
+        import numpy as np
+        entry = self.indexes.get(field)
+        if entry is None:
+            path = os.path.join(self.path, "index-" + field + ".npy")
+            col = self.column(field)
+            if os.path.exists(path):
+                order = np.load(path, mmap_mode="r")
+            else:
+                order = np.argsort(col, kind="stable").astype(np.int32)
+                try:
+                    np.save(path, order)
+                except (IOError, OSError):
+                    # read-only cache: keep it in memory
+                    pass
+            entry = self.indexes[field] = (order, col[order])
+        return entry
+
+    def select(self, filters):
+        '''
+        sorted row numbers matching every filter (field -> array of values)
+        '''
+        import numpy as np
+        if not filters:
+            return np.arange(len(self))
+        games = self.corpus.cache.games
+        # candidate rows from the narrowest filter with an index
+        best = None
+        for field, values in filters.items():
+            if field == "game":
+                in_shard = games[np.isin(games["game"], values) & (games["shard"] == self.number)]
+                ranges = [(s, e) for s, e in zip(in_shard["start"], in_shard["stop"])]
+                order = None
+            elif field in INDEXED:
+                order, keys = self.index(field)
+                ranges = [(np.searchsorted(keys, v, "left"), np.searchsorted(keys, v, "right")) for v in values]
+            else:
+                continue
+            size = sum(e - s for s, e in ranges)
+            if best is None or size < best[0]:
+                best = (size, field, order, ranges)
+        if best is None:
+            rows = np.arange(len(self))
+            rest = filters
+        else:
+            _, field, order, ranges = best
+            parts = [np.arange(s, e) if order is None else np.asarray(order[s:e]) for s, e in ranges]
+            rows = np.sort(np.concatenate(parts)) if parts else np.zeros(0, dtype=np.int64)
+            rest = dict((f, v) for f, v in filters.items() if f != field)
+        for field, values in rest.items():
+            col = self.column(field)[rows]
+            rows = rows[np.isin(col, values)]
+        return rows
+
+
+class Corpus(object):
+
+    def __init__(self, cache_dir, workers=0):
+        self.cache = LogCache(cache_dir)
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.verbs, self.verb_codes, self.targets, self.roles = text_fields(self.cache.vocab.strings)
+        self.verb_code = dict((v, i) for i, v in enumerate(self.verbs))
+        self._shards = {}
+        self._pool = None
+
+    def __len__(self):
+        return len(self.cache)
+
+    def shard(self, i):
+        s = self._shards.get(i)
+        if s is None:
+            s = self._shards[i] = _Shard(self, i)
+        return s
+
+    def encode(self, filters):
+        '''
+        filter values (names, numbers or lists of them) -> arrays of codes
+        '''
+        import numpy as np
+        encoded = {}
+        for field, values in filters.items():
+            if values is None:
+                continue
+            if field not in FIELDS:
+                raise ValueError("unknown field " + field)
+            if not isinstance(values, (list, tuple)):
+                values = [values]
+            codes = []
+            for v in values:
+                if field == "type" and not isinstance(v, int):
+                    v = TYPE_CODE[v]
+                elif field == "role" and not isinstance(v, int):
+                    v = ROLE_CODE[v]
+                elif field == "verb" and not isinstance(v, int):
+                    # a verb no text has matches nothing
+                    v = self.verb_code.get(v, -2)
+                codes.append(int(v))
+            encoded[field] = np.unique(codes)
+        return encoded
+
+    def map_shards(self, task, *args):
+        '''
+        [task(corpus, shard, *args) for every shard], in the pool if any, so
+        task must be a module-level function
+        '''
+        shards = range(len(self.cache.shards))
+        if not self.workers:
+            return [task(self, i, *args) for i in shards]
+        if self._pool is None:
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(self.workers)
+        return list(self._pool.map(_remote, [self.cache_dir] * len(shards), [task] * len(shards),
+                                   shards, *[[a] * len(shards) for a in args]))
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def count(self, **filters):
+        return sum(self.map_shards(_count, self.encode(filters)))
+
+    def rows(self, fields=FIELDS, **filters):
+        import numpy as np
+        parts = self.map_shards(_rows, tuple(fields), self.encode(filters))
+        return dict((f, np.concatenate([p[f] for p in parts])) for f in fields)
+
+    def groupby(self, by, **filters):
+        '''
+        number of matching rows per value of the fields in by, {key tuple: count}
+        '''
+        counts = {}
+        for part in self.map_shards(_groupby, tuple(by), self.encode(filters)):
+            for key, n in part.items():
+                counts[key] = counts.get(key, 0) + n
+        return counts
+
+    def players(self):
+        import numpy as np
+        parts = self.map_shards(_players)
+        return dict((f, np.concatenate([p[f] for p in parts])) for f in parts[0]) if parts else {}
+
+    def games(self):
+        import numpy as np
+        parts = self.map_shards(_games)
+        return dict((f, np.concatenate([p[f] for p in parts])) for f in parts[0]) if parts else {}
+
+    def build_indexes(self):
+        self.map_shards(_build_indexes)
+
+
+# shard tasks, module level so a process pool can run them
+
+_CORPORA = {}
+
+
+def _remote(cache_dir, task, shard, *args):
+    corpus = _CORPORA.get(cache_dir)
+    if corpus is None:
+        corpus = _CORPORA[cache_dir] = Corpus(cache_dir)
+    return task(corpus, shard, *args)
+
+
+def _count(corpus, shard, filters):
+    return len(corpus.shard(shard).select(filters))
+
+
+def _rows(corpus, shard, fields, filters):
+    s = corpus.shard(shard)
+    rows = s.select(filters)
+    return dict((f, s.column(f)[rows]) for f in fields)
+
+
+def _groupby(corpus, shard, by, filters):
+    import numpy as np
+    s = corpus.shard(shard)
+    rows = s.select(filters)
+    if not len(rows):
+        return {}
+    keys = np.stack([s.column(f)[rows].astype(np.int64) for f in by], axis=1)
+    unique, counts = np.unique(keys, axis=0, return_counts=True)
+    return dict((tuple(int(x) for x in k), int(n)) for k, n in zip(unique, counts))
+
+
+def _build_indexes(corpus, shard):
+    for field in INDEXED:
+        corpus.shard(shard).index(field)
+
+
+def _shard_games(corpus, shard):
+    # ids and row ranges of the games of the shard
+    games = corpus.cache.games
+    games = games[games["shard"] == shard]
+    return games["game"], games["start"], games["stop"]
+
+
+def _games(corpus, shard):
+    import numpy as np
+    s = corpus.shard(shard)
+    players = _players(corpus, shard)
+    game_ids, starts, stops = _shard_games(corpus, shard)
+    day = s.column("day")
+    # games are runs of rows, their last day is the max over the run
+    length = np.zeros(len(game_ids), dtype=np.int16)
+    full = stops > starts
+    if full.any():
+        length[full] = np.maximum.reduceat(day, starts[full].astype(np.intp))
+    pos = np.searchsorted(game_ids, players["game"])
+    # the werewolves won where a player of their team won
+    wolf_won = (players["won"] & np.isin(players["role"], WEREWOLF_TEAM)).astype(float)
+    winner = np.where(np.bincount(pos, weights=wolf_won, minlength=len(game_ids)) > 0,
+                      WEREWOLVES, VILLAGE).astype(np.int8)
+    counts = np.bincount(pos, minlength=len(game_ids))
+    return {"game": game_ids.astype(np.int32), "length": length, "winner": winner,
+            "players": counts.astype(np.int16)}
+
+
+def _players(corpus, shard):
+    '''
+    one row per (game, agent): true role, first role claimed (-1 none), its
+    day and its order among the game's claims of that role (1 first), alive at
+    the end, won
+    '''
+    import numpy as np
+    s = corpus.shard(shard)
+    game, agent, type_ = s.column("game"), s.column("agent"), s.column("type")
+    role, verb, target = s.column("role"), s.column("verb"), s.column("target")
+    init = np.flatnonzero(type_ == TYPE_CODE["initialize"])
+    p_game, p_agent, p_role = game[init], agent[init].astype(np.int64), role[init]
+    stride = int(agent.max()) + 1 if len(agent) else 1
+    first = int(p_game.min()) if len(p_game) else 0
+    slot = dict(zip(((p_game - first) * stride + p_agent).tolist(), range(len(init))))
+
+    def lookup(rows):
+        keys = ((game[rows] - first) * stride + agent[rows]).tolist()
+        return np.array([slot.get(k, -1) for k in keys], dtype=np.int64)
+
+    claim = np.full(len(init), -1, dtype=np.int8)
+    claim_day = np.full(len(init), -1, dtype=np.int16)
+    claim_order = np.zeros(len(init), dtype=np.int16)
+    co = corpus.verb_code.get("COMINGOUT", -2)
+    rows = np.flatnonzero((type_ == TYPE_CODE["talk"]) & (verb == co) & (target == agent))
+    if len(rows):
+        who = lookup(rows)
+        # rows are in game order, keep the first claim of each player
+        who, first_row = np.unique(who, return_index=True)
+        keep = who >= 0
+        who, claim_rows = who[keep], rows[first_row[keep]]
+        claim[who] = role[claim_rows]
+        claim_day[who] = s.column("day")[claim_rows]
+        # rank of each claim among those of the same game and role, in row order
+        by_row = np.argsort(claim_rows, kind="stable")
+        group = (p_game[who] - first).astype(np.int64)[by_row] * 64 + claim[who][by_row]
+        ordered = np.argsort(group, kind="stable")
+        sorted_group = group[ordered]
+        starts = np.searchsorted(sorted_group, sorted_group, "left")
+        claim_order[who[by_row][ordered]] = np.arange(len(ordered)) - starts + 1
+    alive = np.ones(len(init), dtype=bool)
+    deaths = np.flatnonzero((type_ == TYPE_CODE["execute"]) | (type_ == TYPE_CODE["dead"]))
+    if len(deaths):
+        who = lookup(deaths)
+        alive[who[who >= 0]] = False
+    # winner of each player's game
+    game_ids, _, _ = _shard_games(corpus, shard)
+    pos = np.searchsorted(game_ids, p_game)
+    werewolves_won = np.zeros(len(game_ids), dtype=bool)
+    werewolves_won[np.unique(pos[(p_role == ROLE_CODE["WEREWOLF"]) & alive])] = True
+    team = np.isin(p_role, WEREWOLF_TEAM)
+    return {"game": p_game.astype(np.int32), "agent": p_agent.astype(np.int16), "role": p_role,
+            "claim": claim, "claim_day": claim_day, "claim_order": claim_order, "alive": alive, "won": team == werewolves_won[pos]}
+
+
+def seer_claims(corpus):
+    '''
+    players who claimed SEER first, real or not: count and win rate
+    '''
+    import numpy as np
+    p = corpus.players()
+    claimed = p["claim"] == ROLE_CODE["SEER"]
+    real = p["role"] == ROLE_CODE["SEER"]
+    out = []
+    for label, mask in (("real", claimed & real), ("fake", claimed & ~real)):
+        n = int(mask.sum())
+        out.append((label, n, float(p["won"][mask].mean()) if n else float('nan')))
+    return out
+
+
+def game_length(corpus):
+    '''
+    mean game length (days) per role, over the players holding it
+    '''
+    import numpy as np
+    g = corpus.games()
+    p = corpus.players()
+    length = g["length"][np.searchsorted(g["game"], p["game"])]
+    out = []
+    for code in np.unique(p["role"]):
+        if code < 0:
+            continue
+        mask = p["role"] == code
+        out.append((ROLES[code], int(mask.sum()), float(length[mask].mean())))
+    return out
+
+
+def main(argv=None):
+    import time
+    argparser = argparse.ArgumentParser(description="queries over a log cache written by aiwolfpy.ingest")
+    argparser.add_argument("cache_dir")
+    argparser.add_argument("command", choices=("count", "groupby", "seer-claims", "game-length", "index"))
+    argparser.add_argument("by", nargs="*", help="fields to group by (groupby)")
+    argparser.add_argument("-j", type=int, dest="workers", default=0, help="processes (0: none)")
+    for field in ("game", "day", "type", "agent", "target", "role", "verb", "turn", "idx"):
+        argparser.add_argument("--" + field, help="comma-separated values")
+    args = argparser.parse_args(argv)
+    filters = {}
+    for field in FIELDS:
+        value = getattr(args, field)
+        if value is not None:
+            filters[field] = [int(v) if v.lstrip('-').isdigit() else v for v in value.split(",")]
+    corpus = Corpus(args.cache_dir, workers=args.workers)
+    t0 = time.perf_counter()
+    try:
+        if args.command == "count":
+            print(corpus.count(**filters))
+        elif args.command == "groupby":
+            names = {"type": TYPES, "role": ROLES, "verb": corpus.verbs}
+            for key, n in sorted(corpus.groupby(args.by, **filters).items()):
+                print(" ".join(names[f][k] if f in names and k >= 0 else str(k)
+                               for f, k in zip(args.by, key)), n)
+        elif args.command == "seer-claims":
+            for label, n, rate in seer_claims(corpus):
+                print("{0} seers: {1} claims, win rate {2:.3f}".format(label, n, rate))
+        elif args.command == "game-length":
+            for role, n, mean in game_length(corpus):
+                print("{0:<10s} {1:>8d} players, {2:.2f} days".format(role, n, mean))
+        else:
+            corpus.build_indexes()
+    finally:
+        corpus.close()
+    print("({0:.2f} s over {1} games)".format(time.perf_counter() - t0, len(corpus)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,112 +1,117 @@
 import csv
-import pandas as pd
+import gzip
+from .vocab import TYPE_CODE, TextVocabulary, type_categorical
 
-def read_log(log_path):
-    
-    with open(log_path, newline='') as csvfile:
+def _open_log(log_path):
+    # plain or gzip-compressed (told by the magic number, not the extension)
+    with open(log_path, 'rb') as f:
+        magic = f.read(2)
+    if magic == b'\x1f\x8b':
+        return gzip.open(log_path, 'rt', newline='')
+    return open(log_path, newline='')
+
+def iter_log(log_path):
+    # rows (day, type, idx, turn, agent, text) of one server log, in order
+    with _open_log(log_path) as csvfile:
         log_reader = csv.reader(csvfile, delimiter=',')
-        agent_ = []
-        day_ = []
-        type_ = []
-        idx_ = []
-        turn_ = []
-        text_ = []
 
         # for medium result
         medium = 0
         for row in log_reader:
             if row[1] == "status" and int(row[0]) == 0:
-                agent_.append(int(row[2])), 
-                day_.append(int(row[0])), 
-                type_.append('initialize'), 
-                idx_.append(int(row[2])), 
-                turn_.append(0), 
-                text_.append('COMINGOUT Agent[' + "{0:02d}".format(int(row[2])) + '] ' + row[3])
+                yield (int(row[0]), 'initialize', int(row[2]), 0, int(row[2]),
+                       'COMINGOUT Agent[' + "{0:02d}".format(int(row[2])) + '] ' + row[3])
                 # medium
                 if row[3] == "MEDIUM":
                     medium = row[2]
             elif row[1] == "status":
                 pass
             elif row[1] == "talk":
-                agent_.append(int(row[4])), 
-                day_.append(int(row[0])), 
-                type_.append('talk'), 
-                idx_.append(int(row[2])), 
-                turn_.append(int(row[3])), 
-                text_.append(row[5])
+                yield (int(row[0]), 'talk', int(row[2]), int(row[3]), int(row[4]), row[5])
             elif row[1] == "whisper":
-                agent_.append(int(row[4])), 
-                day_.append(int(row[0])), 
-                type_.append('whisper'), 
-                idx_.append(int(row[2])), 
-                turn_.append(int(row[3])), 
-                text_.append(row[5])
+                yield (int(row[0]), 'whisper', int(row[2]), int(row[3]), int(row[4]), row[5])
             elif row[1] == "vote":
-                agent_.append(int(row[3])), 
-                day_.append(int(row[0])), 
-                type_.append('vote'), 
-                idx_.append(int(row[2])), 
-                turn_.append(0), 
-                text_.append('VOTE Agent[' + "{0:02d}".format(int(row[3])) + ']')
+                yield (int(row[0]), 'vote', int(row[2]), 0, int(row[3]),
+                       'VOTE Agent[' + "{0:02d}".format(int(row[3])) + ']')
             elif row[1] == "attackVote":
-                agent_.append(int(row[3])), 
-                day_.append(int(row[0])), 
-                type_.append('attack_vote'), 
-                idx_.append(int(row[2])), 
-                turn_.append(0), 
-                text_.append('ATTACK Agent[' + "{0:02d}".format(int(row[3])) + ']')
+                yield (int(row[0]), 'attack_vote', int(row[2]), 0, int(row[3]),
+                       'ATTACK Agent[' + "{0:02d}".format(int(row[3])) + ']')
             elif row[1] == "divine":
-                agent_.append(int(row[3])), 
-                day_.append(int(row[0])), 
-                type_.append('divine'), 
-                idx_.append(int(row[2])), 
-                turn_.append(0), 
-                text_.append('DIVINED Agent[' + "{0:02d}".format(int(row[3])) + '] ' + row[4])
+                yield (int(row[0]), 'divine', int(row[2]), 0, int(row[3]),
+                       'DIVINED Agent[' + "{0:02d}".format(int(row[3])) + '] ' + row[4])
             elif row[1] == "execute":
                 # for all
-                agent_.append(int(row[2])), 
-                day_.append(int(row[0])), 
-                type_.append('execute'), 
-                idx_.append(0), 
-                turn_.append(0), 
-                text_.append('Over')
+                yield (int(row[0]), 'execute', 0, 0, int(row[2]), 'Over')
                 # for medium
                 res = 'HUMAN'
                 if row[3] == 'WEREWOLF':
                     res = 'WEREWOLF'
-                agent_.append(int(row[2])), 
-                day_.append(int(row[0])), 
-                type_.append('identify'), 
-                idx_.append(medium), 
-                turn_.append(0), 
-                text_.append('IDENTIFIED Agent[' + "{0:02d}".format(int(row[2])) + '] ' + res)
+                yield (int(row[0]), 'identify', medium, 0, int(row[2]),
+                       'IDENTIFIED Agent[' + "{0:02d}".format(int(row[2])) + '] ' + res)
             elif row[1] == "guard":
-                agent_.append(int(row[3])), 
-                day_.append(int(row[0])), 
-                type_.append('guard'), 
-                idx_.append(int(row[2])), 
-                turn_.append(0), 
-                text_.append('GUARDED Agent[' + "{0:02d}".format(int(row[3])) + ']')
+                yield (int(row[0]), 'guard', int(row[2]), 0, int(row[3]),
+                       'GUARDED Agent[' + "{0:02d}".format(int(row[3])) + ']')
             elif row[1] == "attack":
-                agent_.append(int(row[2])), 
-                day_.append(int(row[0])), 
-                type_.append('attack'), 
-                idx_.append(0), 
-                turn_.append(0), 
-                text_.append('ATTACK Agent[' + "{0:02d}".format(int(row[2])) + ']')
+                yield (int(row[0]), 'attack', 0, 0, int(row[2]),
+                       'ATTACK Agent[' + "{0:02d}".format(int(row[2])) + ']')
                 if row[3] == 'true':
                     # dead
-                    agent_.append(int(row[2])), 
-                    day_.append(int(row[0])), 
-                    type_.append('dead'), 
-                    idx_.append(0), 
-                    turn_.append(0), 
-                    text_.append('Over')
+                    yield (int(row[0]), 'dead', 0, 0, int(row[2]), 'Over')
             elif row[1] == "result":
                 pass
             else:
                 pass
 
+def _columns(log_paths, categorical, vocab):
+    # column lists of the logs, game is the position of the log
+    game_ = []
+    day_ = []
+    type_ = []
+    idx_ = []
+    turn_ = []
+    agent_ = []
+    text_ = []
+    intern = vocab.intern
+    for game, log_path in enumerate(log_paths):
+        for day, type, idx, turn, agent, text in iter_log(log_path):
+            game_.append(game)
+            day_.append(day)
+            idx_.append(idx)
+            turn_.append(turn)
+            agent_.append(agent)
+            if categorical:
+                # codes and interned ids, the strings are shared by every game
+                type_.append(TYPE_CODE[type])
+                text_.append(intern(text))
+                idx_[-1] = int(idx)
+            else:
+                type_.append(type)
+                text_.append(text)
+    if categorical:
+        # and the numbers in the small dtypes of the columnar store
+        import numpy as np
+        day_ = np.array(day_, dtype=np.int16)
+        idx_ = np.array(idx_, dtype=np.int16)
+        turn_ = np.array(turn_, dtype=np.int16)
+        agent_ = np.array(agent_, dtype=np.int16)
+        type_ = type_categorical(type_)
+        text_ = vocab.categorical(text_)
+    return game_, {"day":day_, "type":type_, "idx":idx_, "turn":turn_, "agent":agent_, "text":text_}
+
+def read_log(log_path, categorical=False, vocab=None):
+    # categorical: type and text as pandas Categoricals (codes + a vocabulary
+    # of this call unless one is given, the categories are its texts)
+    import pandas as pd
+
+    _, columns = _columns([log_path], categorical, TextVocabulary() if vocab is None else vocab)
+    return pd.DataFrame(columns)
+
+def read_logs(log_paths, categorical=False, vocab=None):
+    # one frame for many logs, with a game column (position of the log)
+    import numpy as np
+    import pandas as pd
 
-    return pd.DataFrame({"day":day_, "type":type_, "idx":idx_, "turn":turn_, "agent":agent_, "text":text_})
-    
\ No newline at end of file
+    game_, columns = _columns(log_paths, categorical, TextVocabulary() if vocab is None else vocab)
+    frame = pd.DataFrame(columns)
+    frame.insert(0, "game", np.asarray(game_, dtype=np.int32))
+    return frame
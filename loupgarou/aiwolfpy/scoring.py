@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+Scoring
+
+Learned suspicion scorers: the probability that each player is a werewolf,
+from the rows of aiwolfpy.features X (one row per player). Inference is
+plain NumPy:
+
+    LinearScorer    logistic regression on standardized features
+    MLPScorer       one ReLU hidden layer, then a logistic output
+
+A scorer is saved as a directory holding scorer.json (kind and FEATURES)
+and one .npy file per array; load_scorer memory-maps the arrays, so an agent
+starts without reading or copying them. train_linear fits a LinearScorer on
+the output of aiwolfpy.features.load_features.
+
+usage: python -m aiwolfpy.scoring CACHE_DIR SCORER_DIR [--epochs N]
+"""
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+from .features import FEATURES, FEATURE_INDEX
+from .query import ROLE_CODE
+
+
+def _sigmoid(z):
+    import numpy as np
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+class Scorer(object):
+    # arrays, by name, saved and memory-mapped as <name>.npy; a scorer
+    # defines score(X), the werewolf probability of each row of X [..., F]
+    kind = None
+    arrays = ()
+
+    def __init__(self, **arrays):
+        for name in self.arrays:
+            setattr(self, name, arrays[name])
+
+
+class LinearScorer(Scorer):
+    kind = "linear"
+    arrays = ("mean", "scale", "w", "b")
+
+    def score(self, X):
+        return _sigmoid(((X - self.mean) / self.scale).dot(self.w) + self.b)
+
+
+class MLPScorer(Scorer):
+    kind = "mlp"
+    arrays = ("mean", "scale", "W1", "b1", "w2", "b2")
+
+    def score(self, X):
+        import numpy as np
+        hidden = np.maximum(((X - self.mean) / self.scale).dot(self.W1) + self.b1, 0)
+        return _sigmoid(hidden.dot(self.w2) + self.b2)
+
+
+SCORERS = dict((cls.kind, cls) for cls in (LinearScorer, MLPScorer))
+
+
+def save_scorer(scorer, path):
+    import numpy as np
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    for name in scorer.arrays:
+        np.save(os.path.join(path, name + ".npy"), np.asarray(getattr(scorer, name), dtype=np.float64))
+    with open(os.path.join(path, "scorer.json"), "w") as f:
+        json.dump({"kind": scorer.kind, "features": list(FEATURES)}, f)
+
+
+def load_scorer(path, mmap=True):
+    import numpy as np
+    with open(os.path.join(path, "scorer.json")) as f:
+        meta = json.load(f)
+    if meta["features"] != list(FEATURES):
+        raise ValueError("scorer " + path + " was trained on other features")
+    cls = SCORERS[meta["kind"]]
+    mode = "r" if mmap else None
+    return cls(**dict((name, np.load(os.path.join(path, name + ".npy"), mmap_mode=mode)) for name in cls.arrays))
+
+
+def training_rows(features):
+    '''
+    (X, y) rows of the living players on each day, y is 1 for a werewolf
+    '''
+    import numpy as np
+    X, roles = features["X"], features["y"]
+    days = X.shape[1]
+    labels = np.repeat(roles[:, None, :], days, axis=1)
+    keep = (X[:, :, :, FEATURE_INDEX["alive"]] > 0) & (labels >= 0)
+    return X[keep].astype(np.float64), (labels[keep] == ROLE_CODE["WEREWOLF"]).astype(np.float64)
+
+
+def train_linear(X, y, epochs=200, lr=0.5, l2=1e-4):
+    '''
+    logistic regression by full-batch gradient descent
+    '''
+    import numpy as np
+    mean = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[scale == 0] = 1.0
+    Z = (X - mean) / scale
+    w = np.zeros(X.shape[1])
+    b = np.log(max(y.mean(), 1e-6) / max(1 - y.mean(), 1e-6))
+    for _ in range(epochs):
+        error = _sigmoid(Z.dot(w) + b) - y
+        w -= lr * (Z.T.dot(error) / len(y) + l2 * w)
+        b -= lr * error.mean()
+    return LinearScorer(mean=mean, scale=scale, w=w, b=np.array(b))
+
+
+def log_loss(scorer, X, y):
+    import numpy as np
+    p = np.clip(scorer.score(X), 1e-9, 1 - 1e-9)
+    return float(-(y * np.log(p) + (1 - y) * np.log(1 - p)).mean())
+
+
+def main(argv=None):
+    from .features import featurize, load_features
+    argparser = argparse.ArgumentParser(description="train a linear suspicion scorer on a log cache")
+    argparser.add_argument("cache_dir")
+    argparser.add_argument("scorer_dir")
+    argparser.add_argument("--epochs", type=int, default=200)
+    args = argparser.parse_args(argv)
+    featurize(args.cache_dir)
+    X, y = training_rows(load_features(args.cache_dir))
+    scorer = train_linear(X, y, epochs=args.epochs)
+    save_scorer(scorer, args.scorer_dir)
+    print("{0} rows, log loss {1:.4f} (base rate {2:.3f})".format(len(y), log_loss(scorer, X, y), y.mean()))
+    for name, weight in sorted(zip(FEATURES, scorer.w), key=lambda fw: -abs(fw[1])):
+        print("{0:<20s} {1:+.3f}".format(name, weight))
+
+
+if __name__ == '__main__':
+    main()
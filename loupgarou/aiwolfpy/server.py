@@ -0,0 +1,582 @@
+# -*- coding: utf-8 -*-
+"""
+Server
+
+A local stand-in for aiwolf-server.jar: plays games with the packets the
+Java server sends (what tcpipclient_parsed understands) and writes the CSV
+logs read_log reads. Options are those of SampleSetting.cfg.
+
+Seats are either TCP connections (TcpSeat, any client, e.g.
+villager_agent.py -h localhost -p PORT) or agents in this process
+(LocalSeat, through a ParsedSession without sockets). Supported roles are
+VILLAGER, SEER, MEDIUM, BODYGUARD, POSSESSED and WEREWOLF.
+
+Each day: DAILY_INITIALIZE, talks (not on day 0 unless isTalkOnFirstDay),
+then DAILY_FINISH, votes with up to maxRevote revotes (not on day 0 unless
+isVotableInFirstDay), the divine, and from day 1 the whispers, the guard and
+the attack votes. The game ends after a night with no werewolf alive (village
+wins) or as many werewolves as humans alive (werewolves win).
+
+usage: python -m aiwolfpy.server [-p PORT] [-n PLAYERS] [-c SampleSetting.cfg] [-g GAMES] [-l LOG_DIR]
+"""
+
+from __future__ import print_function, division
+import argparse
+import collections
+import gzip
+import json
+import os
+import random
+import socket
+import sys
+from time import perf_counter
+from .framing import FrameDecoder
+
+ROLES = ("VILLAGER", "SEER", "MEDIUM", "BODYGUARD", "POSSESSED", "WEREWOLF")
+ROLE_NUM_MAPS = {
+    5: {"VILLAGER": 2, "SEER": 1, "POSSESSED": 1, "WEREWOLF": 1},
+    15: {"VILLAGER": 8, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "POSSESSED": 1, "WEREWOLF": 3},
+}
+# SampleSetting.cfg
+DEFAULT_SETTING = {
+    "maxTalk": 10,
+    "maxTalkTurn": 20,
+    "maxWhisper": 10,
+    "maxWhisperTurn": 20,
+    "maxSkip": 2,
+    "isEnableNoAttack": False,
+    "isVoteVisible": True,
+    "isVotableInFirstDay": False,
+    "isEnableNoExecution": False,
+    "isTalkOnFirstDay": False,
+    "isValidateUtterance": True,
+    "isWhisperBeforeRevote": False,
+    "randomSeed": None,
+    "timeLimit": 1000,
+    "maxRevote": 1,
+    "maxAttackRevote": 1,
+}
+OVER, SKIP = "Over", "Skip"
+WORDS = ("ESTIMATE", "COMINGOUT", "DIVINATION", "GUARD", "VOTE", "ATTACK", "DIVINED", "IDENTIFIED",
+         "GUARDED", "VOTED", "ATTACKED", "AGREE", "DISAGREE", "REQUEST", "INQUIRE", "BECAUSE", "DAY",
+         "NOT", "AND", "OR", "XOR", OVER, SKIP)
+
+
+def read_setting(path):
+    '''
+    gameSetting options of a SampleSetting.cfg file ("key = value" lines)
+    '''
+    setting = dict(DEFAULT_SETTING)
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if '=' not in line:
+                continue
+            key, value = [s.strip() for s in line.split('=', 1)]
+            if value.lower() in ("true", "false"):
+                setting[key] = value.lower() == "true"
+            else:
+                try:
+                    setting[key] = int(value)
+                except ValueError:
+                    setting[key] = value
+    return setting
+
+
+def valid_text(text):
+    # the first word, after an optional subject, must be a verb or an operator
+    words = text.split()
+    if words and words[0].startswith("Agent"):
+        words = words[1:]
+    return bool(words) and words[0] in WORDS
+
+
+class TcpSeat(object):
+    # a client connected to the server socket
+
+    def __init__(self, sock):
+        self.sock = sock
+        self.decoder = FrameDecoder()
+        self.frames = collections.deque()
+        # replies still owed for requests that timed out
+        self.late = 0
+        self.timeouts = 0
+
+    def request(self, packet, reply=False, timeout=None):
+        # reply text, None when none is expected or it did not come in time
+        self.sock.sendall((json.dumps(packet, separators=(',', ':')) + '\n').encode('utf-8'))
+        if not reply:
+            return None
+        expires = None if timeout is None else perf_counter() + timeout
+        while True:
+            while self.frames:
+                frame = self.frames.popleft()
+                if self.late:
+                    self.late -= 1
+                    continue
+                return frame
+            remaining = None if expires is None else expires - perf_counter()
+            if remaining is not None and remaining <= 0:
+                self.late += 1
+                self.timeouts += 1
+                return None
+            self.sock.settimeout(remaining)
+            try:
+                if self.decoder.recv_from(self.sock) == 0:
+                    raise ConnectionError("client closed the connection")
+            except socket.timeout:
+                continue
+            self.frames.extend(self.decoder.frames())
+
+    def close(self):
+        self.sock.close()
+
+
+class LocalSeat(object):
+    # an agent of this process, behind the same session as a TCP client
+
+    def __init__(self, agent, role='none', time_budget=0.8):
+        # decisions run under time_budget * the game's timeLimit, as over TCP
+        from .tcpipclient_parsed import ParsedSession
+        self.session = ParsedSession(agent, role, time_budget=time_budget)
+        self.timeouts = 0
+
+    def request(self, packet, reply=False, timeout=None):
+        # packets are built for each request and only read by the session,
+        # so they are handed over without a JSON round trip
+        answer = self.session.handle(packet)
+        self.session.sent()
+        return answer if reply else None
+
+    def close(self):
+        self.session.close()
+
+
+class _Day(object):
+    # what happened on one day
+
+    def __init__(self, day):
+        self.day = day
+        self.talks = []
+        self.whispers = []
+        self.votes = []
+        self.attack_votes = []
+        self.executed = -1
+        self.attacked = -1
+        self.guarded = -1
+        self.divine = None
+        self.medium = None
+        self.dead = []
+
+
+class Game(object):
+
+    def __init__(self, seats, setting=None, role_num_map=None, seed=None, log_path=None):
+        self.seats = seats
+        self.n = len(seats)
+        self.setting = dict(DEFAULT_SETTING, **(setting or {}))
+        self.role_num_map = dict(role_num_map or ROLE_NUM_MAPS.get(self.n) or {})
+        if sum(self.role_num_map.values()) != self.n:
+            raise ValueError("no roleNumMap for {0} players".format(self.n))
+        for role in self.role_num_map:
+            if role not in ROLES:
+                raise ValueError("unsupported role " + role)
+        if seed is None:
+            seed = self.setting.get("randomSeed")
+        self.rng = random.Random(seed)
+        self.log_path = log_path
+        self.log = []
+        self.names = {}
+        self.roles = {}
+        self.alive = {}
+        self.day = 0
+        self.today = _Day(0)
+        self.yesterday = _Day(-1)
+        self.remain_talk = {}
+        self.remain_whisper = {}
+        # talks and whispers of today already sent to each agent
+        self.talks_sent = {}
+        self.whispers_sent = {}
+        self.winner = None
+        time_limit = self.setting.get("timeLimit", -1)
+        self.timeout = time_limit / 1000.0 if time_limit and time_limit > 0 else None
+
+    # agents
+
+    def seat(self, agent):
+        return self.seats[agent - 1]
+
+    def living(self, role=None):
+        return [a for a in range(1, self.n + 1) if self.alive[a] and (role is None or self.roles[a] == role)]
+
+    def humans(self):
+        return [a for a in self.living() if self.roles[a] != "WEREWOLF"]
+
+    def game_setting(self):
+        # the cfg's isVoteVisible is voteVisible in the packets, as in GameSetting.java
+        setting = {}
+        for key, value in self.setting.items():
+            if key in DEFAULT_SETTING:
+                if key.startswith("is"):
+                    key = key[2].lower() + key[3:]
+                setting[key] = value
+        setting["playerNum"] = self.n
+        setting["roleNumMap"] = dict((r, self.role_num_map.get(r, 0)) for r in ROLES)
+        setting["enableRoleRequest"] = True
+        return setting
+
+    def info(self, agent, finish=False, latest_votes=None, latest_executed=None, latest_attack_votes=None):
+        '''
+        gameInfo as agent sees it
+        '''
+        role = self.roles[agent]
+        wolf = role == "WEREWOLF"
+        if finish:
+            role_map = dict((str(a), r) for a, r in self.roles.items())
+        else:
+            role_map = dict((str(a), r) for a, r in self.roles.items() if a == agent or wolf and r == "WEREWOLF")
+        yesterday = self.yesterday
+        info = {
+            "day": self.day,
+            "agent": agent,
+            "roleMap": role_map,
+            "statusMap": dict((str(a), "ALIVE" if self.alive[a] else "DEAD") for a in self.alive),
+            "remainTalkMap": dict((str(a), n) for a, n in self.remain_talk.items()),
+            "remainWhisperMap": dict((str(a), n) for a, n in self.remain_whisper.items()) if wolf else {},
+            "talkList": list(self.today.talks),
+            "whisperList": list(self.today.whispers) if wolf else [],
+            "voteList": list(yesterday.votes) if self.setting["isVoteVisible"] else [],
+            "executedAgent": yesterday.executed,
+            "attackVoteList": list(yesterday.attack_votes) if wolf else [],
+            "attackedAgent": yesterday.attacked if wolf else -1,
+            "guardedAgent": yesterday.guarded if role == "BODYGUARD" else -1,
+            "divineResult": yesterday.divine if role == "SEER" else None,
+            "mediumResult": yesterday.medium if role == "MEDIUM" else None,
+            "lastDeadAgentList": list(yesterday.dead),
+            "existingRoleList": sorted(r for r, n in self.role_num_map.items() if n > 0),
+            "cursedFox": -1,
+        }
+        if latest_votes is not None:
+            info["latestVoteList"] = list(latest_votes) if self.setting["isVoteVisible"] else []
+        if latest_executed is not None:
+            info["latestExecutedAgent"] = latest_executed
+        if latest_attack_votes is not None and wolf:
+            info["latestAttackVoteList"] = list(latest_attack_votes)
+        return info
+
+    def send(self, agent, request, reply=False, **latest):
+        packet = {"request": request, "gameInfo": None, "gameSetting": None,
+                  "talkHistory": None, "whisperHistory": None}
+        if request in ("TALK", "WHISPER", "DAILY_FINISH"):
+            # only what the agent has not seen yet
+            packet["talkHistory"] = self.today.talks[self.talks_sent.get(agent, 0):]
+            self.talks_sent[agent] = len(self.today.talks)
+            if self.roles[agent] == "WEREWOLF":
+                packet["whisperHistory"] = self.today.whispers[self.whispers_sent.get(agent, 0):]
+                self.whispers_sent[agent] = len(self.today.whispers)
+            else:
+                packet["whisperHistory"] = []
+        elif request in ("NAME", "ROLE"):
+            pass
+        else:
+            packet["gameInfo"] = self.info(agent, finish=request == "FINISH", **latest)
+            if request == "INITIALIZE":
+                packet["gameSetting"] = self.game_setting()
+        answer = self.seat(agent).request(packet, reply, self.timeout if request not in ("NAME", "ROLE") else None)
+        return None if answer is None else answer.strip()
+
+    def target(self, agent, request, **latest):
+        # agentIdx answered, None if not a number
+        answer = self.send(agent, request, True, **latest)
+        if answer is None:
+            return None
+        try:
+            value = json.loads(answer)
+            return int(value["agentIdx"] if isinstance(value, dict) else value)
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    # game
+
+    def assign(self):
+        # requested roles first while they remain, the rest at random
+        remaining = []
+        for role in ROLES:
+            remaining.extend([role] * self.role_num_map.get(role, 0))
+        self.rng.shuffle(remaining)
+        agents = list(range(1, self.n + 1))
+        self.rng.shuffle(agents)
+        requested = {}
+        for a in agents:
+            self.names[a] = self.send(a, "NAME", True) or "agent{0}".format(a)
+            role = self.send(a, "ROLE", True)
+            if role in remaining:
+                remaining.remove(role)
+                requested[a] = role
+        for a in agents:
+            self.roles[a] = requested.get(a) or remaining.pop()
+            self.alive[a] = True
+
+    def run(self):
+        '''
+        play the game, returns the winning team (VILLAGER or WEREWOLF)
+        '''
+        self.assign()
+        for a in range(1, self.n + 1):
+            self.send(a, "INITIALIZE")
+        while True:
+            self.day_phase()
+            self.night_phase()
+            if self.finished():
+                break
+            self.yesterday = self.today
+            self.day += 1
+            self.today = _Day(self.day)
+        humans, wolves = len(self.humans()), len(self.living("WEREWOLF"))
+        self.log.append("{0},result,{1},{2},{3}".format(self.day, humans, wolves, self.winner))
+        for a in range(1, self.n + 1):
+            self.send(a, "FINISH")
+        self.write_log()
+        return self.winner
+
+    def finished(self):
+        wolves = len(self.living("WEREWOLF"))
+        if wolves == 0:
+            self.winner = "VILLAGER"
+        elif wolves >= len(self.humans()):
+            self.winner = "WEREWOLF"
+        return self.winner is not None
+
+    def day_phase(self):
+        for a in range(1, self.n + 1):
+            self.log.append("{0},status,{1},{2},{3},{4}".format(
+                self.day, a, self.roles[a], "ALIVE" if self.alive[a] else "DEAD", self.names[a]))
+        self.remain_talk = dict((a, self.setting["maxTalk"]) for a in self.living())
+        self.remain_whisper = dict((a, self.setting["maxWhisper"]) for a in self.living("WEREWOLF"))
+        self.talks_sent = {}
+        self.whispers_sent = {}
+        for a in range(1, self.n + 1):
+            self.send(a, "DAILY_INITIALIZE")
+        if self.day > 0 or self.setting["isTalkOnFirstDay"]:
+            if self.day == 0:
+                self.conversation(True)
+            self.conversation(False)
+
+    def conversation(self, whisper):
+        '''
+        talk (or whisper) turns until everyone says Over
+        '''
+        if whisper:
+            speakers, remain, entries = self.living("WEREWOLF"), self.remain_whisper, self.today.whispers
+            request, kind, turns = "WHISPER", "whisper", self.setting["maxWhisperTurn"]
+        else:
+            speakers, remain, entries = self.living(), self.remain_talk, self.today.talks
+            request, kind, turns = "TALK", "talk", self.setting["maxTalkTurn"]
+        if not speakers:
+            return
+        skips = collections.Counter()
+        for turn in range(turns):
+            order = list(speakers)
+            self.rng.shuffle(order)
+            going_on = False
+            for a in order:
+                text = OVER
+                if remain.get(a, 0) > 0:
+                    text = self.send(a, request, True) or SKIP
+                    if self.setting["isValidateUtterance"] and not valid_text(text):
+                        text = SKIP
+                if text == SKIP:
+                    skips[a] += 1
+                    if skips[a] > self.setting["maxSkip"]:
+                        text = OVER
+                elif text != OVER:
+                    skips[a] = 0
+                entry = {"idx": len(entries), "day": self.day, "turn": turn, "agent": a, "text": text}
+                entries.append(entry)
+                self.log.append("{0},{1},{2},{3},{4},{5}".format(self.day, kind, entry["idx"], turn, a, text))
+                if text not in (OVER, SKIP):
+                    remain[a] -= 1
+                if text != OVER:
+                    going_on = True
+            if not going_on:
+                break
+
+    def night_phase(self):
+        for a in range(1, self.n + 1):
+            self.send(a, "DAILY_FINISH")
+        if self.day == 0 and not self.setting["isTalkOnFirstDay"]:
+            self.conversation(True)
+        if self.day > 0 or self.setting["isVotableInFirstDay"]:
+            self.execution()
+            # an execution can end the game, there is no night then
+            if self.finished():
+                return
+        latest = {"latest_votes": self.today.votes, "latest_executed": self.today.executed}
+        self.divination(latest)
+        if self.day > 0:
+            self.conversation(True)
+            self.guarding(latest)
+            self.attack(latest)
+
+    def elect(self, votes):
+        # agents with the most votes
+        counts = collections.Counter(v["target"] for v in votes)
+        if not counts:
+            return []
+        top = max(counts.values())
+        return [a for a, c in counts.items() if c == top]
+
+    def execution(self):
+        candidates = []
+        executed = -1
+        latest = None
+        for revote in range(self.setting["maxRevote"] + 1):
+            votes = []
+            for a in self.living():
+                target = self.target(a, "VOTE", latest_votes=latest)
+                if target is None or target == a or not self.alive.get(target, False):
+                    target = self.rng.choice([b for b in self.living() if b != a])
+                votes.append({"day": self.day, "agent": a, "target": target})
+                self.log.append("{0},vote,{1},{2}".format(self.day, a, target))
+            self.today.votes = votes
+            latest = votes
+            candidates = self.elect(votes)
+            if len(candidates) == 1:
+                executed = candidates[0]
+                break
+        if executed == -1 and candidates and not self.setting["isEnableNoExecution"]:
+            executed = self.rng.choice(candidates)
+        if executed == -1:
+            return
+        self.today.executed = executed
+        self.alive[executed] = False
+        self.log.append("{0},execute,{1},{2}".format(self.day, executed, self.roles[executed]))
+        for medium in self.living("MEDIUM"):
+            self.today.medium = {"day": self.day, "agent": medium, "target": executed,
+                                 "result": "WEREWOLF" if self.roles[executed] == "WEREWOLF" else "HUMAN"}
+
+    def divination(self, latest):
+        for seer in self.living("SEER"):
+            target = self.target(seer, "DIVINE", **latest)
+            if target is None or target == seer or not self.alive.get(target, False):
+                continue
+            species = "WEREWOLF" if self.roles[target] == "WEREWOLF" else "HUMAN"
+            self.today.divine = {"day": self.day, "agent": seer, "target": target, "result": species}
+            self.log.append("{0},divine,{1},{2},{3}".format(self.day, seer, target, species))
+
+    def guarding(self, latest):
+        for bodyguard in self.living("BODYGUARD"):
+            target = self.target(bodyguard, "GUARD", **latest)
+            if target is None or target == bodyguard or not self.alive.get(target, False):
+                continue
+            self.today.guarded = target
+            self.log.append("{0},guard,{1},{2},{3}".format(self.day, bodyguard, target, self.roles[target]))
+
+    def attack(self, latest):
+        wolves = self.living("WEREWOLF")
+        humans = self.humans()
+        if not wolves or not humans:
+            return
+        candidates = []
+        attacked = -1
+        latest_attack = None
+        for revote in range(self.setting["maxAttackRevote"] + 1):
+            if revote > 0 and self.setting["isWhisperBeforeRevote"]:
+                self.conversation(True)
+            votes = []
+            for a in wolves:
+                target = self.target(a, "ATTACK", latest_attack_votes=latest_attack, **latest)
+                if target is None or target not in humans:
+                    # no vote, unless attacking nobody is not allowed
+                    if self.setting["isEnableNoAttack"]:
+                        continue
+                    target = self.rng.choice(humans)
+                votes.append({"day": self.day, "agent": a, "target": target})
+                self.log.append("{0},attackVote,{1},{2}".format(self.day, a, target))
+            self.today.attack_votes = votes
+            latest_attack = votes
+            candidates = self.elect(votes)
+            if len(candidates) == 1:
+                attacked = candidates[0]
+                break
+        if attacked == -1 and candidates and not self.setting["isEnableNoAttack"]:
+            attacked = self.rng.choice(candidates)
+        if attacked == -1:
+            return
+        self.today.attacked = attacked
+        killed = attacked != self.today.guarded
+        if killed:
+            self.alive[attacked] = False
+            self.today.dead.append(attacked)
+        self.log.append("{0},attack,{1},{2}".format(self.day, attacked, "true" if killed else "false"))
+
+    def write_log(self):
+        if self.log_path is None:
+            return
+        directory = os.path.dirname(self.log_path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        data = ("\n".join(self.log) + "\n").encode('utf-8')
+        opener = gzip.open if self.log_path.endswith(".gz") else open
+        with opener(self.log_path, "wb") as f:
+            f.write(data)
+
+
+def play(agents, setting=None, role_num_map=None, seed=None, log_path=None, roles=None, time_budget=0.8):
+    '''
+    one game between agents of this process, returns (winner, roles by agentIdx);
+    time_budget=None lets the agents ignore timeLimit
+    '''
+    seats = [LocalSeat(agent, (roles or {}).get(i, 'none'), time_budget) for i, agent in enumerate(agents)]
+    game = Game(seats, setting, role_num_map, seed, log_path)
+    winner = game.run()
+    return winner, dict(game.roles)
+
+
+def serve(port, player_num, setting=None, games=1, log_dir=None, host="", seed=None):
+    '''
+    accept player_num clients and play games with them, returns the winners
+    '''
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind((host, port))
+    listener.listen(player_num)
+    seats = []
+    try:
+        while len(seats) < player_num:
+            sock, _ = listener.accept()
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            seats.append(TcpSeat(sock))
+        rng = random.Random(seed)
+        winners = []
+        for g in range(games):
+            log_path = None if log_dir is None else os.path.join(log_dir, "{0:03d}.log".format(g))
+            winners.append(Game(seats, setting, seed=rng.randrange(1 << 30), log_path=log_path).run())
+        return winners
+    finally:
+        for seat in seats:
+            seat.close()
+        listener.close()
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="local AIWolf game server")
+    argparser.add_argument("-p", type=int, dest="port", default=10000)
+    argparser.add_argument("-n", type=int, dest="players", default=15)
+    argparser.add_argument("-c", dest="config", default=None, help="SampleSetting.cfg")
+    argparser.add_argument("-g", type=int, dest="games", default=1)
+    argparser.add_argument("-l", dest="log_dir", default=None, help="directory of the game logs")
+    argparser.add_argument("-s", type=int, dest="seed", default=None)
+    args = argparser.parse_args(argv)
+    setting = read_setting(args.config) if args.config else None
+    print("waiting for {0} players on port {1}".format(args.players, args.port), file=sys.stderr)
+    start = perf_counter()
+    winners = serve(args.port, args.players, setting, args.games, args.log_dir, seed=args.seed)
+    elapsed = perf_counter() - start
+    counts = collections.Counter(winners)
+    print("{0} games in {1:.2f} s: VILLAGER {2}, WEREWOLF {3}".format(
+        len(winners), elapsed, counts["VILLAGER"], counts["WEREWOLF"]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Sweep
+
+Searches over the parameters of SampleAgent (aiwolfpy.params). Candidates
+come from a grid, from random samples in ranges, or go through successive
+halving (all candidates on few games, the best third on three times as many,
+and so on). They are evaluated in parallel, one process per candidate:
+
+    batch       aiwolfpy.batchsim, the candidate in every other seat and the
+                defaults in the others
+    tournament  the same over protocol games on aiwolfpy.server, with the
+                entrant class given (villager_agent.py:SampleAgent)
+
+A candidate's score is its win rate minus the defaults' win rate in the same
+games. All candidates of a round play with the same seed, so they meet the
+same deals. Every evaluation is appended to a JSONL cache as soon as it is
+done and looked up by parameters, games, seed and backend, so a sweep that
+is interrupted resumes where it stopped.
+
+usage: python -m aiwolfpy.sweep CACHE.jsonl [--grid NAME=V,V,...] [--range NAME=LOW:HIGH --samples N]
+           [--halving] [-g GAMES] [-j WORKERS] [--tournament ENTRANT]
+"""
+
+from __future__ import print_function, division
+import argparse
+import itertools
+import json
+import os
+import random
+import tempfile
+import time
+from .params import AgentParams, DEFAULTS
+
+
+def grid(space):
+    '''
+    every combination of space, {name: [values]}
+    '''
+    names = sorted(space)
+    return [dict(zip(names, values)) for values in itertools.product(*[space[n] for n in names])]
+
+
+def sample(ranges, n, seed=0):
+    '''
+    n candidates drawn uniformly in ranges, {name: (low, high)}
+    '''
+    rng = random.Random(seed)
+    return [dict((name, rng.uniform(low, high)) for name, (low, high) in sorted(ranges.items())) for _ in range(n)]
+
+
+def evaluate(params, games, seed, backend="batch", entrant=None):
+    '''
+    wins and seats of the candidate and of the defaults over games
+    '''
+    if backend == "batch":
+        import numpy as np
+        from .batchsim import simulate
+        assign = np.zeros((games, 15), dtype=np.int8)
+        assign[:, ::2] = 1
+        won = simulate(games, params=[{}, params], assign=assign, seed=seed)["won"]
+        mine, base = won[assign == 1], won[assign == 0]
+    elif backend == "tournament":
+        from .params import save_params
+        from .tournament import run
+        fd, path = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            save_params(AgentParams(**params), path)
+            results = run(["candidate=" + entrant + "@" + path, "default=" + entrant], games, workers=0, seed=seed)
+        finally:
+            os.remove(path)
+        mine, base = results["won"][results["entrant"] == 0], results["won"][results["entrant"] == 1]
+    else:
+        raise ValueError("unknown backend " + backend)
+    return {"wins": int(mine.sum()), "seats": int(len(mine)), "base_wins": int(base.sum()), "base_seats": int(len(base))}
+
+
+def score(record):
+    return record["wins"] / max(record["seats"], 1) - record["base_wins"] / max(record["base_seats"], 1)
+
+
+class ResultCache(object):
+    # evaluations by key, appended to a JSONL file
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        record = json.loads(line)
+                        self.records[self.key(record)] = record
+
+    @staticmethod
+    def key(record):
+        params = AgentParams(**record["params"]).key()
+        return (params, record["games"], record["seed"], record["backend"], record.get("entrant"))
+
+    def get(self, record):
+        return self.records.get(self.key(record))
+
+    def add(self, record):
+        self.records[self.key(record)] = record
+        with open(self.path, "a") as f:
+            f.write(json.dumps(record, sort_keys=True) + "\n")
+
+
+def _evaluate(record):
+    return record, evaluate(record["params"], record["games"], record["seed"], record["backend"], record.get("entrant"))
+
+
+def run_sweep(candidates, games, cache, workers=None, seed=0, backend="batch", entrant=None, log=print):
+    '''
+    records of the candidates (in their order), evaluated in parallel unless
+    cached; workers=0 evaluates in this process, None uses every core
+    '''
+    records = [{"params": AgentParams(**c).changed(), "games": games, "seed": seed, "backend": backend}
+               for c in candidates]
+    if entrant is not None:
+        for record in records:
+            record["entrant"] = entrant
+    todo = [r for r in records if cache.get(r) is None]
+    if log and len(todo) < len(records):
+        log("{0} of {1} candidates cached".format(len(records) - len(todo), len(records)))
+    if workers == 0:
+        done = map(_evaluate, todo)
+    else:
+        from concurrent.futures import ProcessPoolExecutor, as_completed
+        pool = ProcessPoolExecutor(workers)
+        done = (future.result() for future in as_completed([pool.submit(_evaluate, r) for r in todo]))
+    try:
+        for record, result in done:
+            record.update(result)
+            cache.add(record)
+            if log:
+                log("{0:+.4f} {1}".format(score(record), json.dumps(record["params"], sort_keys=True)))
+    finally:
+        if workers != 0:
+            pool.shutdown()
+    return [cache.get(r) for r in records]
+
+
+def successive_halving(candidates, games, cache, eta=3, workers=None, seed=0, backend="batch", entrant=None,
+                       log=print):
+    '''
+    evaluate on games, keep the best 1/eta, multiply games by eta, until one
+    is left; returns the records of the last round, best first
+    '''
+    round_ = 0
+    while True:
+        records = run_sweep(candidates, games, cache, workers, seed + round_, backend, entrant, log)
+        records.sort(key=score, reverse=True)
+        if log:
+            log("round {0}: {1} candidates on {2} games, best {3:+.4f}".format(
+                round_, len(records), games, score(records[0])))
+        if len(records) <= 1:
+            return records
+        keep = max(1, len(records) // eta)
+        candidates = [r["params"] for r in records[:keep]]
+        games *= eta
+        round_ += 1
+
+
+def _values(text):
+    name, _, values = text.partition("=")
+    if name not in DEFAULTS:
+        raise argparse.ArgumentTypeError("unknown parameter " + name)
+    return name, values
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="search SampleAgent parameters by self-play")
+    argparser.add_argument("cache", help="JSONL file of the evaluations")
+    argparser.add_argument("--grid", type=_values, action="append", default=[], help="NAME=V,V,...")
+    argparser.add_argument("--range", type=_values, action="append", default=[], help="NAME=LOW:HIGH")
+    argparser.add_argument("--samples", type=int, default=20, help="random candidates in the ranges")
+    argparser.add_argument("--halving", action="store_true", help="successive halving of the candidates")
+    argparser.add_argument("-g", type=int, dest="games", default=20000, help="games per candidate (first round)")
+    argparser.add_argument("-j", type=int, dest="workers", default=None, help="processes (0: none, default: cores)")
+    argparser.add_argument("-s", type=int, dest="seed", default=0)
+    argparser.add_argument("--tournament", dest="entrant", default=None,
+                           help="evaluate by protocol games of this entrant (MODULE:CLASS)")
+    args = argparser.parse_args(argv)
+    candidates = [{}]
+    if args.grid:
+        candidates = grid(dict((name, [float(v) for v in values.split(",")]) for name, values in args.grid))
+    if args.range:
+        ranges = dict((name, tuple(float(v) for v in values.split(":"))) for name, values in args.range)
+        randoms = sample(ranges, args.samples, args.seed)
+        candidates = [dict(c, **r) for c in candidates for r in randoms]
+    backend = "tournament" if args.entrant else "batch"
+    cache = ResultCache(args.cache)
+    start = time.perf_counter()
+    if args.halving:
+        records = successive_halving(candidates, args.games, cache, workers=args.workers, seed=args.seed,
+                                     backend=backend, entrant=args.entrant)
+    else:
+        records = run_sweep(candidates, args.games, cache, args.workers, args.seed, backend, args.entrant)
+        records.sort(key=score, reverse=True)
+    print("{0} candidates in {1:.1f} s, best:".format(len(candidates), time.perf_counter() - start))
+    for record in records[:10]:
+        print("{0:+.4f} ({1}/{2} vs {3}/{4}) {5}".format(score(record), record["wins"], record["seats"],
+                                                        record["base_wins"], record["base_seats"],
+                                                        json.dumps(record["params"], sort_keys=True)))
+
+
+if __name__ == '__main__':
+    main()
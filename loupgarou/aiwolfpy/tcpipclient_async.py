@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+TcpIpClient_async
+
+Hosts many parsed agents in one process: every seat is a coroutine on its
+own socket, agent callbacks run on a bounded thread pool so a slow update
+of one seat does not hold back the others.
+
+max_workers bounds that pool only. A seat whose decisions run under the
+timeLimit (time_budget) also keeps a decision thread of its own while a game
+is played: the pool thread waits on it, and a decision that outlives its
+deadline must not hold a thread the other seats need. The process runs up to
+max_workers + one thread per seat.
+"""
+
+from __future__ import print_function, division
+import asyncio
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from .framing import FrameDecoder
+from .tcpipclient_parsed import ParsedSession, parse_args
+
+
+async def connect_parse_async(agent, host, port, role='none', executor=None, latency_report=False,
+                              time_budget=0.8):
+    reader, writer = await asyncio.open_connection(host, port)
+    loop = asyncio.get_running_loop()
+    session = ParsedSession(agent, role, latency_report, time_budget)
+    decoder = FrameDecoder()
+    try:
+        while True:
+            data = await reader.read(8192)
+            if not data:
+                break
+            decoder.feed(data)
+            for frame in decoder.frames():
+                t_recv = perf_counter()
+                # callbacks of one seat stay sequential, seats run concurrently
+                reply = await loop.run_in_executor(executor, session.handle_frame, frame, t_recv)
+                if reply is not None:
+                    writer.write((reply + '\n').encode('utf-8'))
+                    await writer.drain()
+                session.sent()
+    except ConnectionResetError:
+        # expected error, connection reset by server
+        pass
+    finally:
+        session.close()
+        # close connection
+        writer.close()
+
+
+async def _serve(agents, host, port, roles, max_workers):
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        await asyncio.gather(*[connect_parse_async(agent, host, port, role, executor)
+                               for agent, role in zip(agents, roles)])
+    finally:
+        executor.shutdown(wait=True)
+
+
+def serve_agents(agents, host=None, port=None, role=None, max_workers=None):
+    # host/port/role default to the -h/-p/-r command line options,
+    # max_workers threads run the callbacks, each seat has its decision thread besides
+    if host is None or port is None:
+        arg_host, arg_port, arg_role = parse_args()
+        host = arg_host if host is None else host
+        port = arg_port if port is None else port
+        role = arg_role if role is None else role
+    if role is None or isinstance(role, str):
+        roles = [role or 'none'] * len(agents)
+    else:
+        roles = list(role)
+    if max_workers is None:
+        max_workers = min(32, len(agents))
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(_serve(agents, host, port, roles, max_workers))
+    finally:
+        loop.close()
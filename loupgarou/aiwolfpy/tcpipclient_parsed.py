@@ -12,177 +12,302 @@ import socket
 from socket import error as SocketError
 import errno
 import json
+import sys
+import traceback
+from time import perf_counter
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from .deadline import Deadline, DECISION_REQUESTS, fallback_answer
+from .framing import iter_frames
 from .gameinfoparser import GameInfoParser
+from .latency import LatencyRecorder
+from .profiling import Profiler
 
-def connect_parse(agent):
-    # parse Args
+
+def parse_args():
+    # parse Args, unknown options are left to the agent script
     parser = argparse.ArgumentParser(add_help=False)
     parser.add_argument('-p', type=int, action='store', dest='port')
     parser.add_argument('-h', type=str, action='store', dest='hostname')
     parser.add_argument('-r', type=str, action='store', dest='role', default='none')
-    input_args = parser.parse_args()
-    aiwolf_host = input_args.hostname
-    aiwolf_port = input_args.port
-    aiwolf_role = input_args.role
+    input_args, _ = parser.parse_known_args()
+    return input_args.hostname, input_args.port, input_args.role
+
+
+# base_info keys refreshed from game_info on every request
+BASE_INFO_KEYS = ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]
+
+
+def _agent_idx(idx):
+    return json.dumps({'agentIdx':int(idx)}, separators=(',', ':'))
+
+
+def _initialize(session, diff):
+    with session.profiler.span("initialize"):
+        session.agent.initialize(session.base_info, diff, session.game_setting)
+
+
+def _update(session, diff):
+    with session.profiler.span("update"):
+        session.agent.update(session.base_info, diff, session.request)
+
+
+def _daily_initialize(session, diff):
+    _update(session, diff)
+    with session.profiler.span("dayStart"):
+        session.agent.dayStart()
+
+
+def _finish(session, diff):
+    _update(session, diff)
+    with session.profiler.span("finish"):
+        session.agent.finish()
+
+
+def _vote(session, diff):
+    _update(session, diff)
+    with session.profiler.span("vote"):
+        return _agent_idx(session.agent.vote())
+
+
+def _attack(session, diff):
+    _update(session, diff)
+    with session.profiler.span("attack"):
+        return _agent_idx(session.agent.attack())
+
+
+def _guard(session, diff):
+    _update(session, diff)
+    with session.profiler.span("guard"):
+        return _agent_idx(session.agent.guard())
+
+
+def _divine(session, diff):
+    _update(session, diff)
+    with session.profiler.span("divine"):
+        return _agent_idx(session.agent.divine())
+
+
+def _talk(session, diff):
+    _update(session, diff)
+    with session.profiler.span("talk"):
+        return session.agent.talk()
+
+
+def _whisper(session, diff):
+    _update(session, diff)
+    with session.profiler.span("whisper"):
+        return session.agent.whisper()
+
+
+# request -> handler(session, diff), called after the shared state refresh
+HANDLERS = {
+    'NAME': lambda session, diff: session.agent.getName(),
+    'ROLE': lambda session, diff: session.role,
+    'INITIALIZE': _initialize,
+    'DAILY_INITIALIZE': _daily_initialize,
+    'DAILY_FINISH': _update,
+    'FINISH': _finish,
+    'VOTE': _vote,
+    'ATTACK': _attack,
+    'GUARD': _guard,
+    'DIVINE': _divine,
+    'TALK': _talk,
+    'WHISPER': _whisper,
+}
+
+# requests that carry no game state
+STATELESS_REQUESTS = ('NAME', 'ROLE')
+
+
+class ParsedSession(object):
+    # protocol state of one seat, independent of the transport
+
+    def __init__(self, agent, role='none', latency_report=False, time_budget=0.8):
+        self.agent = agent
+        self.role = role
+        # parser
+        # diff_data is a DataFrame unless the agent sets diff_format = "events"
+        # ("categorical": a DataFrame with dictionary-encoded type and text)
+        self.diff_format = getattr(agent, "diff_format", "dataframe")
+        self.parser = GameInfoParser(getattr(agent, "history_backend", "list"),
+                                     events=self.diff_format == "events",
+                                     categorical=self.diff_format == "categorical")
+        if hasattr(agent, "subscribe_events"):
+            agent.subscribe_events(self.parser)
+        # base_info
+        self.base_info = dict()
+        self.game_setting = None
+        self.request = None
+        # handlers can be replaced or added per session
+        self.handlers = dict(HANDLERS)
+        # latency: receive -> parse -> agent callback -> send
+        self.latency = LatencyRecorder()
+        self.latency_report = latency_report
+        self._stamps = None
+        # decisions run under time_budget * timeLimit, None disables it
+        self.deadline = Deadline(time_budget)
+        agent.deadline = self.deadline
+        self._worker = None
+        self._late = None
+        self._late_request = None
+        # opt-in spans per request (aiwolfpy.profiling), shared with the agent
+        self.profiler = Profiler.from_settings()
+        agent.profiler = self.profiler
+
+    def register(self, request, handler):
+        self.handlers[request] = handler
+
+    def refresh(self, obj_recv):
+        # shared state refresh, returns the parser diff
+        request = obj_recv['request']
+        game_info = obj_recv['gameInfo']
+        if game_info is None:
+            game_info = dict()
+        if request == 'INITIALIZE':
+            # game_setting
+            self.game_setting = obj_recv['gameSetting']
+            # base_info
+            self.base_info = dict()
+            self.base_info['agentIdx'] = game_info['agent']
+            self.base_info['myRole'] =  game_info["roleMap"][str(game_info['agent'])]
+            self.base_info["roleMap"] = game_info["roleMap"]
+            self.deadline.configure(self.game_setting)
+        for k in BASE_INFO_KEYS:
+            if k in game_info:
+                self.base_info[k] =  game_info[k]
+        if request == 'INITIALIZE':
+            with self.profiler.span("GameInfoParser.initialize"):
+                self.parser.initialize(game_info, self.game_setting)
+        else:
+            # talk_history and whisper_history
+            talk_history = obj_recv['talkHistory']
+            if talk_history is None:
+                talk_history = []
+            whisper_history = obj_recv['whisperHistory']
+            if whisper_history is None:
+                whisper_history = []
+            with self.profiler.span("GameInfoParser.update"):
+                self.parser.update(game_info, talk_history, whisper_history, request)
+        with self.profiler.span("diff"):
+            if self.diff_format == "events":
+                return self.parser.get_events_diff()
+            return self.parser.get_gamedf_diff()
+
+    def handle_frame(self, frame, t_recv=None):
+        # handle() of a received line, the decode is a span of the request
+        if t_recv is None:
+            t_recv = perf_counter()
+        obj_recv = json.loads(frame)
+        return self.handle(obj_recv, t_recv, perf_counter())
+
+    def handle(self, obj_recv, t_recv=None, t_decoded=None):
+        # returns the reply to send without its newline, None if no reply
+        if t_recv is None:
+            t_recv = perf_counter()
+        if self._late is not None:
+            # a timed out decision must finish before the state moves on
+            # its answer was replaced by the fallback, a failure is only reported
+            late, self._late = self._late, None
+            try:
+                late.result()
+            except Exception:
+                print("late {0} callback failed:".format(self._late_request), file=sys.stderr)
+                traceback.print_exc()
+        # request must exist
+        request = obj_recv['request']
+        self.request = request
+        self.deadline.start(t_recv)
+        handler = self.handlers.get(request)
+        if handler is None:
+            self._stamps = None
+            return None
+        profiler = self.profiler
+        if request == 'INITIALIZE':
+            # the seat is known from the game info
+            profiler.start_game(obj_recv['gameInfo']['agent'])
+        profiler.begin(request, t_recv)
+        if t_decoded is not None:
+            profiler.add("decode", t_recv, t_decoded)
+        diff = None
+        if request not in STATELESS_REQUESTS:
+            with profiler.cprofiled():
+                diff = self.refresh(obj_recv)
+        t_parsed = perf_counter()
+        if request in DECISION_REQUESTS and self.deadline.limit is not None:
+            reply = self._run_budgeted(handler, diff)
+        else:
+            reply = self._call(handler, diff)
+        self._stamps = (request, t_recv, t_parsed, perf_counter())
+        return reply
+
+    def _run_budgeted(self, handler, diff):
+        # anytime answer: whatever is known when the budget runs out is sent
+        # one decision thread per session, a late decision keeps only its own seat waiting
+        if self._worker is None:
+            self._worker = ThreadPoolExecutor(max_workers=1)
+        future = self._worker.submit(self._call, handler, diff)
+        try:
+            return future.result(timeout=self.deadline.remaining())
+        except FutureTimeoutError:
+            self._late = future
+            self._late_request = self.request
+            return fallback_answer(self.request, self.deadline, self.agent, self.base_info)
+
+    def _call(self, handler, diff):
+        # cProfile follows the callback to the thread that runs it
+        with self.profiler.cprofiled():
+            return handler(self, diff)
+
+    def close(self):
+        # stops the decision thread, also called by the transports on disconnect
+        if self._worker is not None:
+            self._worker.shutdown(wait=False)
+            self._worker = None
+
+    def sent(self):
+        # called by the transport once the reply (if any) is written
+        if self._stamps is None:
+            return
+        request, t_recv, t_parsed, t_agent = self._stamps
+        t_sent = perf_counter()
+        self._stamps = None
+        record = self.latency.record
+        record(request, "parse", t_parsed - t_recv)
+        record(request, "agent", t_agent - t_parsed)
+        record(request, "send", t_sent - t_agent)
+        record(request, "total", t_sent - t_recv)
+        profiler = self.profiler
+        if profiler.active:
+            profiler.add("send", t_agent, t_sent)
+            profiler.end(t_sent)
+        if request == 'FINISH':
+            profiler.finish()
+            # the decision thread is started again by the next game
+            self.close()
+        if request == 'FINISH' and self.latency_report:
+            print(self.latency.report(), file=sys.stderr)
+
+
+def connect_parse(agent, latency_report=False, time_budget=0.8):
+    aiwolf_host, aiwolf_port, aiwolf_role = parse_args()
 
     # socket
     sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     # connect
     sock.connect((aiwolf_host, aiwolf_port))
-    # parser
-    parser = GameInfoParser()
-    # base_info
-    line = ''
-    while True:
-        try:
-            # l01:recieve 8KB
-            line_recv = sock.recv(8192).decode('utf-8')
-            if line_recv == '':
-                break
-            buffer_flg = 1
-            while buffer_flg == 1:
-                # l02:there's more json
-                line += line_recv
-                if '}\n{' in line:
-                    # 2 jsons recieved, goto l02 after l03
-                    (line, line_recv) = line.split("\n", 1)
-                    buffer_flg = 1
-                else:
-                    # at most 1 json recieved, goto l01 after l03
-                    buffer_flg = 0
-                # parse json
-                try:
-                    # is this valid json?
-                    obj_recv = json.loads(line)
-                    # ok, goto l03
-                    line = ''
-                except ValueError:
-                    # if not, there's more to read, goto l01 now
-                    break
-                # l03 make game_info
-                # print(obj_recv)
-                game_info = obj_recv['gameInfo']
-                if game_info is None:
-                    game_info = dict()
-                # talk_history and whisper_history
-                talk_history = obj_recv['talkHistory']
-                if talk_history is None:
-                    talk_history = []
-                whisper_history = obj_recv['whisperHistory']
-                if whisper_history is None:
-                    whisper_history = []
-                # request must exist
-                # print(obj_recv['request'])
-                request = obj_recv['request']
-                
-                # run requested
-                if request == 'NAME':
-                    sock.send((agent.getName() + '\n').encode('utf-8'))
-                elif request == 'ROLE':
-                    sock.send((aiwolf_role+'\n').encode('utf-8'))
-                elif request == 'INITIALIZE':
-                    # game_setting
-                    game_setting = obj_recv['gameSetting']
-                    # base_info
-                    base_info = dict()
-                    base_info['agentIdx'] = game_info['agent']
-                    base_info['myRole'] =  game_info["roleMap"][str(game_info['agent'])]
-                    base_info["roleMap"] = game_info["roleMap"]
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    # parser
-                    parser.initialize(game_info, game_setting)
-                    agent.initialize(base_info, parser.get_gamedf_diff(), game_setting)
-                elif request == 'DAILY_INITIALIZE':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    agent.dayStart()
-                elif request == 'DAILY_FINISH':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                elif request == 'FINISH':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    agent.finish()
-                elif request == 'VOTE':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    #print("INSIDE tcpip-VOTE")
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((json.dumps({'agentIdx':int(agent.vote())}, separators=(',', ':')) + '\n').encode('utf-8'))
-                elif request == 'ATTACK':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((json.dumps({'agentIdx':int(agent.attack())}, separators=(',', ':')) + '\n').encode('utf-8'))
-                elif request == 'GUARD':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((json.dumps({'agentIdx':int(agent.guard())}, separators=(',', ':')) + '\n').encode('utf-8'))
-                elif request == 'DIVINE':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    #print("INSIDE tcpip-DIVINE")
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((json.dumps({'agentIdx':int(agent.divine())}, separators=(',', ':')) + '\n').encode('utf-8'))
-                elif request == 'TALK':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    #print("INSIDE tcpip-TALK")
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((agent.talk() + '\n').encode('utf-8'))
-                elif request == 'WHISPER':
-                    # update
-                    for k in ["day", "remainTalkMap", "remainWhisperMap", "statusMap"]:
-                        if k in game_info.keys():
-                            base_info[k] =  game_info[k]
-                    parser.update(game_info, talk_history, whisper_history, request)
-                    agent.update(base_info, parser.get_gamedf_diff(), request)
-                    # call
-                    sock.send((agent.whisper() + '\n').encode('utf-8'))
-        except SocketError as e:
-            if e.errno != errno.ECONNRESET:
-                raise
-            else:
-                # expected error, connection reset by server
-                pass
-            # close connection
-            sock.close()
-            break
+    session = ParsedSession(agent, aiwolf_role, latency_report, time_budget)
+    try:
+        for frame in iter_frames(sock):
+            reply = session.handle_frame(frame, perf_counter())
+            if reply is not None:
+                sock.send((reply + '\n').encode('utf-8'))
+            session.sent()
+    except SocketError as e:
+        if e.errno != errno.ECONNRESET:
+            raise
+        # expected error, connection reset by server
+    finally:
+        session.close()
+    # close connection
+    sock.close()
@@ -0,0 +1,314 @@
+# -*- coding: utf-8 -*-
+"""
+Tournament
+
+Many games between agent classes (entrants), sharded over a pool of worker
+processes, each running its own servers:
+
+    local   aiwolfpy.server in the worker, agents as in-process seats
+    java    aiwolf-server.jar (AutoStarter) on its own port per worker, the
+            agents connected with serve_agents
+
+An entrant is "[NAME=]MODULE:CLASS[@PARAMS]", MODULE a module name or the
+path of a .py file, CLASS called with the agent name, and with params= the
+object of the JSON file PARAMS if given (aiwolfpy.params for SampleAgent). The seats are filled with the
+entrants in turn. With the local server the seats also rotate: every block of
+playerNum games draws an agentIdx order and a role deal, then shifts the deal
+by one seat per game, so every seat plays every role once per block. The Java
+server deals the roles itself and the seats rotate between workers.
+
+Results are saved as results.npy (one row per player and game: game, agent,
+entrant, role, won) and results.json (entrants, roles, setting), and
+summarized as win rates per entrant and role with Wilson 95% intervals.
+
+usage: python -m aiwolfpy.tournament ENTRANT [ENTRANT ...] [-g GAMES] [-j WORKERS] [-o OUT_DIR]
+"""
+
+from __future__ import print_function, division
+import argparse
+import contextlib
+import importlib
+import json
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from .server import ROLES, ROLE_NUM_MAPS, read_setting
+
+RESULT_DTYPE = [("game", "i4"), ("agent", "i1"), ("entrant", "i1"), ("role", "i1"), ("won", "i1")]
+WEREWOLF_TEAM = ("WEREWOLF", "POSSESSED")
+JAVA_CLASSPATH = ("aiwolf-server.jar", "aiwolf-common.jar", "aiwolf-client.jar", "aiwolf-viewer.jar",
+                  "jsonic-1.3.10.jar")
+
+
+def parse_entrant(spec):
+    '''
+    (name, module, class, params path or None) of "[NAME=]MODULE:CLASS[@PARAMS]"
+    '''
+    name, _, target = spec.partition("=") if "=" in spec else ("", "", spec)
+    target, _, params = target.partition("@")
+    module, _, cls = target.rpartition(":")
+    if not module or not cls:
+        raise ValueError("entrant " + spec + " is not [NAME=]MODULE:CLASS[@PARAMS]")
+    return name or cls, module, cls, params or None
+
+
+def load_entrant(module, cls, params=None):
+    '''
+    a function of the agent name returning a new agent
+    '''
+    if params is not None:
+        with open(params) as f:
+            values = json.load(f)
+        factory = load_entrant(module, cls)
+        return lambda name: factory(name, params=values)
+    if module.endswith(".py"):
+        # agent scripts import their siblings (utility, parsing, ...)
+        path = os.path.dirname(os.path.abspath(module))
+        if path not in sys.path:
+            sys.path.insert(0, path)
+        module = os.path.splitext(os.path.basename(module))[0]
+    return getattr(importlib.import_module(module), cls)
+
+
+def team(role):
+    return "WEREWOLF" if role in WEREWOLF_TEAM else "VILLAGER"
+
+
+def wilson(wins, games, z=1.96):
+    '''
+    Wilson score interval (low, high) of a win rate
+    '''
+    if games == 0:
+        return 0.0, 1.0
+    p = wins / games
+    center = (p + z * z / (2 * games)) / (1 + z * z / games)
+    half = z * math.sqrt(p * (1 - p) / games + z * z / (4 * games * games)) / (1 + z * z / games)
+    return max(center - half, 0.0), min(center + half, 1.0)
+
+
+def deal(game, player_num, role_num_map, seed):
+    '''
+    agentIdx order of the seats and the role requested by each seat
+    '''
+    block, shift = divmod(game, player_num)
+    rng = random.Random(seed * 1000003 + block)
+    order = list(range(player_num))
+    rng.shuffle(order)
+    roles = []
+    for role in ROLES:
+        roles.extend([role] * role_num_map.get(role, 0))
+    rng.shuffle(roles)
+    return order, [roles[(s + shift) % player_num] for s in range(player_num)]
+
+
+def _play_local(entrants, games, player_num, setting, role_num_map, seed, quiet):
+    '''
+    result rows of some games on the in-process server
+    '''
+    from .server import play
+    classes = [load_entrant(*entrant[1:]) for entrant in entrants]
+    rows = []
+    for game in games:
+        order, roles = deal(game, player_num, role_num_map, seed)
+        # position in the agent list is agentIdx - 1
+        seat_of = dict((order[s], s) for s in range(player_num))
+        agents, requested = [], {}
+        for i in range(player_num):
+            s = seat_of[i]
+            agents.append(classes[s % len(classes)]("{0}{1}".format(entrants[s % len(classes)][0], s + 1)))
+            requested[i] = roles[s]
+        with _muted(quiet):
+            winner, dealt = play(agents, setting, role_num_map, seed * 1000003 + game, roles=requested)
+        for i in range(player_num):
+            role = dealt[i + 1]
+            rows.append((game, i + 1, seat_of[i] % len(classes), ROLES.index(role), team(role) == winner))
+    return rows
+
+
+def _play_java(entrants, games, player_num, setting_path, jar_dir, port, quiet):
+    '''
+    result rows of len(games) games on one AutoStarter, read from its logs
+    '''
+    from .tcpipclient_async import serve_agents
+    classes = [load_entrant(*entrant[1:]) for entrant in entrants]
+    work = tempfile.mkdtemp()
+    try:
+        ini = os.path.join(work, "AutoStarter.ini")
+        with open(ini, "w") as f:
+            f.write("lib=./\nlog={0}/\nport={1}\ngame={2}\nview=false\nsetting={3}\nagent={4}\n".format(
+                os.path.join(work, "log"), port, len(games), os.path.abspath(setting_path), player_num))
+        classpath = os.pathsep.join(JAVA_CLASSPATH)
+        server = subprocess.Popen(["java", "-cp", classpath, "org.aiwolf.ui.bin.AutoStarter", ini], cwd=jar_dir,
+                                  stdout=subprocess.DEVNULL if quiet else None)
+        # the seats rotate with the first game of the chunk
+        names = {}
+        agents = []
+        for s in range(player_num):
+            e = (s + games[0]) % len(classes)
+            name = "{0}{1}".format(entrants[e][0], s + 1)
+            names[name] = e
+            agents.append(classes[e](name))
+        try:
+            for attempt in range(100):
+                try:
+                    with _muted(quiet):
+                        serve_agents(agents, "localhost", port)
+                    break
+                except ConnectionRefusedError:
+                    # the JVM is still starting
+                    time.sleep(0.2)
+            server.wait()
+        finally:
+            if server.poll() is None:
+                server.kill()
+        rows = []
+        log_dir = os.path.join(work, "log")
+        logs = sorted(os.listdir(log_dir)) if os.path.isdir(log_dir) else []
+        for game, name in zip(games, logs):
+            winner, players = log_result(os.path.join(log_dir, name))
+            for agent, (role, player) in sorted(players.items()):
+                rows.append((game, agent, names.get(player, -1), ROLES.index(role), team(role) == winner))
+        return rows
+    finally:
+        shutil.rmtree(work)
+
+
+def log_result(log_path):
+    '''
+    (winner, {agentIdx: (role, name)}) of a server log
+    '''
+    from .read_log import _open_log
+    winner, players = None, {}
+    with _open_log(log_path) as f:
+        for line in f:
+            row = line.rstrip("\n").split(",")
+            if row[1] == "status" and row[0] == "0":
+                players[int(row[2])] = (row[3], row[5])
+            elif row[1] == "result":
+                winner = row[4]
+    return winner, players
+
+
+@contextlib.contextmanager
+def _muted(quiet):
+    # agents print every update, workers would flood the terminal
+    if not quiet:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def run(entrants, games, workers=None, player_num=15, setting=None, role_num_map=None, seed=0,
+        backend="local", jar_dir=None, port=10000, quiet=True):
+    '''
+    play games between entrants ("[NAME=]MODULE:CLASS"), returns the result
+    rows (RESULT_DTYPE), workers=0 plays in this process, None uses every core
+    '''
+    import numpy as np
+    entrants = [parse_entrant(e) for e in entrants]
+    if workers is None:
+        workers = os.cpu_count() or 1
+    role_num_map = role_num_map or ROLE_NUM_MAPS[player_num]
+    if backend == "local":
+        setting_dict = read_setting(setting) if setting else None
+        # small chunks keep the workers busy until the end
+        chunks = [list(range(games))[i::max(workers, 1) * 4] for i in range(max(workers, 1) * 4)]
+        tasks = [(_play_local, entrants, chunk, player_num, setting_dict, role_num_map, seed, quiet)
+                 for chunk in chunks if chunk]
+    elif backend == "java":
+        setting = setting or os.path.join(jar_dir, "SampleSetting.cfg")
+        n = max(workers, 1)
+        chunks = [list(range(games))[i * games // n:(i + 1) * games // n] for i in range(n)]
+        # one chunk per worker, so each port has a single server at a time
+        tasks = [(_play_java, entrants, chunk, player_num, setting, jar_dir, port + i, quiet)
+                 for i, chunk in enumerate(chunks) if chunk]
+    else:
+        raise ValueError("unknown backend " + backend)
+    if workers == 0:
+        parts = [_call(task) for task in tasks]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(workers) as pool:
+            parts = list(pool.map(_call, tasks))
+    rows = [row for part in parts for row in part]
+    results = np.array(rows, dtype=RESULT_DTYPE)
+    results.sort(order=["game", "agent"])
+    return results
+
+
+def _call(task):
+    return task[0](*task[1:])
+
+
+def save_results(results, entrants, path, **meta):
+    import numpy as np
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.save(os.path.join(path, "results.npy"), results)
+    meta = dict(meta, entrants=[parse_entrant(e)[0] for e in entrants], roles=list(ROLES))
+    with open(os.path.join(path, "results.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def load_results(path):
+    '''
+    (results, meta) saved by save_results
+    '''
+    import numpy as np
+    with open(os.path.join(path, "results.json")) as f:
+        meta = json.load(f)
+    return np.load(os.path.join(path, "results.npy")), meta
+
+
+def summary(results, names):
+    '''
+    [(entrant, role, games, wins, rate, low, high)], role "ALL" for every role
+    '''
+    table = []
+    for e, name in enumerate(names):
+        mine = results[results["entrant"] == e]
+        for role in ("ALL",) + ROLES:
+            rows = mine if role == "ALL" else mine[mine["role"] == ROLES.index(role)]
+            if len(rows) == 0:
+                continue
+            wins = int(rows["won"].sum())
+            low, high = wilson(wins, len(rows))
+            table.append((name, role, len(rows), wins, wins / len(rows), low, high))
+    return table
+
+
+def main(argv=None):
+    argparser = argparse.ArgumentParser(description="play a tournament between agent classes")
+    argparser.add_argument("entrants", nargs="+", help="[NAME=]MODULE:CLASS")
+    argparser.add_argument("-g", type=int, dest="games", default=100)
+    argparser.add_argument("-j", type=int, dest="workers", default=None, help="processes (0: none, default: cores)")
+    argparser.add_argument("-n", type=int, dest="players", default=15)
+    argparser.add_argument("-c", dest="setting", default=None, help="SampleSetting.cfg")
+    argparser.add_argument("-s", type=int, dest="seed", default=0)
+    argparser.add_argument("-o", dest="out", default=None, help="directory of results.npy")
+    argparser.add_argument("--java", dest="jar_dir", default=None, help="play on aiwolf-server.jar from this directory")
+    argparser.add_argument("-p", type=int, dest="port", default=10000, help="first port of the Java servers")
+    args = argparser.parse_args(argv)
+    start = time.perf_counter()
+    results = run(args.entrants, args.games, args.workers, args.players, args.setting, seed=args.seed,
+                  backend="java" if args.jar_dir else "local", jar_dir=args.jar_dir, port=args.port)
+    elapsed = time.perf_counter() - start
+    games = len(set(results["game"].tolist()))
+    print("{0} games in {1:.1f} s ({2:.1f} games/s)".format(games, elapsed, games / elapsed))
+    names = [parse_entrant(e)[0] for e in args.entrants]
+    print("{0:<16s} {1:<10s} {2:>6s} {3:>6s} {4:>6s}  {5}".format("entrant", "role", "games", "wins", "rate", "95%"))
+    for name, role, n, wins, rate, low, high in summary(results, names):
+        print("{0:<16s} {1:<10s} {2:>6d} {3:>6d} {4:>6.3f}  [{5:.3f}, {6:.3f}]".format(
+            name, role, n, wins, rate, low, high))
+    if args.out:
+        save_results(results, args.entrants, args.out, games=games, players=args.players, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
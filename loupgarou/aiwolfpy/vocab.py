@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""
+Vocab
+
+Dictionary encoding shared by the columnar game stores: the row type is one
+of a dozen fixed codes and texts are interned into integer ids. The same
+codes back the categorical frames (pandas imported only then).
+
+A vocabulary only grows, so each game history, read_log call or cache has its
+own: texts include free-form talk, and a process-wide table would grow for
+as long as the process plays.
+"""
+
+from __future__ import print_function, division
+import threading
+
+# row types produced by GameInfoParser and read_log
+TYPES = ('initialize', 'talk', 'whisper', 'vote', 'execute', 'identify',
+         'divine', 'guard', 'attack_vote', 'attack', 'dead', 'finish')
+TYPE_CODE = dict((t, i) for i, t in enumerate(TYPES))
+_TYPE_DTYPE = []
+
+
+def type_categorical(codes):
+    # type codes -> pandas Categorical over TYPES
+    import pandas as pd
+    if not _TYPE_DTYPE:
+        _TYPE_DTYPE.append(pd.CategoricalDtype(list(TYPES)))
+    return pd.Categorical.from_codes(codes, dtype=_TYPE_DTYPE[0])
+
+
+class TextVocabulary(object):
+    # text <-> id, ids are stable for the lifetime of the vocabulary
+
+    def __init__(self, strings=()):
+        self.strings = []
+        self.ids = {}
+        self._lock = threading.Lock()
+        self._dtype = None
+        for text in strings:
+            self.intern(text)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def intern(self, text):
+        i = self.ids.get(text)
+        if i is None:
+            with self._lock:
+                i = self.ids.get(text)
+                if i is None:
+                    i = len(self.strings)
+                    self.strings.append(text)
+                    self.ids[text] = i
+        return i
+
+    def decode(self, ids):
+        strings = self.strings
+        return [strings[i] for i in ids]
+
+    def dtype(self):
+        # CategoricalDtype over the texts so far, shared until a new text comes
+        import pandas as pd
+        with self._lock:
+            if self._dtype is None or len(self._dtype.categories) != len(self.strings):
+                self._dtype = pd.CategoricalDtype(list(self.strings))
+            return self._dtype
+
+    def categorical(self, ids):
+        # text ids -> pandas Categorical, the codes are the ids
+        import pandas as pd
+        return pd.Categorical.from_codes(ids, dtype=self.dtype())
+
+
+def verb_target(strings):
+    '''
+    verb and target of every text, for group-bys on text codes:
+    returns (verbs, verb code of each text, target agent of each text or -1),
+    as in verbs[verb_codes[frame.text.cat.codes]]
+    '''
+    import numpy as np
+    verbs = {}
+    verb_codes = np.empty(len(strings), dtype=np.int16)
+    targets = np.full(len(strings), -1, dtype=np.int16)
+    for i, text in enumerate(strings):
+        words = text.split()
+        # skip the subject of "Agent[01] VOTE Agent[02]"
+        if words and words[0].startswith('Agent[') and len(words) > 1:
+            words = words[1:]
+        verb = words[0] if words else ''
+        verb_codes[i] = verbs.setdefault(verb, len(verbs))
+        for w in words[1:]:
+            if w.startswith('Agent[') and w.endswith(']'):
+                targets[i] = int(w[6:-1])
+                break
+    return list(verbs), verb_codes, targets
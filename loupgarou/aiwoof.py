@@ -106,4 +106,6 @@ def parseArgs(args):
 
 if __name__ == '__main__':	
 	parseArgs(sys.argv[1:])
+	# this sample shows everything it receives
+	LOG.configure(DEBUG)
 	aiwolfpy.connect_parse(SampleAgent("AIWoof"))
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Memory of a corpus frame (read_logs) with type and text as Python strings
+against categorical columns, and the time of a group-by on verb and target:
+splitting every text against looking up the codes in vocab.verb_target.
+
+usage: python benchmarks/bench_categorical.py [-g GAMES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aiwolfpy
+from aiwolfpy.vocab import verb_target
+from bench_ingest import write_log
+
+
+def string_groupby(frame):
+    words = frame["text"].str.split()
+    verb = words.str[0]
+    target = frame["text"].str.extract(r'Agent\[(\d\d)\]', expand=False)
+    return frame.groupby([verb, target]).size()
+
+
+def code_groupby(frame):
+    # the categories of a frame are the texts of its vocabulary, by id
+    verbs, verb_codes, targets = verb_target(list(frame["text"].cat.categories))
+    codes = frame["text"].cat.codes.values
+    return frame.groupby([verb_codes[codes], targets[codes]]).size()
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=2000)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        logs = []
+        for g in range(args.games):
+            logs.append(os.path.join(tmp, "{0:06d}.log".format(g)))
+            write_log(logs[-1], g)
+        print("{0:<12s} {1:>9s} {2:>10s} {3:>12s}".format("columns", "rows", "memory MB", "group-by ms"))
+        for categorical in (False, True):
+            frame = aiwolfpy.read_logs(logs, categorical=categorical)
+            memory = frame.memory_usage(deep=True).sum() / 1e6
+            t0 = time.perf_counter()
+            (code_groupby if categorical else string_groupby)(frame)
+            elapsed = time.perf_counter() - t0
+            if categorical:
+                texts = len(frame["text"].cat.categories)
+            print("{0:<12s} {1:>9d} {2:>10.1f} {3:>12.1f}".format(
+                "categorical" if categorical else "strings", len(frame), memory, elapsed * 1e3))
+            del frame
+        print("vocabulary: {0} texts".format(texts))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
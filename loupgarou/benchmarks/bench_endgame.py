@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+endgame.decide in a 15 player game with 5 to 7 players alive: time of the
+first decision (empty transposition table) and of the same decision once
+the table is warm, with the table size and hit rate.
+
+usage: python benchmarks/bench_endgame.py [-n DECISIONS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import endgame
+from inference import RoleInference
+
+ROLE_NUM = {"WEREWOLF": 3, "POSSESSED": 1, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "VILLAGER": 8}
+
+
+def make_game(alive_num, player_num=15):
+    inference = RoleInference(player_num, ROLE_NUM, 0, "VILLAGER")
+    status = dict((str(i + 1), "ALIVE" if i < alive_num else "DEAD") for i in range(player_num))
+    # half of the dead were attacked, one of them found a werewolf before dying
+    for i in range(alive_num, player_num, 2):
+        inference.attacked(i)
+    inference.report(player_num - 1, 1, "WEREWOLF", "SEER")
+    inference.status(status)
+    beliefs = inference.solve()
+    worlds = {}
+    for wolves, _, completion in beliefs.support:
+        mask = sum(1 << i for i in wolves)
+        worlds[mask] = worlds.get(mask, 0) + completion[0]
+    return worlds, (1 << alive_num) - 1, list(range(1, alive_num))
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, dest='decisions', default=100)
+    args = argparser.parse_args()
+    print("{0:>5s} {1:<7s} {2:>7s} {3:>10s} {4:>10s} {5:>7s} {6:>7s}".format(
+        "alive", "request", "worlds", "cold ms", "warm ms", "states", "hits"))
+    for alive_num in (5, 6, 7):
+        worlds, alive, candidates = make_game(alive_num)
+        for request in ("VOTE", "ATTACK"):
+            table = endgame.TranspositionTable()
+            t0 = time.perf_counter()
+            endgame.decide(request, worlds, alive, candidates, table=table)
+            cold = time.perf_counter() - t0
+            table.hits = table.misses = 0
+            t0 = time.perf_counter()
+            for _ in range(args.decisions):
+                endgame.decide(request, worlds, alive, candidates, table=table)
+            warm = (time.perf_counter() - t0) / args.decisions
+            print("{0:>5d} {1:<7s} {2:>7d} {3:>10.3f} {4:>10.3f} {5:>7d} {6:>6.0%}".format(
+                alive_num, request, len(worlds), cold * 1e3, warm * 1e3, len(table),
+                table.hits / max(table.hits + table.misses, 1)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""
+Feature extraction: games/s of aiwolfpy.features on an ingested cache (first
+run, then with the features cached on disk) against featurize_frame on a
+read_logs frame. Synthetic 15 player logs are written to a temporary
+directory.
+
+usage: python benchmarks/bench_features.py [-g GAMES] [-j WORKERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aiwolfpy
+from aiwolfpy.ingest import ingest
+from aiwolfpy.features import featurize, featurize_frame, load_features
+from bench_ingest import write_log
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=5000)
+    argparser.add_argument('-j', type=int, dest='workers', default=0)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        logs = []
+        for g in range(args.games):
+            logs.append(os.path.join(tmp, "{0:06d}.log".format(g)))
+            write_log(logs[-1], g)
+        cache_dir = os.path.join(tmp, "cache")
+        ingest(logs, cache_dir, workers=0)
+        for name in ("cache, first run", "cache, cached"):
+            t0 = time.perf_counter()
+            featurize(cache_dir, workers=args.workers)
+            features = load_features(cache_dir)
+            elapsed = time.perf_counter() - t0
+            print("{0:<20s} {1:>8.2f} s {2:>10.0f} games/s".format(name, elapsed, args.games / elapsed))
+        print("X {0} ({1:.0f} MB), V {2} ({3:.0f} MB)".format(
+            features["X"].shape, features["X"].nbytes / 1e6, features["V"].shape, features["V"].nbytes / 1e6))
+        t0 = time.perf_counter()
+        frame = aiwolfpy.read_logs(logs)
+        featurize_frame(frame)
+        elapsed = time.perf_counter() - t0
+        print("{0:<20s} {1:>8.2f} s {2:>10.0f} games/s".format("read_logs frame", elapsed, args.games / elapsed))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
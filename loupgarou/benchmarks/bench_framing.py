@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+Throughput of the packet framing in connect_parse.
+
+Compares the former string-concatenating decoder with aiwolfpy.framing
+on recorded traffic (one JSON packet per line, as sent by the server) or,
+when no recording is given, on a synthetic game whose DAILY_FINISH
+packets carry the full talk history.
+
+usage: python benchmarks/bench_framing.py [recorded_traffic.jsonl] [-c CHUNK]
+"""
+
+from __future__ import print_function, division
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy.framing import FrameDecoder
+
+
+def synthetic_traffic(player_num=15, days=8, talks_per_day=150):
+    packets = []
+    talk_history = []
+    for day in range(days):
+        for turn in range(talks_per_day):
+            agent = turn % player_num + 1
+            talk_history.append({"day": day, "idx": len(talk_history), "turn": turn // player_num,
+                                 "agent": agent, "text": "ESTIMATE Agent[%02d] WEREWOLF" % (turn % player_num + 1)})
+            packets.append({"request": "TALK", "gameInfo": None, "gameSetting": None,
+                            "talkHistory": talk_history[-player_num:], "whisperHistory": None})
+        packets.append({"request": "DAILY_FINISH", "gameInfo": None, "gameSetting": None,
+                        "talkHistory": list(talk_history), "whisperHistory": None})
+    return b''.join(json.dumps(p, separators=(',', ':')).encode('utf-8') + b'\n' for p in packets)
+
+
+def legacy_decode(chunks):
+    # the loop formerly inlined in connect_parse
+    frames = 0
+    line = ''
+    for chunk in chunks:
+        line_recv = chunk.decode('utf-8')
+        buffer_flg = 1
+        while buffer_flg == 1:
+            line += line_recv
+            if '}\n{' in line:
+                (line, line_recv) = line.split("\n", 1)
+                buffer_flg = 1
+            else:
+                buffer_flg = 0
+            try:
+                json.loads(line)
+                line = ''
+            except ValueError:
+                break
+            frames += 1
+    return frames
+
+
+def frame_decode(chunks):
+    frames = 0
+    decoder = FrameDecoder()
+    for chunk in chunks:
+        decoder.feed(chunk)
+        for frame in decoder.frames():
+            json.loads(frame)
+            frames += 1
+    return frames
+
+
+def run(name, func, chunks, total_bytes, repeat):
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        frames = func(chunks)
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    print("{0:<14s} {1:>8d} frames {2:>12.0f} frames/s {3:>10.1f} MB/s".format(
+        name, frames, frames / best, total_bytes / best / 1e6))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('traffic', nargs='?', default=None)
+    parser.add_argument('-c', type=int, dest='chunk', default=8192)
+    parser.add_argument('-n', type=int, dest='repeat', default=3)
+    args = parser.parse_args()
+
+    if args.traffic is None:
+        data = synthetic_traffic()
+    else:
+        with open(args.traffic, 'rb') as f:
+            data = f.read()
+    chunks = [data[i:i + args.chunk] for i in range(0, len(data), args.chunk)]
+    print("{0} bytes in {1} chunks of {2} bytes".format(len(data), len(chunks), args.chunk))
+    run("legacy", legacy_decode, chunks, len(data), args.repeat)
+    run("FrameDecoder", frame_decode, chunks, len(data), args.repeat)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+Worlds/sec of inference.RoleInference.solve: the (werewolves, possessed)
+sets enumerated per second, with the time of one solve, for the standard
+5 and 15 player settings and a larger one, with no facts and with a few
+claims, counter-claims, reported results and attacks.
+
+usage: python benchmarks/bench_inference.py [-n SOLVES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from inference import RoleInference
+
+SETTINGS = (
+    (5, {"WEREWOLF": 1, "POSSESSED": 1, "SEER": 1, "VILLAGER": 2}),
+    (15, {"WEREWOLF": 3, "POSSESSED": 1, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "VILLAGER": 8}),
+    (20, {"WEREWOLF": 4, "POSSESSED": 1, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "VILLAGER": 12}),
+)
+
+
+def make_inference(player_num, role_num, facts):
+    inference = RoleInference(player_num, role_num, 0, "VILLAGER")
+    if facts:
+        # two seers contradicting each other, a medium, and a night attack
+        inference.report(1, 3, "WEREWOLF", "SEER")
+        inference.report(2, 3, "HUMAN", "SEER")
+        inference.report(4, 1, "HUMAN", "MEDIUM")
+        inference.attacked(player_num - 1)
+    return inference
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, dest='solves', default=5)
+    args = argparser.parse_args()
+    print("{0:>7s} {1:<6s} {2:>8s} {3:>14s} {4:>10s} {5:>12s}".format(
+        "players", "facts", "worlds", "assignments", "solve ms", "worlds/s"))
+    for player_num, role_num in SETTINGS:
+        for facts in (False, True):
+            inference = make_inference(player_num, role_num, facts)
+            t0 = time.perf_counter()
+            for _ in range(args.solves):
+                # facts changed since the last solve: no memoized completions
+                inference._changed()
+                beliefs = inference.solve()
+            elapsed = (time.perf_counter() - t0) / args.solves
+            print("{0:>7d} {1:<6s} {2:>8d} {3:>14d} {4:>10.2f} {5:>12.0f}".format(
+                player_num, "yes" if facts else "no", beliefs.worlds, beliefs.assignments,
+                elapsed * 1e3, beliefs.worlds / elapsed))
+
+
+if __name__ == '__main__':
+    main()
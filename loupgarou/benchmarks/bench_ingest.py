@@ -0,0 +1,130 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk log ingestion: logs/sec and peak RSS of read_log on every log against
+aiwolfpy.ingest (in process and with a process pool), and the time of one
+analysis pass (talk rows per agent) from the memory-mapped cache against
+parsing the CSV again. Synthetic 15 player logs are written to a temporary
+directory, gzip-compressed with -z. Each variant runs in its own process so
+its peak RSS is its own.
+
+usage: python benchmarks/bench_ingest.py [-g GAMES] [-j WORKERS] [-z]
+"""
+
+from __future__ import print_function, division
+import argparse
+import gzip
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ROLES = ["WEREWOLF"] * 3 + ["POSSESSED", "SEER", "MEDIUM", "BODYGUARD"] + ["VILLAGER"] * 8
+TALKS = ["ESTIMATE Agent[{0:02d}] WEREWOLF", "VOTE Agent[{0:02d}]", "COMINGOUT Agent[{0:02d}] SEER",
+         "DIVINED Agent[{0:02d}] HUMAN", "Skip", "Over"]
+
+
+def write_log(path, seed, player_num=15, compress=False):
+    rng = random.Random(seed)
+    roles = ROLES[:]
+    rng.shuffle(roles)
+    alive = list(range(1, player_num + 1))
+    lines = []
+    for a in alive:
+        lines.append("0,status,{0},{1},ALIVE,agent{0}".format(a, roles[a - 1]))
+    for day in range(1, 8):
+        for turn in range(5):
+            for i, a in enumerate(alive):
+                text = rng.choice(TALKS).format(rng.choice(alive))
+                lines.append("{0},talk,{1},{2},{3},{4}".format(day, turn * len(alive) + i, turn, a, text))
+        for a in alive:
+            lines.append("{0},vote,{1},{2}".format(day, a, rng.choice(alive)))
+        executed = rng.choice(alive)
+        alive.remove(executed)
+        lines.append("{0},execute,{1},{2}".format(day, executed, roles[executed - 1]))
+        lines.append("{0},divine,{1},{2},HUMAN".format(day, roles.index("SEER") + 1, rng.choice(alive)))
+        attacked = rng.choice(alive)
+        alive.remove(attacked)
+        lines.append("{0},attack,{1},true".format(day, attacked))
+    data = ("\n".join(lines) + "\n").encode()
+    if compress:
+        with gzip.open(path, "wb") as f:
+            f.write(data)
+    else:
+        with open(path, "wb") as f:
+            f.write(data)
+
+
+def run(mode, log_dir, cache_dir, workers):
+    # one variant, in the current process
+    import aiwolfpy
+    from aiwolfpy.ingest import find_logs, peak_rss, ingest, load_cache
+    logs = find_logs([log_dir])
+    t0 = time.perf_counter()
+    if mode == "read_log":
+        frames = [aiwolfpy.read_log(path) for path in logs]
+        count = len(frames)
+    elif mode == "ingest":
+        count = ingest(logs, cache_dir, workers=workers)["games"]
+    elif mode == "reparse":
+        # talk rows per agent over all games, from CSV
+        import numpy as np
+        counts = np.zeros(16, dtype=np.int64)
+        for path in logs:
+            for row in aiwolfpy.iter_log(path):
+                if row[1] == "talk":
+                    counts[row[4]] += 1
+        count = len(logs)
+    else:
+        # the same from the memory-mapped cache
+        import numpy as np
+        from aiwolfpy.vocab import TYPE_CODE
+        cache = load_cache(cache_dir)
+        counts = np.zeros(16, dtype=np.int64)
+        for shard in cache.shards:
+            talk = shard["type"] == TYPE_CODE["talk"]
+            counts += np.bincount(shard["agent"][talk], minlength=16)
+        count = len(cache)
+    elapsed = time.perf_counter() - t0
+    self_rss, children_rss = peak_rss()
+    print("{0:<10s} {1:>7d} {2:>9.2f} {3:>9.0f} {4:>9.0f} {5:>9.0f}".format(
+        mode + ("" if mode != "ingest" else " -j" + str(workers)), count, elapsed, count / elapsed,
+        self_rss or 0, children_rss or 0))
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=2000)
+    argparser.add_argument('-j', type=int, dest='workers', default=os.cpu_count() or 1)
+    argparser.add_argument('-z', action='store_true', dest='compress')
+    argparser.add_argument('--run', nargs=4, help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+    if args.run:
+        mode, log_dir, cache_dir, workers = args.run
+        run(mode, log_dir, cache_dir, int(workers))
+        return
+    tmp = tempfile.mkdtemp()
+    try:
+        log_dir = os.path.join(tmp, "logs")
+        os.makedirs(log_dir)
+        suffix = ".log.gz" if args.compress else ".log"
+        for g in range(args.games):
+            write_log(os.path.join(log_dir, "{0:06d}{1}".format(g, suffix)), g, compress=args.compress)
+        print("{0:<10s} {1:>7s} {2:>9s} {3:>9s} {4:>9s} {5:>9s}".format(
+            "variant", "games", "seconds", "logs/s", "RSS MB", "child MB"))
+        for mode, workers in (("read_log", 0), ("ingest", 0), ("ingest", args.workers), ("reparse", 0), ("cache", 0)):
+            cache_dir = os.path.join(tmp, "cache")
+            if mode == "ingest" and os.path.isdir(cache_dir):
+                shutil.rmtree(cache_dir)
+            subprocess.check_call([sys.executable, os.path.abspath(__file__), "--run", mode, log_dir, cache_dir,
+                                   str(workers)])
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+Cost per update of the agent's input dumps (printBaseInfo and printDiffData)
+on the calling thread: the former eager pretty-printing to stdout (here to
+/dev/null), utility.LOG below its level, and LOG at DEBUG writing JSONL from
+its background thread, on a 15 player base_info and a diff of 15 talks.
+
+usage: python benchmarks/bench_logging.py [-n UPDATES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import pandas as pd
+from tabulate import tabulate
+from utility import LOG, DEBUG, INFO, printBaseInfo, printDiffData
+
+
+def eager(base_info, diff_data):
+    # utility.printBaseInfo and printDiffData before the log
+    print("Base Info:")
+    print(json.dumps(base_info, indent=4))
+    print("Diff Data:")
+    print(tabulate(diff_data, headers='keys', tablefmt='psql'))
+
+
+def per_call(f, n, *args):
+    t0 = time.perf_counter()
+    for _ in range(n):
+        f(*args)
+    return (time.perf_counter() - t0) / n
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, dest='updates', default=2000)
+    args = argparser.parse_args()
+    base_info = {"agentIdx": 3, "myRole": "SEER", "day": 2,
+                 "statusMap": dict((str(i), "ALIVE") for i in range(1, 16)),
+                 "remainTalkMap": dict((str(i), 10) for i in range(1, 16)),
+                 "remainWhisperMap": {}, "roleMap": {"3": "SEER"}}
+    diff_data = pd.DataFrame({"day": [2] * 15, "type": ["talk"] * 15, "idx": list(range(15)),
+                              "turn": [0] * 15, "agent": list(range(1, 16)),
+                              "text": ["ESTIMATE Agent[{0:02d}] WEREWOLF".format(i % 15 + 1) for i in range(15)]})
+
+    def dumps():
+        printBaseInfo(base_info)
+        printDiffData(diff_data)
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        before = per_call(eager, max(args.updates // 10, 1), base_info, diff_data)
+    LOG.configure(INFO)
+    off = per_call(dumps, args.updates * 100)
+    disabled_call = per_call(LOG.debug, args.updates * 100, "Executing update...")
+    path = os.path.join(tempfile.mkdtemp(), "log.jsonl")
+    LOG.configure(DEBUG, path=path)
+    queued = per_call(dumps, args.updates)
+    t0 = time.perf_counter()
+    LOG.flush()
+    drain = time.perf_counter() - t0
+    LOG.close()
+    print("eager pretty-print:      {0:9.1f} us per update".format(before * 1e6))
+    print("LOG below DEBUG:         {0:9.3f} us per update ({1:.0f} ns per LOG.debug)".format(
+        off * 1e6, disabled_call * 1e9))
+    print("LOG at DEBUG, JSONL:     {0:9.1f} us per update on the caller, {1:.1f} ms left to the writer".format(
+        queued * 1e6, drain * 1e3))
+    print("{0} JSONL bytes per update".format(os.path.getsize(path) // args.updates))
+    os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+montecarlo.MonteCarloSearch in a 15 player game on day 2: samples/sec
+without and with the process pool, and decision quality against the time
+budget. Quality is measured against a reference search with many samples:
+how often the same vote is chosen, and the mean value lost (regret) when
+it is not.
+
+usage: python benchmarks/bench_montecarlo.py [-r REPEATS] [-w WORKERS ...]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy.deadline import Deadline
+from inference import RoleInference
+from montecarlo import MonteCarloSearch
+
+ROLE_NUM = {"WEREWOLF": 3, "POSSESSED": 1, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "VILLAGER": 8}
+
+
+def make_game(player_num=15, seed=0):
+    rng = np.random.RandomState(seed)
+    inference = RoleInference(player_num, ROLE_NUM, 0, "VILLAGER")
+    # a contested seer, a medium, one execution and one attack
+    inference.report(1, 3, "WEREWOLF", "SEER")
+    inference.report(2, 3, "HUMAN", "SEER")
+    inference.report(4, 5, "HUMAN", "MEDIUM")
+    inference.attacked(14)
+    status = dict((str(i + 1), "DEAD" if i in (13, 14) else "ALIVE") for i in range(player_num))
+    inference.status(status)
+    alive = [status[str(i + 1)] == "ALIVE" for i in range(player_num)]
+    # half of the players declared a vote
+    probs = np.ones([player_num, player_num]) / (player_num - 1)
+    np.fill_diagonal(probs, 0)
+    for v in rng.choice(player_num, player_num // 2, replace=False):
+        probs[v] *= 0.2
+        probs[v][rng.choice([1, 2, 3])] += 0.8
+    candidates = [i for i in range(1, player_num) if alive[i]]
+    return inference, inference.solve(), alive, candidates, probs
+
+
+def budget_deadline(seconds):
+    deadline = Deadline()
+    deadline.limit = seconds
+    deadline.start()
+    return deadline
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-r', type=int, dest='repeats', default=10)
+    argparser.add_argument('-w', type=int, dest='workers', nargs='*', default=[0, 1, 2, os.cpu_count() or 1])
+    args = argparser.parse_args()
+    inference, beliefs, alive, candidates, probs = make_game()
+
+    print("{0:>7s} {1:>8s} {2:>10s} {3:>10s}".format("workers", "samples", "ms", "samples/s"))
+    for workers in sorted(set(args.workers)):
+        search = MonteCarloSearch(workers=workers, max_samples=8192, budget=float('inf'), confidence=None, seed=0)
+        # the first decision starts the pool
+        search.decide("VOTE", inference, beliefs, alive, candidates, probs)
+        search.decide("VOTE", inference, beliefs, alive, candidates, probs)
+        print("{0:>7d} {1:>8d} {2:>10.1f} {3:>10.0f}".format(
+            workers, search.samples, search.elapsed * 1e3, search.samples / search.elapsed))
+
+    reference = MonteCarloSearch(max_samples=65536, budget=float('inf'), confidence=None, seed=1)
+    best = reference.decide("VOTE", inference, beliefs, alive, candidates, probs)
+    ref_values = dict(zip(candidates, reference.values))
+    print("reference vote {0} over {1} samples".format(best + 1, reference.samples))
+    print("{0:>9s} {1:>9s} {2:>7s} {3:>9s}".format("budget ms", "samples", "agree", "regret"))
+    for budget in (0.01, 0.03, 0.1, 0.3):
+        search = MonteCarloSearch(max_samples=1 << 20, margin=0, seed=2)
+        agree, regret, samples = 0, 0.0, 0
+        for _ in range(args.repeats):
+            choice = search.decide("VOTE", inference, beliefs, alive, candidates, probs, budget_deadline(budget))
+            samples += search.samples
+            if choice is None:
+                continue
+            agree += choice == best
+            regret += ref_values[best] - ref_values[choice]
+        print("{0:>9.0f} {1:>9.0f} {2:>7.0%} {3:>9.4f}".format(
+            budget * 1e3, samples / args.repeats, agree / args.repeats, regret / args.repeats))
+
+    # without a deadline: the default budget, stopping once the best is clear
+    search = MonteCarloSearch(seed=3)
+    choices = [search.decide("VOTE", inference, beliefs, alive, candidates, probs) for _ in range(args.repeats)]
+    print("no deadline ({0:.0f} ms budget): {1:.0f} ms, {2} samples, agree {3:.0%}".format(
+        search.budget * 1e3, search.elapsed * 1e3, search.samples, choices.count(best) / len(choices)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Per-request cost and memory of GameInfoParser storage backends.
+
+Replays a synthetic game (talk turns, votes, deaths) for 5, 15 and 50
+players and reports the mean time of parser.update + diff retrieval per
+request and the memory held by the row store at the end of the game.
+
+usage: python benchmarks/bench_parser.py [-d DAYS] [-t TURNS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy.gameinfoparser import GameInfoParser
+
+
+def game_requests(player_num, days, turns):
+    roles = dict((str(i), "VILLAGER") for i in range(1, player_num + 1))
+    base = {"agent": 1, "day": 0, "roleMap": {"1": "VILLAGER"}}
+    requests = []
+    for day in range(1, days + 1):
+        votes = [{"day": day - 1, "agent": a, "target": a % player_num + 1} for a in range(1, player_num + 1)]
+        info = dict(base, day=day, voteList=votes, executedAgent=day, mediumResult=None, divineResult=None,
+                    guardedAgent=-1, attackVoteList=[], attackedAgent=-1, lastDeadAgentList=[day + 1])
+        requests.append(('DAILY_INITIALIZE', info, []))
+        idx = 0
+        for turn in range(turns):
+            talks = []
+            for a in range(1, player_num + 1):
+                talks.append({"day": day, "idx": idx, "turn": turn, "agent": a,
+                              "text": "ESTIMATE Agent[%02d] WEREWOLF" % ((a + turn) % player_num + 1)})
+                idx += 1
+            requests.append(('TALK', dict(base, day=day), talks))
+        requests.append(('VOTE', dict(base, day=day), []))
+        requests.append(('DIVINE', dict(base, day=day, latestVoteList=votes, latestExecutedAgent=day), []))
+    finish = dict(base, day=days, roleMap=roles)
+    requests.append(('FINISH', finish, []))
+    return requests
+
+
+def replay(backend, diff, player_num, requests):
+    parser = GameInfoParser(backend)
+    parser.initialize({"agent": 1, "day": 0, "roleMap": {"1": "VILLAGER"}}, {"playerNum": player_num})
+    getattr(parser, diff)()
+    t0 = time.perf_counter()
+    for request, info, talks in requests:
+        parser.update(info, talks, [], request)
+        getattr(parser, diff)()
+    return parser, (time.perf_counter() - t0) / len(requests)
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-d', type=int, dest='days', default=7)
+    argparser.add_argument('-t', type=int, dest='turns', default=10)
+    args = argparser.parse_args()
+
+    print("{0:>7s} {1:<9s} {2:<16s} {3:>8s} {4:>13s} {5:>12s}".format(
+        "players", "backend", "diff", "rows", "us/request", "store KiB"))
+    for player_num in (5, 15, 50):
+        requests = game_requests(player_num, args.days, args.turns)
+        for backend, diff in (("list", "get_gamedf_diff"), ("columnar", "get_gamedf_diff"),
+                              ("columnar", "get_diff_arrays")):
+            replay(backend, diff, player_num, requests)
+            _, per_request = replay(backend, diff, player_num, requests)
+            tracemalloc.start()
+            parser, _ = replay(backend, diff, player_num, requests)
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            held = sum(s.size for s in snapshot.statistics('filename')
+                       if 'gamehistory' in s.traceback[0].filename or 'gameinfoparser' in s.traceback[0].filename)
+            print("{0:>7d} {1:<9s} {2:<16s} {3:>8d} {4:>13.1f} {5:>12.1f}".format(
+                player_num, backend, diff, len(parser.history), per_request * 1e6, held / 1024.0))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled priors: time to build them from an ingested cache, to open them
+(memory-mapped, as SampleAgent does once per process) and to look up the
+opening of a role and the genuineness of a claim, as initialize does.
+Synthetic 15 player logs are written to a temporary directory.
+
+usage: python benchmarks/bench_priors.py [-g GAMES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy.ingest import ingest
+from aiwolfpy.priors import build_priors, load_priors
+from bench_ingest import write_log
+
+ROLE_NUM_MAP = {"WEREWOLF": 3, "POSSESSED": 1, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "VILLAGER": 8}
+
+
+def per_call(f, repeat=1000):
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        f()
+    return (time.perf_counter() - t0) / repeat * 1e6
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=2000)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        logs = []
+        for g in range(args.games):
+            logs.append(os.path.join(tmp, "{0:06d}.log".format(g)))
+            write_log(logs[-1], g)
+        cache_dir = os.path.join(tmp, "cache")
+        priors_dir = os.path.join(tmp, "priors")
+        ingest(logs, cache_dir, workers=0)
+        t0 = time.perf_counter()
+        stats = build_priors(cache_dir, priors_dir)
+        print("build: {0:.2f} s for {1} games, {2} book rows".format(
+            time.perf_counter() - t0, stats["games"], stats["book"]))
+        print("open (mmap):        {0:8.1f} us".format(per_call(lambda: load_priors(priors_dir), 200)))
+        priors = load_priors(priors_dir)
+        print("opening of a role:  {0:8.1f} us".format(per_call(lambda: priors.opening(15, ROLE_NUM_MAP, "SEER"))))
+        print("genuine(SEER, 1, 2): {0:7.1f} us".format(per_call(lambda: priors.genuine("SEER", 1, 2))))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+"""
+Cost of aiwolfpy.profiling on 15 player games of aiwolfpy.server.play with
+agents that answer at random (so that the time is the session's): profiling
+off, spans of every request, spans of one in 10 TALK/WHISPER, and one game
+under cProfile. Prints the size of what is written at FINISH.
+
+usage: python benchmarks/bench_profiling.py [-g GAMES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy import profiling
+from aiwolfpy.server import play
+from bench_server import RandomAgent
+
+
+def per_game(games):
+    t0 = time.perf_counter()
+    for g in range(games):
+        play([RandomAgent("random{0}".format(i), g * 100 + i) for i in range(15)], seed=g)
+    return (time.perf_counter() - t0) / games
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=20)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        off = per_game(args.games)
+        print("profiling off:            {0:7.1f} ms per game".format(off * 1e3))
+        runs = [("spans of every request", "chrome", "*=1"),
+                ("collapsed, TALK 1 in 10", "collapsed", "TALK=10,WHISPER=10")]
+        for label, fmt, sample in runs:
+            path = os.path.join(tmp, fmt)
+            profiling.configure(path, fmt, sample)
+            elapsed = per_game(args.games)
+            size = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+            print("{0:<25s} {1:7.1f} ms per game ({2:+.0f}%), {3:.0f} kB written per game".format(
+                label + ":", elapsed * 1e3, (elapsed / off - 1) * 100, size / 1024 / args.games))
+        # the next game of every seat, without spans
+        profiling.configure(os.path.join(tmp, "cprofile"), sample="*=0", game=profiling._GAMES[1] + 1)
+        elapsed = per_game(1)
+        print("{0:<25s} {1:7.1f} ms ({2:+.0f}%)".format("game under cProfile:", elapsed * 1e3, (elapsed / off - 1) * 100))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Queries over an ingested corpus: votes on one agent on day 2, COMINGOUT SEER
+talks per day, and the seer-claim and game-length reports, through the
+indexes of aiwolfpy.query against the same filters on a read_logs frame.
+Synthetic 15 player logs are written to a temporary directory.
+
+usage: python benchmarks/bench_query.py [-g GAMES] [-j WORKERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aiwolfpy
+from aiwolfpy.ingest import ingest
+from aiwolfpy.query import Corpus, seer_claims, game_length
+from bench_ingest import write_log
+
+
+def timed(f):
+    t0 = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - t0
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=2000)
+    argparser.add_argument('-j', type=int, dest='workers', default=0)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        logs = []
+        for g in range(args.games):
+            logs.append(os.path.join(tmp, "{0:06d}.log".format(g)))
+            write_log(logs[-1], g)
+        cache_dir = os.path.join(tmp, "cache")
+        ingest(logs, cache_dir, workers=0, shard_rows=1 << 18)
+        frame, read_time = timed(lambda: aiwolfpy.read_logs(logs))
+        print("read_logs: {0:.2f} s for {1} rows".format(read_time, len(frame)))
+
+        corpus = Corpus(cache_dir, workers=args.workers)
+        _, build_time = timed(corpus.build_indexes)
+        print("indexes of {0} shards: {1:.2f} s".format(len(corpus.cache.shards), build_time))
+        print("{0:<22s} {1:>10s} {2:>10s} {3:>9s}".format("query", "frame ms", "query ms", "result"))
+        queries = [
+            ("votes on 3, day 2",
+             lambda: int(((frame.type == "vote") & (frame.day == 2) & (frame.agent == 3)).sum()),
+             lambda: corpus.count(type="vote", day=2, target=3)),
+            ("seer claims per day",
+             lambda: len(frame[(frame.type == "talk") & frame.text.str.startswith("COMINGOUT")
+                               & frame.text.str.endswith("SEER")].groupby("day").size()),
+             lambda: len(corpus.groupby(["day"], type="talk", verb="COMINGOUT", role="SEER"))),
+            ("talks of 2 games",
+             lambda: int((frame.game.isin([5, 250]) & (frame.type == "talk")).sum()),
+             lambda: corpus.count(game=[5, 250], type="talk")),
+        ]
+        for name, scan, query in queries:
+            expected, scan_time = timed(scan)
+            result, query_time = timed(query)
+            assert expected == result, (name, expected, result)
+            print("{0:<22s} {1:>10.1f} {2:>10.1f} {3:>9d}".format(name, scan_time * 1e3, query_time * 1e3, result))
+        for name, report in (("seer claims", seer_claims), ("game length", game_length)):
+            _, report_time = timed(lambda: report(corpus))
+            print("{0:<22s} {1:>10s} {2:>10.1f}".format(name, "", report_time * 1e3))
+        corpus.close()
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
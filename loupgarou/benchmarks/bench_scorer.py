@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Learned scorer latency: time to feed the rows of one update to
+IncrementalFeatures, and to score 15 players with a linear and an MLP
+scorer loaded memory-mapped, against rebuilding the features of the whole
+game history with featurize_frame on every update. The linear scorer is
+trained on synthetic 15 player logs, the MLP has random weights.
+
+usage: python benchmarks/bench_scorer.py [-g GAMES] [--hidden H]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aiwolfpy
+from aiwolfpy.ingest import ingest
+from aiwolfpy.features import FEATURES, IncrementalFeatures, featurize, featurize_frame, load_features
+from aiwolfpy.latency import LatencyHistogram
+from aiwolfpy.scoring import MLPScorer, load_scorer, save_scorer, train_linear, training_rows, log_loss
+from bench_ingest import write_log
+
+
+def report(name, histogram):
+    print("{0:<26s} {1:>8d} {2:>9.1f} {3:>9.1f} {4:>9.1f}".format(
+        name, histogram.total, histogram.mean(), histogram.percentile(50), histogram.percentile(99)))
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=500)
+    argparser.add_argument('--hidden', type=int, default=32)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        logs = []
+        for g in range(args.games):
+            logs.append(os.path.join(tmp, "{0:06d}.log".format(g)))
+            write_log(logs[-1], g)
+        cache_dir = os.path.join(tmp, "cache")
+        ingest(logs, cache_dir, workers=0)
+        featurize(cache_dir)
+        X, y = training_rows(load_features(cache_dir))
+        t0 = time.perf_counter()
+        linear = train_linear(X, y)
+        print("trained on {0} rows in {1:.2f} s, log loss {2:.4f}".format(
+            len(y), time.perf_counter() - t0, log_loss(linear, X, y)))
+        rng = np.random.RandomState(0)
+        F = len(FEATURES)
+        mlp = MLPScorer(mean=linear.mean, scale=linear.scale, W1=rng.randn(F, args.hidden) * 0.1,
+                        b1=np.zeros(args.hidden), w2=rng.randn(args.hidden) * 0.1, b2=np.zeros(1))
+        scorers = {}
+        for name, scorer in (("linear", linear), ("mlp", mlp)):
+            save_scorer(scorer, os.path.join(tmp, name))
+            scorers[name] = load_scorer(os.path.join(tmp, name))
+
+        # one update per talk turn of a game, as an agent sees them
+        frame = aiwolfpy.read_log(logs[0])
+        chunks = [chunk for _, chunk in frame.groupby(["day", "turn"], sort=False)]
+        incremental = LatencyHistogram()
+        rebuild = LatencyHistogram()
+        scored = dict((name, LatencyHistogram()) for name in scorers)
+        features = IncrementalFeatures(15)
+        seen = 0
+        for chunk in chunks:
+            t0 = time.perf_counter()
+            features.update(chunk)
+            vector = features.vector()
+            incremental.record(time.perf_counter() - t0)
+            seen += len(chunk)
+            t0 = time.perf_counter()
+            featurize_frame(frame.iloc[:seen], players=15)
+            rebuild.record(time.perf_counter() - t0)
+            for name, scorer in scorers.items():
+                t0 = time.perf_counter()
+                scorer.score(vector)
+                scored[name].record(time.perf_counter() - t0)
+        print("{0:<26s} {1:>8s} {2:>9s} {3:>9s} {4:>9s}".format("us per update", "calls", "mean", "p50", "p99"))
+        report("incremental features", incremental)
+        report("featurize_frame, history", rebuild)
+        for name in scorers:
+            report("score, " + name, scored[name])
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
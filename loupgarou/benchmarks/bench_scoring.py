@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+"""
+SampleAgent.minimal_score: former per-column Python loops against the
+vectorized weighting, for the werewolf, villager and seer variants.
+
+usage: python benchmarks/bench_scoring.py [-n CALLS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from villager_agent import SampleAgent
+
+
+def loop_minimal_score(self, isSeer=False, isWerewolf=False):
+    # former implementation
+    table = np.copy(self.info_table)
+    if isWerewolf:
+        wolfscore = np.zeros(self.num_players)
+        for i in range(self.num_players):
+            if self.true_table_role[i] == -100:
+                wolfscore[i] = np.inf
+            else:
+                for j in range(self.num_players):
+                    wolfscore[i] += np.abs(self.true_table_role[j] - table[j][i])
+        return np.argmin(wolfscore) + 1
+    suspects_list = self.conflicts.suspects()
+    for i in range(table.shape[1]):
+        if i == self.seer_id:
+            table[:,i] = self.seer_value * table[:,i]
+        if i == self.medium_id:
+            table[:,i] = self.medium_value * table[:,i]
+        if i == self.bg_id:
+            table[:,i] = self.bg_value * table[:,i]
+        if i in self.black_list:
+            table[:,i] = -1 * table[:,i]
+            continue
+        if i in suspects_list:
+            table[:,i] = self.suspect_value * table[:,i]
+    scores = np.sum(table, axis=1)
+    for i in self.white_list:
+        scores[i] *= 1.4
+    if isSeer:
+        scores = np.absolute(scores)
+    scores[self.id - 1] = np.max(scores) + 1
+    return np.argmin(scores) + 1
+
+
+def make_agent(player_num, seed=0):
+    rng = np.random.RandomState(seed)
+    agent = SampleAgent("bench")
+    wolves = max(1, player_num // 5)
+    role_num = {"WEREWOLF": wolves, "SEER": 1, "MEDIUM": 1, "BODYGUARD": 1, "POSSESSED": 1,
+                "VILLAGER": player_num - wolves - 4}
+    base_info = {"agentIdx": 1, "myRole": "VILLAGER", "roleMap": {"1": "VILLAGER"},
+                 "statusMap": dict((str(i), "ALIVE") for i in range(1, player_num + 1))}
+    with redirect_stdout(io.StringIO()):
+        agent.initialize(base_info, None, {"playerNum": player_num, "roleNumMap": role_num})
+    agent.info_table = rng.choice([-1, -0.5, 0, 0.5, 1], size=(player_num, player_num))
+    agent.true_table_role = np.where(rng.rand(player_num) < 0.2, -100.0, 100.0)
+    agent.seer_id, agent.medium_id, agent.bg_id = 2, 3, 4
+    for role in ("SEER", "MEDIUM", "BODYGUARD"):
+        for claimant in rng.choice(player_num, 2, replace=False):
+            agent.conflicts.claim(role, int(claimant))
+    for x in rng.choice(player_num, wolves, replace=False):
+        agent.conflicts.mark_black(int(x))
+    for x in rng.choice(player_num, wolves, replace=False):
+        agent.conflicts.mark_white(int(x))
+    return agent
+
+
+def timeit(func, calls):
+    t0 = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - t0) / calls * 1e6
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, dest='calls', default=200)
+    args = argparser.parse_args()
+    print("{0:>7s} {1:<10s} {2:>10s} {3:>12s} {4:>8s}".format("players", "variant", "loop us", "vector us", "speedup"))
+    for player_num in (15, 50, 100):
+        agent = make_agent(player_num)
+        for variant, kwargs in (("werewolf", {"isWerewolf": True}), ("villager", {}), ("seer", {"isSeer": True})):
+            assert loop_minimal_score(agent, **kwargs) == agent.minimal_score(**kwargs)
+            loop = timeit(lambda: loop_minimal_score(agent, **kwargs), args.calls)
+            vector = timeit(lambda: agent.minimal_score(**kwargs), args.calls)
+            print("{0:>7d} {1:<10s} {2:>10.1f} {3:>12.1f} {4:>7.1f}x".format(
+                player_num, variant, loop, vector, loop / vector))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+"""
+Wall time of 15 player games on aiwolfpy.server, with agents that answer at
+random so that the time is the server's and the protocol's: local seats
+(sessions in this process) and TCP seats (serve_agents on localhost). Each
+log is read back with read_log.
+
+usage: python benchmarks/bench_server.py [-g GAMES] [-n PLAYERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import random
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+import aiwolfpy
+from aiwolfpy.server import play, serve
+from aiwolfpy.tcpipclient_async import serve_agents
+
+
+class RandomAgent(object):
+    # events diffs: no DataFrame per request
+    diff_format = "events"
+
+    def __init__(self, name, seed=None):
+        self.name = name
+        self.rng = random.Random(seed)
+
+    def getName(self):
+        return self.name
+
+    def initialize(self, base_info, diff_data, game_setting):
+        self.base_info = base_info
+
+    def update(self, base_info, diff_data, request):
+        self.base_info = base_info
+
+    def dayStart(self):
+        pass
+
+    def talk(self):
+        if self.rng.random() < 0.3:
+            return "Over"
+        return "ESTIMATE Agent[{0:02d}] WEREWOLF".format(self.target())
+
+    def whisper(self):
+        return "Over"
+
+    def target(self):
+        alive = [int(a) for a, s in self.base_info["statusMap"].items() if s == "ALIVE"]
+        return self.rng.choice(alive)
+
+    def vote(self):
+        return self.target()
+
+    def attack(self):
+        return self.target()
+
+    def divine(self):
+        return self.target()
+
+    def guard(self):
+        return self.target()
+
+    def finish(self):
+        pass
+
+
+def free_port():
+    sock = socket.socket()
+    sock.bind(("localhost", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=20)
+    argparser.add_argument('-n', type=int, dest='players', default=15)
+    args = argparser.parse_args()
+    tmp = tempfile.mkdtemp()
+    try:
+        t0 = time.perf_counter()
+        winners = []
+        for g in range(args.games):
+            agents = [RandomAgent("random{0}".format(i), g * 100 + i) for i in range(args.players)]
+            winner, _ = play(agents, seed=g, log_path=os.path.join(tmp, "local-{0:03d}.log".format(g)))
+            winners.append(winner)
+        local = (time.perf_counter() - t0) / args.games
+        print("local seats: {0:.1f} ms per game, village won {1}/{2}".format(
+            local * 1e3, winners.count("VILLAGER"), args.games))
+
+        port = free_port()
+        agents = [RandomAgent("random{0}".format(i), i) for i in range(args.players)]
+        clients = threading.Thread(target=serve_agents, args=(agents, "localhost", port))
+        t0 = time.perf_counter()
+        result = []
+        server = threading.Thread(target=lambda: result.extend(
+            serve(port, args.players, games=args.games, log_dir=os.path.join(tmp, "tcp"), host="localhost", seed=0)))
+        server.start()
+        time.sleep(0.1)
+        clients.start()
+        server.join()
+        clients.join()
+        tcp = (time.perf_counter() - t0 - 0.1) / args.games
+        print("TCP seats:   {0:.1f} ms per game, village won {1}/{2}".format(
+            tcp * 1e3, result.count("VILLAGER"), args.games))
+
+        rows = 0
+        for name in os.listdir(os.path.join(tmp, "tcp")):
+            rows += len(aiwolfpy.read_log(os.path.join(tmp, "tcp", name)))
+        print("read_log: {0} rows in {1} TCP game logs".format(rows, args.games))
+    finally:
+        shutil.rmtree(tmp)
+
+
+if __name__ == '__main__':
+    main()
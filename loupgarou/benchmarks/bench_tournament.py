@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Games per second of aiwolfpy.tournament with 1, 2, 4 ... workers up to the
+number of cores, between two entrants of random agents (bench_server), so
+that the scaling is the runner's and not the agents'.
+
+usage: python benchmarks/bench_tournament.py [-g GAMES]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from aiwolfpy.tournament import run
+
+RANDOM = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench_server.py") + ":RandomAgent"
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-g', type=int, dest='games', default=200)
+    args = argparser.parse_args()
+    cores = os.cpu_count() or 1
+    workers = [0]
+    while workers[-1] * 2 <= cores:
+        workers.append(max(workers[-1] * 2, 1))
+    print("{0:>8s} {1:>10s} {2:>8s}".format("workers", "games/s", "speedup"))
+    base = None
+    for w in workers:
+        t0 = time.perf_counter()
+        results = run(["a=" + RANDOM, "b=" + RANDOM], args.games, workers=w)
+        rate = args.games / (time.perf_counter() - t0)
+        assert len(results) == args.games * 15
+        base = base or rate
+        print("{0:>8d} {1:>10.1f} {2:>8.2f}".format(w, rate, rate / base))
+
+
+if __name__ == '__main__':
+    main()
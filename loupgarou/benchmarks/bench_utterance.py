@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+Utterances/sec of parsing.parse_utterance against the former regex path
+of SampleAgent.updateGameHistory (substring scans, re.match on the
+uncompiled patterns, second match for the agent id).
+
+usage: python benchmarks/bench_utterance.py [-n UTTERANCES] [-p PLAYERS]
+"""
+
+from __future__ import print_function, division
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from parsing import *
+
+TEMPLATES = ["ESTIMATE Agent[{0:02d}] WEREWOLF", "ESTIMATE Agent[{0:02d}] VILLAGER", "VOTE Agent[{0:02d}]",
+             "COMINGOUT Agent[{0:02d}] SEER", "DIVINED Agent[{0:02d}] HUMAN", "DIVINED Agent[{0:02d}] WEREWOLF",
+             "IDENTIFIED Agent[{0:02d}] HUMAN", "GUARDED Agent[{0:02d}]", "Skip", "Over",
+             "REQUEST ANY (VOTE Agent[{0:02d}])",
+             "BECAUSE (DIVINED Agent[{0:02d}] WEREWOLF) (VOTE Agent[{0:02d}])"]
+
+
+def corpus(n, player_num, seed=0):
+    rng = random.Random(seed)
+    return [rng.choice(TEMPLATES).format(rng.randint(1, player_num)) for _ in range(n)]
+
+
+def regex_path(text):
+    # former inline code of updateGameHistory
+    if "ESTIMATE" in text:
+        match = re.match(RE_ESTIMATE, text[text.index("ESTIMATE"):])
+    elif "VOTE" in text:
+        match = re.match(RE_VOTE, text[text.index("VOTE"):])
+    elif "COMINGOUT" in text:
+        match = re.match(RE_COMINGOUT, text[text.index("COMINGOUT"):])
+    elif "DIVINED" in text:
+        match = re.match(RE_DIVINED, text[text.index("DIVINED"):])
+    elif "IDENTIFIED" in text:
+        match = re.match(RE_IDENTIFIED, text[text.index("IDENTIFIED"):])
+    elif "GUARDED" in text:
+        match = re.match(RE_GUARDED, text[text.index("GUARDED"):])
+    else:
+        return None
+    if match is None:
+        return None
+    target_role = match.group("role") if "role" in match.groupdict() else None
+    target_id_match = re.match(RE_AGENT_GROUP, match.group("target"))
+    if target_id_match is None:
+        return None
+    return int(target_id_match.group("id")) - 1, target_role
+
+
+def parser_path(text):
+    match = talk_sentence(text)
+    if match is None or match.target == ANY:
+        return None
+    return match.target - 1, match.role
+
+
+def parser_uncached(text):
+    utterance = parse_utterance.__wrapped__(text)
+    if utterance is None:
+        return None
+    match = find_verb(utterance, TALK_VERBS)
+    if match is None or match.target == ANY:
+        return None
+    return match.target - 1, match.role
+
+
+def run(name, func, texts):
+    t0 = time.perf_counter()
+    for text in texts:
+        func(text)
+    elapsed = time.perf_counter() - t0
+    print("{0:<26s} {1:>12.0f} utterances/s".format(name, len(texts) / elapsed))
+
+
+def main():
+    argparser = argparse.ArgumentParser()
+    argparser.add_argument('-n', type=int, dest='count', default=200000)
+    argparser.add_argument('-p', type=int, dest='players', default=15)
+    args = argparser.parse_args()
+    texts = corpus(args.count, args.players)
+    print("{0} utterances, {1} distinct".format(len(texts), len(set(texts))))
+    run("regex (former)", regex_path, texts)
+    run("parse_utterance, no cache", parser_uncached, texts)
+    parse_utterance.cache_clear()
+    talk_sentence.cache_clear()
+    run("talk_sentence, LRU", parser_path, texts)
+    print(talk_sentence.cache_info())
+
+
+if __name__ == '__main__':
+    main()
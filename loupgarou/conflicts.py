@@ -0,0 +1,120 @@
+'''
+Conflicts between players who claim the same unique role (SEER, MEDIUM, BODYGUARD).
+
+At most one claimant of such a role is genuine, so every claimant of a role is
+in conflict with every other one. Claimants are grouped with a union-find: a
+player claiming several roles joins their groups into one component. When a
+player is found to be a werewolf, only its component is revisited: a role whose
+other claimants are all black-listed but one leaves that one as the probable
+genuine holder, who is white-listed.
+
+black and white are lists without duplicates (in the order players were
+added), backed by sets for O(1) membership.
+'''
+
+
+class ConflictGraph(object):
+
+    def __init__(self):
+        self.black = []
+        self.white = []
+        self._black = set()
+        self._white = set()
+        # role -> claimants in claim order
+        self.claimants = {}
+        # union-find over claimants, each root keeps the roles of its component
+        self.parent = {}
+        self.rank = {}
+        self.roles = {}
+
+    def find(self, x):
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        # path compression
+        while self.parent[x] != root:
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a, b):
+        ra, rb = self.find(a), self.find(b)
+        if ra == rb:
+            return ra
+        if self.rank[ra] < self.rank[rb]:
+            ra, rb = rb, ra
+        self.parent[rb] = ra
+        if self.rank[ra] == self.rank[rb]:
+            self.rank[ra] += 1
+        self.roles[ra] |= self.roles.pop(rb)
+        return ra
+
+    def claim(self, role, agent):
+        '''
+        register agent as a claimant of role, returns the number of distinct claimants
+        '''
+        claimants = self.claimants.setdefault(role, [])
+        if agent in claimants:
+            return len(claimants)
+        if agent not in self.parent:
+            self.parent[agent] = agent
+            self.rank[agent] = 0
+            self.roles[agent] = set()
+        self.roles[self.find(agent)].add(role)
+        if claimants:
+            self.union(claimants[0], agent)
+        claimants.append(agent)
+        if agent not in self._black:
+            self._resolve(role)
+        return len(claimants)
+
+    def is_black(self, agent):
+        return agent in self._black
+
+    def is_white(self, agent):
+        return agent in self._white
+
+    def mark_white(self, agent):
+        if agent not in self._white and agent not in self._black:
+            self._white.add(agent)
+            self.white.append(agent)
+            return True
+        return False
+
+    def mark_black(self, agent):
+        '''
+        black-list agent, returns the players white-listed as a consequence
+        '''
+        if agent in self._black:
+            return []
+        self._black.add(agent)
+        self.black.append(agent)
+        if agent not in self.parent:
+            return []
+        whitened = []
+        for role in self.roles[self.find(agent)]:
+            whitened.extend(self._resolve(role))
+        return whitened
+
+    def _resolve(self, role):
+        # a contested role with a single claimant left standing
+        claimants = self.claimants[role]
+        if len(claimants) < 2:
+            return []
+        remaining = [c for c in claimants if c not in self._black]
+        if len(remaining) == 1 and self.mark_white(remaining[0]):
+            return remaining
+        return []
+
+    def contested(self, role):
+        # claimants of role that are not black-listed, if more than one
+        remaining = [c for c in self.claimants.get(role, ()) if c not in self._black]
+        return remaining if len(remaining) > 1 else []
+
+    def suspects(self):
+        '''
+        players in an unresolved conflict
+        '''
+        suspects = set()
+        for role in self.claimants:
+            suspects.update(self.contested(role))
+        return suspects
@@ -0,0 +1,174 @@
+'''
+Exact lookahead for late-game VOTE and ATTACK decisions.
+
+The value of a state is the probability that the village wins, assuming:
+* by day the village executes a known werewolf if one is alive, otherwise a
+  player at random among those it does not know to be human
+* by night the werewolves attack the human that is worst for the village
+* a living seer divines an unknown player each night; finding a werewolf
+  makes him come out, after which his results are public
+Bodyguard and possessed are not modelled (the possessed counts as a human).
+
+Under these rules players of the same class are interchangeable, so a state is
+the number of living known/unknown werewolves and humans, the seer (none,
+hidden, or confirmed) and the phase, packed into one int. Values live in a
+bounded LRU transposition table shared by every game of the process, so after
+a few games the late-game positions are lookups.
+'''
+
+from collections import OrderedDict
+
+# the lookahead is used from this many living players down
+ENDGAME_ALIVE = 7
+
+DAY, NIGHT = 0, 1
+NO_SEER, HIDDEN_SEER, CONFIRMED_SEER = 0, 1, 2
+
+
+class TranspositionTable(object):
+
+    def __init__(self, max_entries=1 << 16):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        value = self.entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        # least recently used first
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+
+TABLE = TranspositionTable()
+
+
+def pack(known_wolves, unknown_wolves, known_humans, unknown_humans, seer, phase):
+    return (known_wolves | unknown_wolves << 5 | known_humans << 10 | unknown_humans << 15
+            | seer << 20 | phase << 22)
+
+
+def value(kw, uw, kh, uh, seer, phase, table=TABLE):
+    '''
+    probability that the village wins from the state
+    '''
+    wolves = kw + uw
+    humans = kh + uh + (seer != NO_SEER)
+    if wolves == 0:
+        return 1.0
+    if wolves >= humans:
+        return 0.0
+    key = pack(kw, uw, kh, uh, seer, phase)
+    v = table.get(key)
+    if v is not None:
+        return v
+    if phase == DAY:
+        v = _execution(kw, uw, kh, uh, seer, table)
+    else:
+        # the werewolves attack whoever is worst for the village
+        v = 1.0
+        if kh:
+            v = min(v, after_attack(kw, uw, kh - 1, uh, seer, table))
+        if uh:
+            v = min(v, after_attack(kw, uw, kh, uh - 1, seer, table))
+        if seer != NO_SEER:
+            v = min(v, after_attack(kw, uw, kh, uh, NO_SEER, table))
+    table.put(key, v)
+    return v
+
+
+def _execution(kw, uw, kh, uh, seer, table):
+    if kw:
+        return value(kw - 1, uw, kh, uh, seer, NIGHT, table)
+    # a player the village does not know to be human, at random
+    hidden = seer == HIDDEN_SEER
+    pool = uw + uh + hidden
+    v = 0.0
+    if uw:
+        v += uw * value(kw, uw - 1, kh, uh, seer, NIGHT, table)
+    if uh:
+        v += uh * value(kw, uw, kh, uh - 1, seer, NIGHT, table)
+    if hidden:
+        v += value(kw, uw, kh, uh, NO_SEER, NIGHT, table)
+    return v / pool
+
+
+def after_attack(kw, uw, kh, uh, seer, table=TABLE):
+    '''
+    value once the night's victim is dead: the seer divines, then day comes
+    '''
+    wolves = kw + uw
+    if wolves == 0 or wolves >= kh + uh + (seer != NO_SEER):
+        return value(kw, uw, kh, uh, seer, DAY, table)
+    unknown = uw + uh
+    if seer == NO_SEER or unknown == 0:
+        return value(kw, uw, kh, uh, seer, DAY, table)
+    v = 0.0
+    if uw:
+        v += uw * value(kw + 1, uw - 1, kh, uh, CONFIRMED_SEER, DAY, table)
+    if uh:
+        if seer == CONFIRMED_SEER:
+            v += uh * value(kw, uw, kh + 1, uh - 1, seer, DAY, table)
+        else:
+            v += uh * value(kw, uw, kh, uh, seer, DAY, table)
+    return v / unknown
+
+
+def classify(alive, wolves, known_wolves, known_humans, seer_agent, seer):
+    '''
+    class counts of the living players, all sets are bitmasks over the players
+    '''
+    if seer_agent is None or not alive >> seer_agent & 1:
+        seer = NO_SEER
+    else:
+        alive &= ~(1 << seer_agent)
+    kw = bin(alive & wolves & known_wolves).count("1")
+    uw = bin(alive & wolves & ~known_wolves).count("1")
+    kh = bin(alive & ~wolves & known_humans).count("1")
+    uh = bin(alive & ~wolves & ~known_humans).count("1")
+    return kw, uw, kh, uh, seer
+
+
+def decide(request, worlds, alive, candidates, known_wolves=0, known_humans=0,
+           seer_agent=None, seer=NO_SEER, village=True, table=TABLE):
+    '''
+    best candidate to execute (VOTE) or attack (ATTACK) for our side, and the
+    village's winning probability after each candidate. worlds maps the set of
+    werewolves to its weight.
+    '''
+    # only the living werewolves matter
+    merged = {}
+    for wolves, weight in worlds.items():
+        merged[wolves & alive] = merged.get(wolves & alive, 0) + weight
+    total = sum(merged.values())
+    if not total or not candidates:
+        return None, []
+    values = []
+    for c in candidates:
+        after = alive & ~(1 << c)
+        v = 0.0
+        for wolves, weight in merged.items():
+            counts = classify(after, wolves, known_wolves, known_humans, seer_agent, seer)
+            if request == "VOTE":
+                v += weight * value(*counts, phase=NIGHT, table=table)
+            else:
+                v += weight * after_attack(*counts, table=table)
+        values.append(v / total)
+    if village:
+        best = max(range(len(candidates)), key=lambda j: values[j])
+    else:
+        best = min(range(len(candidates)), key=lambda j: values[j])
+    return candidates[best], values
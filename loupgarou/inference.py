@@ -0,0 +1,335 @@
+'''
+Exact belief inference over role assignments.
+
+Enumerates the werewolf and possessed sets consistent with what is known as
+bitmasks over the players, and counts the assignments of the remaining roles
+in closed form. Known facts are:
+* our own role (and our fellow werewolves when we are one)
+* our own divine/identify results
+* players attacked during the night, who are not werewolves
+* the game still running: some werewolf is alive, and fewer than the humans
+* role claims and reported results: a player who is neither werewolf nor
+  possessed does not lie, so he holds the role he claims and his results are true
+
+Given the evil players, the rest of the assignment only depends on which
+claimants and reported targets are evil, so those counts are memoized.
+solve() returns per-player marginal probabilities of every role.
+'''
+
+import random
+from bisect import bisect_right
+from itertools import combinations
+
+EVIL_ROLES = ("WEREWOLF", "POSSESSED")
+# roles an honest player only claims if he holds them (one bit each)
+CLAIMED_ROLES = ("SEER", "MEDIUM", "BODYGUARD", "FREEMASON", "FOX")
+
+_FACTORIALS = [1]
+
+
+def _factorial(k):
+    while len(_FACTORIALS) <= k:
+        _FACTORIALS.append(_FACTORIALS[-1] * len(_FACTORIALS))
+    return _FACTORIALS[k]
+
+
+class Beliefs(object):
+
+    def __init__(self, marginals, assignments, worlds, exact, support=()):
+        # role -> probability of each player holding it
+        self.marginals = marginals
+        # (werewolves, possessed, completion) of every consistent world, for sampling
+        self.support = support
+        # number of full role assignments consistent with the facts
+        self.assignments = assignments
+        # number of (werewolves, possessed) sets enumerated
+        self.worlds = worlds
+        # False if the enumeration was cut short by the deadline
+        self.exact = exact
+
+    def p(self, role, agent):
+        return self.marginals[role][agent] if role in self.marginals else 0.0
+
+    def most_likely(self, role, candidates):
+        '''
+        candidate most likely to hold role, None if no candidate can hold it
+        '''
+        best = None
+        for i in candidates:
+            if self.p(role, i) > 0 and (best is None or self.p(role, i) > self.p(role, best)):
+                best = i
+        return best
+
+
+class RoleInference(object):
+
+    def __init__(self, num_players, role_num_map, me, my_role):
+        self.n = num_players
+        self.role_count = dict((r, c) for r, c in role_num_map.items() if c > 0)
+        self.me = me
+        self.my_role = my_role
+        self.alive = (1 << num_players) - 1
+        # players known to be werewolves / known not to be
+        self.wolves = 0
+        self.humans = 0
+        # players who claimed each role
+        self.claims = {}
+        # reporter -> [role, targets reported human, targets reported werewolf]
+        self.reports = {}
+        self._completions = {}
+        # bumped whenever a fact changes, solve() is only worth rerunning then
+        self.version = 0
+        self.known(me, my_role)
+
+    def _changed(self):
+        self._completions = {}
+        self.version += 1
+
+    def known(self, agent, role):
+        if role == "WEREWOLF":
+            self.wolves |= 1 << agent
+        else:
+            self.humans |= 1 << agent
+        self._changed()
+
+    def species(self, agent, species):
+        # a certain divine/identify result, seen again in later diffs
+        bit = 1 << agent
+        if species == "WEREWOLF":
+            if not self.wolves & bit:
+                self.wolves |= bit
+                self._changed()
+        elif not self.humans & bit:
+            self.humans |= bit
+            self._changed()
+
+    def attacked(self, agent):
+        if self.humans >> agent & 1 and not self.alive >> agent & 1:
+            return
+        self.humans |= 1 << agent
+        self.alive &= ~(1 << agent)
+        self._changed()
+
+    def status(self, status_map):
+        alive = 0
+        for k, v in status_map.items():
+            if v == "ALIVE":
+                alive |= 1 << (int(k) - 1)
+        if alive != self.alive:
+            self.alive = alive
+            self.version += 1
+
+    def claim(self, agent, role):
+        if agent == self.me or role not in CLAIMED_ROLES or role not in self.role_count:
+            return
+        roles = self.claims.get(agent, 0) | (1 << CLAIMED_ROLES.index(role))
+        if roles != self.claims.get(agent):
+            self.claims[agent] = roles
+            self._changed()
+
+    def report(self, agent, target, species, role):
+        '''
+        a result reported by a claimed SEER or MEDIUM
+        '''
+        self.claim(agent, role)
+        if agent == self.me or species not in ("HUMAN", "WEREWOLF"):
+            return
+        entry = self.reports.setdefault(agent, [role, 0, 0])
+        side = 2 if species == "WEREWOLF" else 1
+        if not entry[side] >> target & 1:
+            entry[side] |= 1 << target
+            self._changed()
+
+    def _masks(self):
+        claim_mask = 0
+        for a in self.claims:
+            claim_mask |= 1 << a
+        report_mask = 0
+        for _, human, wolf in self.reports.values():
+            report_mask |= human | wolf
+        return claim_mask, report_mask
+
+    def _completion(self, evil_claims, wolf_reports, evil_count):
+        '''
+        number of ways to assign the roles other than werewolf and possessed,
+        with the players fixed by claims, and the roles left to the free players
+        '''
+        key = (evil_claims, wolf_reports)
+        cached = self._completions.get(key)
+        if cached is not None:
+            return cached
+        result = (0, None, None, 0)
+        remaining = dict((r, c) for r, c in self.role_count.items() if r not in EVIL_ROLES)
+        fixed = 0
+        if self.my_role not in EVIL_ROLES:
+            remaining[self.my_role] = remaining.get(self.my_role, 0) - 1
+            fixed = 1
+        forced = {}
+        for a, roles in self.claims.items():
+            if evil_claims >> a & 1:
+                continue
+            # an honest player claims a single role, and holds it
+            if roles & (roles - 1):
+                self._completions[key] = result
+                return result
+            role = CLAIMED_ROLES[roles.bit_length() - 1]
+            report = self.reports.get(a)
+            if report is not None:
+                if report[0] != role or wolf_reports & report[1] or report[2] & ~wolf_reports:
+                    self._completions[key] = result
+                    return result
+            remaining[role] -= 1
+            forced[a] = role
+        if any(c < 0 for c in remaining.values()):
+            self._completions[key] = result
+            return result
+        free = self.n - evil_count - fixed - len(forced)
+        villagers = free - sum(c for r, c in remaining.items() if r != "VILLAGER")
+        if villagers < 0:
+            self._completions[key] = result
+            return result
+        count = _factorial(free)
+        for r, c in remaining.items():
+            if r != "VILLAGER":
+                count //= _factorial(c)
+        count //= _factorial(villagers)
+        remaining["VILLAGER"] = villagers
+        result = (count, forced, remaining, free)
+        self._completions[key] = result
+        return result
+
+    def solve(self, deadline=None):
+        '''
+        marginal probabilities of each role for each player, None if no
+        assignment is consistent with the facts
+        '''
+        n = self.n
+        wolf_count = self.role_count.get("WEREWOLF", 0)
+        possessed_count = self.role_count.get("POSSESSED", 0)
+        evil_count = wolf_count + possessed_count
+        claim_mask, report_mask = self._masks()
+        alive = self.alive
+
+        known_wolves = [i for i in range(n) if self.wolves >> i & 1]
+        wolf_candidates = [i for i in range(n) if not (self.wolves | self.humans) >> i & 1]
+        if self.my_role == "POSSESSED":
+            possessed_fixed = [self.me]
+            possessed_candidates = []
+        else:
+            possessed_fixed = []
+            possessed_candidates = [i for i in range(n) if i != self.me and not self.wolves >> i & 1]
+        need_wolves = wolf_count - len(known_wolves)
+        need_possessed = possessed_count - len(possessed_fixed)
+
+        wolf_weight = [0] * n
+        possessed_weight = [0] * n
+        # memo key -> [total weight, evil weight of each player]
+        groups = {}
+        support = []
+        total = 0
+        worlds = 0
+        exact = True
+        if need_wolves < 0 or need_possessed < 0 or self.wolves & self.humans:
+            wolf_sets = ()
+        else:
+            wolf_sets = combinations(wolf_candidates, need_wolves)
+        for step, combo in enumerate(wolf_sets):
+            if deadline is not None and step & 63 == 0 and deadline.expired():
+                exact = False
+                break
+            wolves = known_wolves + list(combo)
+            wmask = 0
+            for i in wolves:
+                wmask |= 1 << i
+            # the game is still running
+            alive_wolves = bin(wmask & alive).count("1")
+            if alive_wolves == 0 or alive_wolves >= bin(alive).count("1") - alive_wolves:
+                continue
+            key_reports = wmask & report_mask
+            pool = [i for i in possessed_candidates if not wmask >> i & 1]
+            for pcombo in combinations(pool, need_possessed):
+                possessed = possessed_fixed + list(pcombo)
+                evil = wmask
+                for i in possessed:
+                    evil |= 1 << i
+                worlds += 1
+                key = (evil & claim_mask, key_reports)
+                completion = self._completion(key[0], key[1], evil_count)
+                count = completion[0]
+                if not count:
+                    continue
+                support.append((wolves, possessed, completion))
+                group = groups.get(key)
+                if group is None:
+                    group = groups[key] = [0, [0] * n]
+                group[0] += count
+                evil_weight = group[1]
+                for i in wolves:
+                    wolf_weight[i] += count
+                    evil_weight[i] += count
+                for i in possessed:
+                    possessed_weight[i] += count
+                    evil_weight[i] += count
+                total += count
+
+        if total == 0:
+            return None
+        marginals = dict((r, [0.0] * n) for r in self.role_count)
+        marginals.setdefault("VILLAGER", [0.0] * n)
+        for i in range(n):
+            if "WEREWOLF" in marginals:
+                marginals["WEREWOLF"][i] = wolf_weight[i] / total
+            if "POSSESSED" in marginals:
+                marginals["POSSESSED"][i] = possessed_weight[i] / total
+        if self.my_role not in EVIL_ROLES:
+            marginals[self.my_role][self.me] = 1.0
+        for key, (weight, evil_weight) in groups.items():
+            _, forced, remaining, free = self._completion(key[0], key[1], evil_count)
+            for a, role in forced.items():
+                marginals[role][a] += weight / total
+            if not free:
+                continue
+            for i in range(n):
+                if i == self.me or i in forced:
+                    continue
+                # weight of the worlds where i is one of the free players
+                share = (weight - evil_weight[i]) / total / free
+                if share:
+                    for role, c in remaining.items():
+                        if c:
+                            marginals[role][i] += share * c
+        return Beliefs(marginals, total, worlds, exact, support)
+
+    def sample(self, beliefs, k, rng=random):
+        '''
+        k role assignments (a role per player) drawn uniformly among the
+        consistent ones
+        '''
+        support = beliefs.support
+        cumulative = []
+        total = 0
+        for _, _, completion in support:
+            total += completion[0]
+            cumulative.append(total)
+        samples = []
+        for _ in range(k):
+            wolves, possessed, (_, forced, remaining, free) = support[bisect_right(cumulative, rng.randrange(total))]
+            roles = [None] * self.n
+            for i in wolves:
+                roles[i] = "WEREWOLF"
+            for i in possessed:
+                roles[i] = "POSSESSED"
+            if roles[self.me] is None:
+                roles[self.me] = self.my_role
+            for a, role in forced.items():
+                roles[a] = role
+            # the free players get the remaining roles in a random order
+            free_players = [i for i in range(self.n) if roles[i] is None]
+            rng.shuffle(free_players)
+            pos = 0
+            for role, c in remaining.items():
+                for i in free_players[pos:pos + c]:
+                    roles[i] = role
+                pos += c
+            samples.append(roles)
+        return samples
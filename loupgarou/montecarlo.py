@@ -0,0 +1,219 @@
+'''
+Determinized Monte Carlo search for vote, attack and guard.
+
+Role assignments are sampled from the inference (uniformly among those
+consistent with what we know), and in each of them the next execution and
+attack are played out, for every (candidate, sample) pair at once with
+NumPy. Other players vote as their declared votes suggest, werewolves
+attack humans (special roles more often), the bodyguard guards a random
+player. The leaf value is our side's standing after that.
+
+Batches of samples are drawn until the request deadline comes close, or for
+budget seconds without a deadline, and stop early once the best candidate's
+mean is ahead of every other by more than the sampling error can explain; the
+best candidate so far is offered to the deadline after each batch. With workers > 0
+rollouts run in a persistent process pool shared by every game of the process.
+'''
+
+from __future__ import print_function, division
+import random
+import time
+
+import numpy as np
+
+ROLES = ("VILLAGER", "SEER", "MEDIUM", "BODYGUARD", "POSSESSED", "WEREWOLF", "FREEMASON", "FOX")
+ROLE_CODE = dict((r, i) for i, r in enumerate(ROLES))
+WEREWOLF = ROLE_CODE["WEREWOLF"]
+BODYGUARD = ROLE_CODE["BODYGUARD"]
+SPECIAL = (ROLE_CODE["SEER"], ROLE_CODE["MEDIUM"], ROLE_CODE["BODYGUARD"])
+
+# processes per pool size, kept for the whole process
+_POOLS = {}
+
+
+def _pool(workers):
+    pool = _POOLS.get(workers)
+    if pool is None:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = _POOLS[workers] = ProcessPoolExecutor(max_workers=workers)
+    return pool
+
+
+def encode(samples):
+    # role names of each sample -> int8 codes [k, n]
+    return np.array([[ROLE_CODE[r] for r in roles] for roles in samples], dtype=np.int8)
+
+
+def _choose(weights, rng):
+    # one column per row, with probability proportional to the row, -1 for an empty row
+    cumulative = weights.cumsum(axis=1)
+    total = cumulative[:, -1]
+    u = rng.random_sample(len(weights)) * total
+    choice = np.minimum((cumulative <= u[:, None]).sum(axis=1), weights.shape[1] - 1)
+    choice[total <= 0] = -1
+    return choice
+
+
+def _execute(alive, vote_probs, me, my_vote, rng):
+    # one execution by the living players, ties broken at random
+    # (a vote for a player who died since the talks is lost)
+    k, n = alive.shape
+    rows = np.arange(k)
+    cumulative = vote_probs.cumsum(axis=1)
+    target = np.empty((k, n), dtype=np.intp)
+    for v in range(n):
+        target[:, v] = np.searchsorted(cumulative[v], rng.random_sample(k) * cumulative[v, -1], side='right')
+    np.minimum(target, n - 1, out=target)
+    if my_vote is not None:
+        target[:, me] = my_vote
+    voting = alive & alive[rows[:, None], target] & (cumulative[:, -1] > 0)[None, :]
+    if my_vote is not None:
+        voting[:, me] = alive[:, me]
+    counts = rng.random_sample((k, n)) * 0.5
+    ballots = (rows[:, None] * n + target)[voting]
+    counts += np.bincount(ballots, minlength=k * n).reshape(k, n)
+    counts[~alive] = -1
+    executed = counts.argmax(axis=1)
+    alive[rows, executed] = False
+    return executed
+
+
+def _night(alive, roles, rng, attack=None, guard=None):
+    # one attack by the werewolves, blocked if the bodyguard guards its target
+    k, n = alive.shape
+    rows = np.arange(k)
+    wolf = roles == WEREWOLF
+    if attack is None:
+        weights = (alive & ~wolf) * (1.0 + 2.0 * np.isin(roles, SPECIAL))
+        attacked = _choose(weights, rng)
+    else:
+        attacked = attack.copy()
+    attacked[~(alive & wolf).any(axis=1)] = -1
+    if guard is None:
+        bodyguard = alive & (roles == BODYGUARD)
+        weights = alive & ~bodyguard
+        guarded = _choose(weights.astype(float), rng)
+        guarded[~bodyguard.any(axis=1)] = -1
+    else:
+        guarded = guard
+    hit = (attacked >= 0) & (attacked != guarded)
+    alive[rows[hit], attacked[hit]] = False
+    return attacked
+
+
+def value(alive, roles, village):
+    '''
+    standing of our side in each sample: 1 won, 0 lost, in between the
+    balance of living humans and werewolves (living special roles count a bit)
+    '''
+    wolf = roles == WEREWOLF
+    wolves = (alive & wolf).sum(axis=1)
+    humans = (alive & ~wolf).sum(axis=1)
+    specials = (alive & np.isin(roles, SPECIAL)).sum(axis=1)
+    balance = (humans - wolves + 0.25 * specials) / np.maximum(humans + wolves + 0.25 * specials, 1)
+    v = np.where(wolves == 0, 1.0, np.where(wolves >= humans, 0.0, 0.5 + 0.5 * np.clip(balance, 0, 1)))
+    return v if village else 1.0 - v
+
+
+def rollout(roles, alive, me, request, candidates, vote_probs, seed):
+    '''
+    sum over the samples of the value of each candidate, roles is [k, n]
+    '''
+    rng = np.random.RandomState(seed)
+    village = roles[0, me] != WEREWOLF and roles[0, me] != ROLE_CODE["POSSESSED"]
+    k = len(roles)
+    # row j * k + s plays candidate j in sample s
+    roles = np.tile(roles, (len(candidates), 1))
+    choice = np.repeat(np.asarray(candidates), k)
+    state = np.repeat(alive[None, :], len(roles), axis=0)
+    if request == "VOTE":
+        _execute(state, vote_probs, me, choice, rng)
+        _night(state, roles, rng)
+    elif request == "ATTACK":
+        _night(state, roles, rng, attack=choice)
+        _execute(state, vote_probs, me, None, rng)
+    else:
+        _night(state, roles, rng, guard=choice)
+    return value(state, roles, village).reshape(len(candidates), k).sum(axis=1)
+
+
+class MonteCarloSearch(object):
+
+    def __init__(self, workers=0, batch=256, max_samples=2048, margin=0.05, budget=0.02, confidence=3.0,
+                 seed=None):
+        self.workers = workers
+        self.batch = batch
+        self.max_samples = max_samples
+        # seconds kept free before the deadline
+        self.margin = margin
+        # seconds per decision when there is no deadline (local games, timeLimit <= 0)
+        self.budget = budget
+        # standard errors the best mean must lead by to stop early, None to never stop early
+        self.confidence = confidence
+        self.rng = random.Random(seed)
+        # samples, time and mean value of each candidate of the last decision
+        self.samples = 0
+        self.elapsed = 0.0
+        self.values = None
+
+    def converged(self, totals, samples):
+        '''
+        True if the best mean leads the runner-up by confidence standard
+        errors of a difference of two means of values in [0, 1]
+        '''
+        if len(totals) < 2:
+            return True
+        if self.confidence is None:
+            return False
+        best, second = np.sort(totals)[-2:][::-1] / samples
+        return best - second > self.confidence * 0.5 * np.sqrt(2.0 / samples)
+
+    def _batches(self, inference, beliefs, count):
+        return [encode(inference.sample(beliefs, self.batch, self.rng)) for _ in range(count)]
+
+    def decide(self, request, inference, beliefs, alive, candidates, vote_probs, deadline=None):
+        '''
+        candidate with the best mean value, None if there is nothing to search
+        '''
+        if beliefs is None or not candidates:
+            return None
+        start = time.perf_counter()
+        alive = np.asarray(alive, dtype=bool)
+        vote_probs = np.asarray(vote_probs, dtype=float)
+        totals = np.zeros(len(candidates))
+        samples = 0
+        last = 0.0
+        # a deadline without timeLimit has no end either
+        unlimited = deadline is None or deadline.remaining() == float('inf')
+        while samples < self.max_samples:
+            if unlimited:
+                remaining = self.budget - (time.perf_counter() - start) + self.margin
+            else:
+                remaining = deadline.remaining()
+            # another round must end before the deadline
+            if remaining - self.margin < last * 1.5:
+                break
+            t0 = time.perf_counter()
+            if self.workers > 0:
+                batches = self._batches(inference, beliefs, self.workers)
+                futures = [_pool(self.workers).submit(rollout, roles, alive, inference.me, request, candidates,
+                                                      vote_probs, self.rng.randrange(1 << 30)) for roles in batches]
+                for f in futures:
+                    totals += f.result()
+            else:
+                batches = self._batches(inference, beliefs, 1)
+                totals += rollout(batches[0], alive, inference.me, request, candidates, vote_probs,
+                                  self.rng.randrange(1 << 30))
+            samples += sum(len(b) for b in batches)
+            last = time.perf_counter() - t0
+            if deadline is not None:
+                # offered as an agentIdx
+                deadline.offer(candidates[int(np.argmax(totals))] + 1)
+            if self.converged(totals, samples):
+                break
+        self.samples = samples
+        self.elapsed = time.perf_counter() - start
+        if samples == 0:
+            return None
+        self.values = totals / samples
+        return candidates[int(np.argmax(totals))]
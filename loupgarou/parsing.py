@@ -41,3 +41,170 @@ RE_NOT          = '({RE_SUBJECT} )?NOT \(.*\)'.format(**locals())
 RE_AND          = '({RE_SUBJECT} )?AND (.*)'.format(**locals())
 RE_OR           = '({RE_SUBJECT} )?OR (.*)'.format(**locals())
 RE_XOR          = '({RE_SUBJECT} )?XOR \(.*\) \(.*\)'.format(**locals())
+
+
+# Single-pass parser for the AIWolf protocol 3.6 grammar.
+# parse_utterance(text) returns an Utterance, or None if the text is not a
+# valid sentence. Results are cached, the same texts recur constantly.
+import re
+from collections import namedtuple
+from functools import lru_cache
+
+# ANY as subject/target; real agents are numbered from 1
+ANY = 0
+
+Utterance = namedtuple('Utterance', 'verb subject target role species day talk_day talk_id children')
+Utterance.__new__.__defaults__ = (None, None, None, None, None, None, None, ())
+
+ROLES           = frozenset(['VILLAGER', 'SEER', 'MEDIUM', 'BODYGUARD', 'WEREWOLF', 'POSSESSED', 'ANY'])
+SPECIES         = frozenset(['HUMAN', 'WEREWOLF', 'ANY'])
+
+# verb -> words that follow it
+TARGET_ROLE_VERBS       = frozenset(['ESTIMATE', 'COMINGOUT'])
+TARGET_VERBS            = frozenset(['DIVINATION', 'GUARD', 'VOTE', 'ATTACK', 'GUARDED', 'VOTED', 'ATTACKED'])
+TARGET_SPECIES_VERBS    = frozenset(['DIVINED', 'IDENTIFIED'])
+TALK_NUMBER_VERBS       = frozenset(['AGREE', 'DISAGREE'])
+TARGET_SENTENCE_OPS     = frozenset(['REQUEST', 'INQUIRE'])
+SENTENCE_OPS            = frozenset(['BECAUSE', 'NOT', 'AND', 'OR', 'XOR'])
+
+_TOKEN = re.compile(r'\(|\)|[^\s()]+')
+_AGENT = re.compile(r'Agent\[?(\d+)\]?$')
+_TALK_DAY = re.compile(r'day(\d+)$', re.IGNORECASE)
+_TALK_ID = re.compile(r'ID:(\d+)$', re.IGNORECASE)
+
+
+class ParseError(ValueError):
+    pass
+
+
+def _agent(word):
+    if word == 'ANY':
+        return ANY
+    m = _AGENT.match(word)
+    if m is None:
+        return None
+    return int(m.group(1))
+
+
+class _Parser(object):
+
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self):
+        tok = self.peek()
+        if tok is None:
+            raise ParseError('unexpected end')
+        self.pos += 1
+        return tok
+
+    def expect(self, tok):
+        if self.next() != tok:
+            raise ParseError('expected ' + tok)
+
+    def agent(self):
+        a = _agent(self.next())
+        if a is None:
+            raise ParseError('expected agent')
+        return a
+
+    def nested(self):
+        self.expect('(')
+        u = self.sentence()
+        self.expect(')')
+        return u
+
+    def sentence(self):
+        word = self.next()
+        subject = None
+        a = _agent(word)
+        if a is not None:
+            subject = a
+            word = self.next()
+        upper = word.upper()
+        if upper in ('SKIP', 'OVER'):
+            return Utterance(upper, subject)
+        if word in TARGET_ROLE_VERBS:
+            target = self.agent()
+            role = self.next()
+            if role not in ROLES:
+                raise ParseError('expected role')
+            return Utterance(word, subject, target, role)
+        if word in TARGET_VERBS:
+            return Utterance(word, subject, self.agent())
+        if word in TARGET_SPECIES_VERBS:
+            target = self.agent()
+            species = self.next()
+            if species not in SPECIES:
+                raise ParseError('expected species')
+            return Utterance(word, subject, target, None, species)
+        if word in TALK_NUMBER_VERBS:
+            # [TALK|WHISPER] dayN ID:M
+            tok = self.next()
+            if tok in ('TALK', 'WHISPER'):
+                tok = self.next()
+            d = _TALK_DAY.match(tok)
+            i = _TALK_ID.match(self.next())
+            if d is None or i is None:
+                raise ParseError('expected talk number')
+            return Utterance(word, subject, talk_day=int(d.group(1)), talk_id=int(i.group(1)))
+        if word in TARGET_SENTENCE_OPS:
+            target = self.agent()
+            return Utterance(word, subject, target, children=(self.nested(),))
+        if word == 'DAY':
+            day = self.next()
+            if not day.isdigit():
+                raise ParseError('expected day number')
+            return Utterance(word, subject, day=int(day), children=(self.nested(),))
+        if word in SENTENCE_OPS:
+            children = [self.nested()]
+            while self.peek() == '(':
+                children.append(self.nested())
+            arity = len(children)
+            if (word == 'NOT' and arity != 1) or (word in ('BECAUSE', 'XOR') and arity != 2):
+                raise ParseError('wrong number of sentences for ' + word)
+            return Utterance(word, subject, children=tuple(children))
+        raise ParseError('unknown verb ' + word)
+
+
+@lru_cache(maxsize=8192)
+def parse_utterance(text):
+    parser = _Parser(_TOKEN.findall(text))
+    try:
+        u = parser.sentence()
+    except ParseError:
+        return None
+    if parser.peek() is not None:
+        return None
+    return u
+
+
+def find_verb(utterance, verbs):
+    # first sentence (pre-order) whose verb is the first of verbs present
+    found = {}
+    stack = [utterance]
+    while stack:
+        u = stack.pop()
+        if u.verb in verbs and u.verb not in found:
+            found[u.verb] = u
+        stack.extend(reversed(u.children))
+    for verb in verbs:
+        if verb in found:
+            return found[verb]
+    return None
+
+# sentences SampleAgent scores, in order of precedence
+TALK_VERBS = ('ESTIMATE', 'VOTE', 'COMINGOUT', 'DIVINED', 'IDENTIFIED', 'GUARDED')
+
+
+@lru_cache(maxsize=8192)
+def talk_sentence(text):
+    # the sentence of a talk SampleAgent scores, None if there is none
+    utterance = parse_utterance(text)
+    if utterance is None:
+        return None
+    return find_verb(utterance, TALK_VERBS)
@@ -1,20 +1,229 @@
 #printing of nested dicts and pandas
+import atexit
 import json
+import os
+import sys
+import threading
 import time
 import random
 from tabulate import tabulate
 
-def printBaseInfo(base_info):
-	print("Base Info:")
-	print(json.dumps(base_info, indent=4))
+try:
+	import queue
+except ImportError:
+	import Queue as queue
 
-def printGameSetting(game_setting):
-	print("Game Setting:")
-	print(json.dumps(game_setting, indent=4))
+#log levels, a record is written when its level is at least the log's level
+DEBUG, INFO, WARNING, ERROR, OFF = 10, 20, 30, 40, 100
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR, "off": OFF}
+LEVEL_NAMES = dict((v, k) for k, v in LEVELS.items())
+
+class AgentLog(object):
+	'''
+	Level-gated log written by a background thread: a call below the level
+	returns after one comparison, and the records that pass are only queued,
+	their messages are formatted and written by the thread. Sinks are a text
+	stream (the former pretty dumps, stdout by default) and a JSONL file (one
+	compact object per record).
+
+	Configured from LOUPGAROU_LOG (level name), LOUPGAROU_LOG_FILE (JSONL
+	path, the only sink when set) and LOUPGAROU_LOG_GAME (number of the game,
+	1 first, logged at DEBUG whatever the level), or with configure(). The
+	game is counted per agent: startGame() gives each agent a GameLog of its
+	own level, so agents sharing the process do not raise each other's.
+	'''
+
+	def __init__(self, level=INFO, stream=None, path=None, game=None):
+		self.queue = None
+		self.thread = None
+		self.jsonl = None
+		self.stream = self.path = self.dump_game = None
+		self.configure(level, stream, path, game)
+
+	def configure(self, level=None, stream=None, path=None, game=None):
+		#arguments left to None keep their setting
+		if level is not None:
+			self.base_level = LEVELS[level] if isinstance(level, str) else level
+		if stream is not None:
+			self.stream = stream
+		if path is not None:
+			self.path = path
+		if game is not None:
+			self.dump_game = game
+		self.level = self.base_level
+
+	def startGame(self, number):
+		#the log of an agent's game, full dumps for one game only
+		return GameLog(self, DEBUG if number == self.dump_game else self.base_level)
+
+	def enabled(self, level):
+		return level >= self.level
+
+	def debug(self, fmt, *args):
+		if DEBUG >= self.level:
+			self._put(DEBUG, "message", fmt, args)
+
+	def info(self, fmt, *args):
+		if INFO >= self.level:
+			self._put(INFO, "message", fmt, args)
+
+	def warning(self, fmt, *args):
+		if WARNING >= self.level:
+			self._put(WARNING, "message", fmt, args)
+
+	def error(self, fmt, *args):
+		if ERROR >= self.level:
+			self._put(ERROR, "message", fmt, args)
+
+	def dump(self, level, event, data):
+		#structured data (dict, DataFrame or events), formatted by the writer
+		if level >= self.level:
+			self._put(level, event, None, data)
+
+	def _put(self, level, event, fmt, args):
+		if self.thread is None:
+			self._start()
+		self.queue.put((time.time(), level, event, fmt, args))
+
+	def _start(self):
+		self.queue = queue.Queue()
+		self.thread = threading.Thread(target=self._write, name="AgentLog")
+		self.thread.daemon = True
+		self.thread.start()
+		atexit.register(self.close)
+
+	def flush(self):
+		#returns once every record queued so far is written
+		if self.thread is not None:
+			done = threading.Event()
+			self.queue.put(done)
+			done.wait()
+
+	def close(self):
+		if self.thread is not None:
+			self.queue.put(None)
+			self.thread.join()
+			self.thread = None
+		if self.jsonl is not None:
+			self.jsonl.close()
+			self.jsonl = None
+
+	def _write(self):
+		while True:
+			record = self.queue.get()
+			if record is None:
+				break
+			if isinstance(record, threading.Event):
+				self._sink_flush()
+				record.set()
+				continue
+			try:
+				if self.path is not None:
+					self._write_jsonl(record)
+				else:
+					self._write_text(record)
+			except Exception as e:
+				sys.stderr.write("AgentLog: {0!r}\n".format(e))
+		self._sink_flush()
+
+	def _sink_flush(self):
+		if self.jsonl is not None:
+			self.jsonl.flush()
+		else:
+			(self.stream or sys.stdout).flush()
+
+	def _write_text(self, record):
+		_, level, event, fmt, args = record
+		if fmt is not None:
+			text = fmt.format(*args)
+		else:
+			text = TEXT_DUMPS.get(event, _textDump)(args)
+		(self.stream or sys.stdout).write(text + "\n")
+
+	def _write_jsonl(self, record):
+		t, level, event, fmt, args = record
+		if self.jsonl is None:
+			self.jsonl = open(self.path, "a")
+		entry = {"t": round(t, 6), "level": LEVEL_NAMES.get(level, level), "event": event}
+		if fmt is not None:
+			entry["msg"] = fmt.format(*args)
+		else:
+			entry["data"] = _jsonable(args)
+		self.jsonl.write(json.dumps(entry, separators=(',', ':'), default=str) + "\n")
+
+class GameLog(object):
+	'''
+	One agent's view of an AgentLog for a game: the same records and sinks,
+	gated at the level of that game.
+	'''
+
+	def __init__(self, log, level):
+		self.log = log
+		self.level = level
+
+	def enabled(self, level):
+		return level >= self.level
+
+	def debug(self, fmt, *args):
+		if DEBUG >= self.level:
+			self.log._put(DEBUG, "message", fmt, args)
+
+	def info(self, fmt, *args):
+		if INFO >= self.level:
+			self.log._put(INFO, "message", fmt, args)
+
+	def warning(self, fmt, *args):
+		if WARNING >= self.level:
+			self.log._put(WARNING, "message", fmt, args)
+
+	def error(self, fmt, *args):
+		if ERROR >= self.level:
+			self.log._put(ERROR, "message", fmt, args)
+
+	def dump(self, level, event, data):
+		if level >= self.level:
+			self.log._put(level, event, None, data)
+
+	def flush(self):
+		self.log.flush()
+
+def _textDump(data):
+	return json.dumps(_jsonable(data), indent=4, default=str)
+
+def _jsonable(data):
+	#DataFrames as columns, typed events as rows
+	if hasattr(data, "to_dict"):
+		return data.to_dict(orient="list")
+	if isinstance(data, list) and data and hasattr(data[0], "row"):
+		return [e.row() for e in data]
+	return data
+
+TEXT_DUMPS = {
+	"base_info": lambda data: "Base Info:\n" + json.dumps(data, indent=4),
+	"game_setting": lambda data: "Game Setting:\n" + json.dumps(data, indent=4),
+	"diff_data": lambda data: "Diff Data:\n" + tabulate(data, headers='keys', tablefmt='psql')
+		if hasattr(data, "to_dict") else "Diff Data:\n" + "\n".join(str(e.row()) for e in data),
+}
+
+LOG = AgentLog(os.environ.get("LOUPGAROU_LOG", "info").lower(), path=os.environ.get("LOUPGAROU_LOG_FILE"),
+	game=int(os.environ["LOUPGAROU_LOG_GAME"]) if os.environ.get("LOUPGAROU_LOG_GAME") else None)
+
+#dumps of the agent's input, at DEBUG of LOG or of the agent's GameLog
+def printBaseInfo(base_info, log=None):
+	log = log or LOG
+	if DEBUG >= log.level:
+		#a copy: the session replaces its values on the next request
+		log.dump(DEBUG, "base_info", dict(base_info))
+
+def printGameSetting(game_setting, log=None):
+	log = log or LOG
+	if DEBUG >= log.level:
+		log.dump(DEBUG, "game_setting", game_setting)
 		
-def printDiffData(diff_data):
-	print("Diff Data:")
-	print(tabulate(diff_data, headers='keys', tablefmt='psql'))
+def printDiffData(diff_data, log=None):
+	log = log or LOG
+	if DEBUG >= log.level:
+		log.dump(DEBUG, "diff_data", diff_data)
 
 def getTimeStamp():
 	return time.strftime('%l:%M:%S%p')
@@ -12,23 +12,55 @@ from __future__ import print_function, division
 import time
 import aiwolfpy
 import aiwolfpy.contentbuilder as cb
+import aiwolfpy.scoring
+import aiwolfpy.priors
+import aiwolfpy.params
+import aiwolfpy.profiling
+from aiwolfpy.profiling import spanned
+from aiwolfpy.latency import LatencyHistogram
+from aiwolfpy.features import IncrementalFeatures
 
 
 import random
 import optparse
 import numpy as np
 import sys
-import re
 
 from utility import *
 from parsing import *
+from conflicts import ConflictGraph
+from inference import RoleInference, CLAIMED_ROLES
+from montecarlo import MonteCarloSearch
+import endgame
 
 class SampleAgent(object):
 
-    def __init__(self, agent_name):
+    def __init__(self, agent_name, search_workers=0, scorer=None, priors=None, params=None):
         self.myname = agent_name
 
+        # tunable constants (aiwolfpy.params), a dict or AgentParams, None for the defaults
+        if params is None or isinstance(params, dict):
+            params = aiwolfpy.params.AgentParams(**(params or {}))
+        self.params = params
+
+        # lookahead for vote/attack/guard, kept across games (workers > 0: process pool)
+        self.search = MonteCarloSearch(workers=search_workers)
+
+        # learned suspicion model (aiwolfpy.scoring), None to use the table alone
+        self.scorer = scorer
+
+        # priors and opening book compiled from logs (aiwolfpy.priors), None for none
+        self.priors = priors
+
+        # games played, LOG dumps one of them in full if asked to
+        self.games = 0
+
+        # spans of the sampled requests, replaced by the session's profiler
+        self.profiler = aiwolfpy.profiling.OFF
+
     def initialize(self, base_info, diff_data, game_setting):
+        self.games += 1
+        self.log = LOG.startGame(self.games)
         self.id = base_info["agentIdx"] - 1
         self.base_info = base_info
         self.game_setting = game_setting
@@ -52,25 +84,44 @@ class SampleAgent(object):
 
         # table of true role for werewoolf :  villager = +100 , wol = -100
         self.true_table_role = np.zeros(num_players)
-        for i in range(len(base_info["roleMap"])):
-            role_map_idx = str(i+1)
-            if role_map_idx in base_info:
-                if base_info["roleMap"][role_map_idx] == "WEREWOLF":
-                    self.true_table_role[i] = -100
+        for i in range(num_players):
+            if base_info["roleMap"].get(str(i+1)) == "WEREWOLF":
+                self.true_table_role[i] = -100
             else:
                 self.true_table_role[i] = 100
         
         #number of werewolves
         self.ww_number = game_setting["roleNumMap"]["WEREWOLF"]
 
-        #conflict_list for pairs of players of which one is certainly a werewolf.
-        self.conflict_list = []
+        #role assignments consistent with what we know, and the marginals they give
+        self.inference = RoleInference(num_players, game_setting["roleNumMap"], self.id, self.my_role)
+        for k, role in base_info["roleMap"].items():
+            self.inference.known(int(k) - 1, role)
+        self.inference.status(base_info["statusMap"])
+        self.beliefs = None
+        #inference.version the beliefs were solved at, None to solve again
+        self.solved_version = None
+
+        #last vote each player declared today
+        self.declared_votes = {}
+
+        #day-1 choices of the opening book for our role and this setting
+        self.opening = {}
+        if self.priors is not None:
+            self.opening = self.priors.opening(num_players, game_setting["roleNumMap"], self.my_role)
+        self.opening_said = False
+
+        #(day, update, row) at which each player first claimed a role
+        self.claim_time = {}
+
+        #claimants of the same unique role, of which all but one are certainly werewolves
+        self.conflicts = ConflictGraph()
 
         #the white list is a list of players considered (not 100%) to be villagers
-        self.white_list = []
+        self.white_list = self.conflicts.white
 
         #the black list is a list of players known to be werewolves (by seeing or 'logic' deduction)
-        self.black_list = []
+        self.black_list = self.conflicts.black
 
         #ids of seer, medium, and bodyguard, None if unknown
         self.seer_id = None if base_info["myRole"] != "SEER" else self.id
@@ -81,25 +132,44 @@ class SampleAgent(object):
         # if one is suspect of being WEREWOLF, we treat his info as less valuable,
         #if one is believed to be SEER or MEDIUM, his word is worth more
         #if one is believed to be BODYGUARD, his word is worth more - since he proved it
-        self.seer_value = 2
-        self.medium_value = 2
-        self.bg_value = 1.5
-        self.suspect_value = 0.2
+        self.seer_value = self.params.seer_value
+        self.medium_value = self.params.medium_value
+        self.bg_value = self.params.bg_value
+        self.suspect_value = self.params.suspect_value
+        # how much the learned suspicion (-1..1) moves a player's score
+        self.scorer_value = 2
 
         # this variable will be used to test the claim of bodyguard
         self.no_dead = False
 
         # the seer and medium keep a list of certain villagers (known by their abilities)
-        if self.seer_id or self.medium_id:
+        if self.seer_id is not None or self.medium_id is not None:
             self.villager_list = []
 
-        printGameSetting(game_setting)
+        # last opinion of each (agent, target) pair: serial of the update that saw it
+        self.opinion_seen = np.zeros([num_players, num_players], dtype=np.int64)
+        self.update_serial = 0
+
+        # set whenever info_table, the lists or the role claims change
+        self.dirty = True
+        self.status_map = base_info.get("statusMap")
+
+        # features of the learned scorer, fed with the new rows of each update
+        self.features = IncrementalFeatures(num_players)
+
+        # cpu time spent in update, feature updates and scoring, reported at finish
+        self.update_cpu = LatencyHistogram()
+        self.feature_cpu = LatencyHistogram()
+        self.score_cpu = LatencyHistogram()
+
+        printGameSetting(game_setting, self.log)
 
     def getName(self):
         return self.myname
 
     def update(self, base_info, diff_data, request):
-        print("Executing update...")
+        start = time.thread_time()
+        self.log.debug("Executing update...")
 
         # if a day starts, check whether someone died this night
         if request == 'DAILY_INITIALIZE':
@@ -111,19 +181,47 @@ class SampleAgent(object):
                 self.no_dead = True
             else:
                 self.no_dead = False
+            self.declared_votes = {}
 
+        # deaths change which black-listed players can still be targeted
+        if base_info["statusMap"] != self.status_map:
+            self.status_map = base_info["statusMap"]
+            self.inference.status(self.status_map)
+            self.dirty = True
         self.base_info = base_info
         
-        printBaseInfo(base_info)
-        printDiffData(diff_data)
+        printBaseInfo(base_info, self.log)
+        printDiffData(diff_data, self.log)
         
-        self.updateGameHistory(diff_data)
-        self.pickTarget()
+        # nothing new was said or done, only the target may need a refresh
+        if len(diff_data) > 0:
+            self.updateGameHistory(diff_data)
+            if self.scorer is not None:
+                feature_start = time.thread_time()
+                with self.profiler.span("features"):
+                    self.features.update(diff_data)
+                self.feature_cpu.record(time.thread_time() - feature_start)
+                self.dirty = True
+        self.refreshTarget()
+
+        self.update_cpu.record(time.thread_time() - start)
+
+    #recompute the target only if something it depends on changed,
+    #and the beliefs only if a fact of the inference did (or the last solve was cut short)
+    def refreshTarget(self):
+        if self.dirty:
+            if self.solved_version != self.inference.version:
+                with self.profiler.span("inference"):
+                    self.beliefs = self.inference.solve(getattr(self, "deadline", None))
+                exact = self.beliefs is None or self.beliefs.exact
+                self.solved_version = self.inference.version if exact else None
+            self.pickTarget()
+            self.dirty = False
 
 
     #picks a target based on black list and the table heuristics
     def pickTarget(self):
-        print("Executing pickTarget...")
+        self.log.debug("Executing pickTarget...")
         
         if self.my_role == "WEREWOLF":
             self.setTarget(self.minimal_score(isWerewolf=True))
@@ -131,88 +229,116 @@ class SampleAgent(object):
             #if i have someone on my black list, choose him as target
             living_wws = [w for w in self.black_list if self.base_info["statusMap"][str(w+1)] == "ALIVE"]
             if len(living_wws) > 0:
-                self.setTarget(living_wws[0])
-            else:
-                self.setTarget(self.minimal_score())
+                self.setTarget(living_wws[0] + 1)
+                return
+            #or someone who is a werewolf in every consistent role assignment,
+            # which a solve cut short by the deadline cannot tell
+            if self.beliefs is not None and self.beliefs.exact and self.my_role != "POSSESSED":
+                certain = [i for i in self.livingOthers() if self.beliefs.p("WEREWOLF", i) >= 1]
+                if certain:
+                    self.setTarget(certain[0] + 1)
+                    return
+            self.setTarget(self.minimal_score())
+
+    #living players other than me
+    def livingOthers(self):
+        return [i for i in range(self.num_players)
+                if i != self.id and self.base_info["statusMap"][str(i+1)] == "ALIVE"]
+
+    #the same as a mask over the players
+    def livingMask(self):
+        mask = np.zeros(self.num_players, dtype=bool)
+        mask[self.livingOthers()] = True
+        return mask
                 
 
+    @spanned("minimal_score")
     def minimal_score(self, isSeer=False, isWerewolf=False):
 
-        # we use a copy so that if the value of some player changes we still have the information
-        table = np.copy(self.info_table)
+        # the table itself is never modified, only weighted
+        table = self.info_table
         
         if isWerewolf:
-            wolfscore = np.zeros(self.num_players)
             #calculate the difference between estimation of a player and the reality 
-            for i in range(self.num_players):
-                if self.true_table_role[i] == -100:
-                    wolfscore[i] = np.inf
-                else:
-                    for j in range(self.num_players):
-                        wolfscore[i] += np.abs(self.true_table_role[j] - table[j][i])
-            
+            wolfscore = np.abs(self.true_table_role[:, None] - table).sum(axis=0)
+            wolfscore[self.true_table_role == -100] = np.inf
+            wolfscore[~self.livingMask()] = np.inf
             
             return np.argmin(wolfscore) + 1
         
-        #all the members in conflict are suspect to be werewolves
-        suspects_list = set([y for x in self.conflict_list for y in x])
-                            
-        #give the columns weights based on the identity of players (seer/medium/suspected as werewolf...)
-        for i in range(table.shape[1]):
-            if i == self.seer_id:
-                table[:,i] = self.seer_value * table[:,i]
-            if i == self.medium_id:
-                table[:,i] = self.medium_value * table[:,i]
-            if i == self.bg_id:
-                table[:,i] = self.bg_value * table[:,i]
-            if i in self.black_list:
-                table[:,i] = -1 * table[:,i]
-                continue
-            if i in suspects_list:
-                table[:,i] = self.suspect_value * table[:,i]
-
         #pick as target the player with lowest score
-        scores = np.sum(table, axis=1)
+        # (row sums in the same order as weighting column by column, so ties break the same way)
+        scores = (table * self.column_weights()).sum(axis=1)
 
         #those in white_list are considered as probably villagers
-        for i in self.white_list:
-            scores[i] *= 1.4
+        if self.white_list:
+            scores[self.white_list] *= self.params.white_value
+
+        #the learned scorer lowers the score of those it suspects
+        if self.scorer is not None:
+            scores -= self.scorer_value * self.suspicion()
 
         #if we are seer, we check for the player of which we have the least info
         if isSeer:
             scores = np.absolute(scores)
 
         #the possessed inverses the information of other villagers - tries to kill villagers
+        # (never myself, nor the dead)
         if self.base_info["myRole"] == "POSSESSED":
-            # avoid voting for myself
-            scores[self.id - 1] = np.min(scores) - 1
+            return np.argmax(np.where(self.livingMask(), scores, -np.inf)) + 1
 
-            return np.argmax(scores) + 1
+        return np.argmin(np.where(self.livingMask(), scores, np.inf)) + 1
 
+    #learned suspicion of each player, -1 (human) to 1 (werewolf)
+    def suspicion(self):
+        start = time.thread_time()
+        p = self.scorer.score(self.features.vector())
+        self.score_cpu.record(time.thread_time() - start)
+        return 2 * p - 1
 
-        # avoid voting for myself
-        scores[self.id - 1] = np.max(scores) + 1
+    def column_weights(self):
+        '''
+        weight of the information given by each player (column of info_table),
+        based on the identity of players (seer/medium/suspected as werewolf...)
+        '''
+        weights = [1.0] * self.num_players
+        for role_id, value in ((self.seer_id, self.seer_value), (self.medium_id, self.medium_value),
+                               (self.bg_id, self.bg_value)):
+            if role_id is not None and role_id >= 0:
+                weights[role_id] *= value
 
-        return np.argmin(scores) + 1
+        #those in black list are werewolves, their word counts as the opposite
+        for i in self.black_list:
+            weights[i] = -weights[i]
+        #all the members of an unresolved conflict are suspect to be werewolves
+        for i in self.conflicts.suspects():
+            weights[i] *= self.suspect_value
+        return np.array(weights)
 
 
     def dayStart(self):
 
-        print("Executing dayStart...")
-        self.pickTarget()
+        self.log.debug("Executing dayStart...")
+        self.refreshTarget()
 
     def talk(self):
-        print("Executing talk...")
+        self.log.debug("Executing talk...")
 
         #the probability will be used to return different talks
         p = np.random.uniform()
+        params = self.params
+
+        #on day 1, claim what the opening book says players of our role claimed
+        if self.base_info["day"] == 1 and not self.opening_said and self.opening.get("TALK", -1) >= 0:
+            self.opening_said = True
+            return cb.comingout(self.id + 1, aiwolfpy.priors.ROLES[self.opening["TALK"]])
         
         if self.my_role == "WEREWOLF":
             #with proba , estimate our target as wolf ,with proba q comingout target as wolf, 1-p-q skip talking 
-            if p < .35:     
+            if p < params.wolf_estimate_p:
                 talk = cb.estimate(self.current_target, "WEREWOLF")
             #if we're sure - comingout
-            elif p > .6:
+            elif p > params.wolf_comingout_p:
                 talk = cb.comingout(self.current_target, "WEREWOLF")
             else: #skip
                 talk = cb.skip()
@@ -224,13 +350,13 @@ class SampleAgent(object):
             
             #if we know more than half of the werewolves, reveal one of them
             if len(werewolves) >= 0.5 * self.ww_number:
-                if p < 0.3 and len(self.villager_list) > 0:
-                    return cb.divined(random.choice(self.villager_list), "VILLAGER")
+                if p < params.reveal_villager_p and len(self.villager_list) > 0:
+                    return cb.divined(random.choice(self.villager_list) + 1, "HUMAN")
                 living_ww = [x for x in werewolves if self.base_info["statusMap"][str(x+1)] == "ALIVE"]
                 if len(living_ww) > 0:
-                    return cb.divined(random.choice(living_ww), "WEREWOLF")
+                    return cb.divined(random.choice(living_ww) + 1, "WEREWOLF")
                 elif self.medium_id == self.id:
-                    return cb.identified(random.choice(werewolves), "WEREWOLF")
+                    return cb.identified(random.choice(werewolves) + 1, "WEREWOLF")
                 else:
                     pass
 
@@ -239,114 +365,250 @@ class SampleAgent(object):
             return cb.guarded(self.guarded)
             
         #if we're not sure our target is a werewolf - estimate
-        if p > 0.3:
-            if not self.current_target in self.black_list:     
+        if p > params.estimate_p:
+            if not self.current_target - 1 in self.black_list:
                 talk = cb.estimate(self.current_target, "WEREWOLF")
             #if we're sure - comingout
             else:
                 talk = cb.comingout(self.current_target, "WEREWOLF")
         # estimate someone as villlager
-        elif p < 0.1 and self.white_list:
-            talk = cb.estimate(random.choice(self.white_list), "VILLAGER")
+        elif p < params.estimate_villager_p and self.white_list:
+            talk = cb.estimate(random.choice(self.white_list) + 1, "VILLAGER")
         # present ourselves  as villager
         else:
-            talk = cb.comingout(self.id, "VILLAGER")
+            talk = cb.comingout(self.id + 1, "VILLAGER")
 
         return talk
 
     def whisper(self):
-        print("Executing whisper...")
+        self.log.debug("Executing whisper...")
         selected = self.current_target
-        print("Whispering request against current target: "+str(selected))
+        self.log.debug("Whispering request against current target: {0}", selected)
         return cb.request(cb.attack(selected))
     
     def vote(self):
-        return self.current_target
+        selected = self.endgameTarget("VOTE", self.livingOthers())
+        if selected is None:
+            selected = self.searchTarget("VOTE", self.livingOthers())
+        return selected if selected is not None else self.current_target
 
     def attack(self):
-        print("Executing attack...")
-        selected = self.current_target
-        print("Attacking current target: "+str(selected)) 
+        self.log.debug("Executing attack...")
+        #attack a living player who is not a fellow werewolf
+        candidates = [i for i in self.livingOthers() if self.true_table_role[i] != -100]
+        selected = self.endgameTarget("ATTACK", candidates)
+        if selected is None:
+            selected = self.searchTarget("ATTACK", candidates)
+        if selected is None:
+            selected = self.current_target
+        self.log.debug("Attacking current target: {0}", selected)
         return selected
+
+    #exact lookahead over the remaining executions and attacks once few players are left
+    def endgameTarget(self, request, candidates):
+        living = [i for i in range(self.num_players) if self.base_info["statusMap"][str(i+1)] == "ALIVE"]
+        #the lookahead weighs every consistent world, a partial enumeration would bias it
+        if self.beliefs is None or not self.beliefs.exact or len(living) > endgame.ENDGAME_ALIVE:
+            return None
+        worlds = {}
+        for wolves, _, completion in self.beliefs.support:
+            mask = sum(1 << i for i in wolves)
+            worlds[mask] = worlds.get(mask, 0) + completion[0]
+        #the seer divines for the village, hidden if it is us, confirmed if uncontested
+        if self.my_role == "SEER":
+            seer_agent, seer = self.id, endgame.HIDDEN_SEER
+        elif self.seer_id not in [None, -1]:
+            seer_agent, seer = self.seer_id, endgame.CONFIRMED_SEER
+        else:
+            seer_agent, seer = None, endgame.NO_SEER
+        selected, values = endgame.decide(request, worlds, sum(1 << i for i in living), candidates,
+                                          known_wolves=sum(1 << i for i in self.black_list),
+                                          known_humans=sum(1 << i for i in self.white_list),
+                                          seer_agent=seer_agent, seer=seer,
+                                          village=self.my_role not in ["WEREWOLF", "POSSESSED"])
+        if selected is None:
+            return None
+        if self.log.enabled(DEBUG):
+            self.log.debug("Endgame values: {0}", ", ".join("{0}:{1:.3f}".format(c + 1, v) for c, v in zip(candidates, values)))
+        return selected + 1
+
+    #Monte Carlo lookahead over the role assignments we still believe possible
+    @spanned("search")
+    def searchTarget(self, request, candidates):
+        alive = [self.base_info["statusMap"][str(i+1)] == "ALIVE" for i in range(self.num_players)]
+        selected = self.search.decide(request, self.inference, self.beliefs, alive, candidates,
+                                      self.voteProbs(), getattr(self, "deadline", None))
+        if selected is None:
+            return None
+        self.log.debug("Searched {0} samples in {1:.1f} ms", self.search.samples, self.search.elapsed * 1000)
+        return selected + 1
+
+    #night-1 target from the opening book: a seer claimant, another claimant or a silent player
+    def openingTarget(self, decision, candidates):
+        option = self.opening.get(decision)
+        if option is None or self.base_info["day"] != 1:
+            return None
+        if option == aiwolfpy.priors.SILENT:
+            pool = [i for i in candidates if i not in self.claim_time]
+            return random.choice(pool) if pool else None
+        if option == aiwolfpy.priors.SEER_CLAIM:
+            pool = [i for i in self.claimants("SEER") if i in candidates]
+        else:
+            pool = [i for i in candidates if i in self.inference.claims]
+        if not pool:
+            return None
+        #divine the claimant least likely genuine, guard the most likely
+        if decision == "DIVINE":
+            return min(pool, key=self.genuineness)
+        return max(pool, key=self.genuineness)
+
+    #claimants of a role, in the order of their claims
+    def claimants(self, role):
+        bit = 1 << CLAIMED_ROLES.index(role)
+        claimed = [i for i, roles in self.inference.claims.items() if roles & bit]
+        return sorted(claimed, key=lambda i: self.claim_time.get(i, (0,)))
+
+    #prior probability that a claimant holds one of the roles he claimed
+    def genuineness(self, agent):
+        best = 0.0
+        for role in aiwolfpy.priors.SPECIAL:
+            if self.inference.claims.get(agent, 0) & 1 << CLAIMED_ROLES.index(role):
+                order = self.claimants(role).index(agent) + 1
+                best = max(best, self.priors.genuine(role, self.claim_time.get(agent, (1,))[0], order))
+        return best
+
+    #probability of each player's vote (rows), most of it on his declared vote
+    def voteProbs(self):
+        n = self.num_players
+        probs = np.ones([n, n]) / (n - 1)
+        np.fill_diagonal(probs, 0)
+        for agent, target in self.declared_votes.items():
+            probs[agent] *= 0.2
+            probs[agent][target] += 0.8
+        return probs
     
     def divine(self):
-        print("Executing divine...")
+        self.log.debug("Executing divine...")
+        target = self.openingTarget("DIVINE", [i for i in self.livingOthers() if i not in self.divine_map])
+        if target is not None:
+            return target + 1
+        #the player most likely to be a werewolf among those not divined yet
+        if self.beliefs is not None:
+            target = self.beliefs.most_likely("WEREWOLF", [i for i in self.livingOthers() if i not in self.divine_map])
+            if target is not None:
+                return target + 1
         target = self.minimal_score(isSeer=True)
         return target
 
     def guard(self):
-        print("Executing guard randomly...")
+        self.log.debug("Executing guard randomly...")
+
+        target = self.openingTarget("GUARD", self.livingOthers())
+        if target is not None:
+            self.guarded = target + 1
+            return self.guarded
+
+        selected = self.searchTarget("GUARD", self.livingOthers())
+        if selected is not None:
+            self.guarded = selected
+            return self.guarded
+
+        # protect the player most likely to be the genuine seer or medium
+        if self.beliefs is not None:
+            living = self.livingOthers()
+            if living:
+                self.guarded = max(living, key=lambda i: self.beliefs.p("SEER", i) + self.beliefs.p("MEDIUM", i)) + 1
+                return self.guarded
 
         # if there's an uncontested seer, protect him
         if self.seer_id not in [None, -1]:
-            self.guarded = self.seer_id
+            self.guarded = self.seer_id + 1
 
         # if there's an uncontested medium, protect him
         elif self.medium_id not in [None, -1]:
-            self.guarded = self.medium_id
+            self.guarded = self.medium_id + 1
         
         else:
             # protect myself
-            self.guarded = self.id
+            self.guarded = self.id + 1
         
         return self.guarded
     
     def finish(self):
-        print("Executing finish...")
-
+        self.log.debug("Executing finish...")
+        cpu = self.update_cpu
+        self.log.info("update cpu time (ms): n={0} mean={1:.3f} p50={2:.3f} p99={3:.3f} max={4:.3f}",
+            cpu.total, cpu.mean() / 1000.0, cpu.percentile(50) / 1000.0, cpu.percentile(99) / 1000.0, cpu.max / 1000.0)
+        if self.scorer is not None:
+            for name, cpu in (("feature update", self.feature_cpu), ("scoring", self.score_cpu)):
+                self.log.info("{0} cpu time (ms): n={1} mean={2:.3f} p99={3:.3f} (timeLimit {4} ms)",
+                    name, cpu.total, cpu.mean() / 1000.0, cpu.percentile(99) / 1000.0,
+                    self.game_setting.get("timeLimit", -1))
+        table = endgame.TABLE
+        self.log.info("endgame table: {0} states, {1} hits, {2} misses", len(table), table.hits, table.misses)
+        #the game's records are out before the next game starts
+        self.log.flush()
+
+    @spanned("updateGameHistory")
     def updateGameHistory(self, diff_data):
         '''
         if a player changes his mind about someone during talk, we need to know that.
         Therefore, we scan the talks in reversed order, and keep only the last opinion
         '''
-        checked_pairs = []
-        for row in reversed(list(diff_data.itertuples())):
-            agent = getattr(row, "agent") - 1
-            text = getattr(row, "text")
-            talk_type = getattr(row, "type")
+        self.update_serial += 1
+        serial = self.update_serial
+        seen = self.opinion_seen
+        voted = set()
+        agents = diff_data["agent"].tolist()
+        texts = diff_data["text"].tolist()
+        types = diff_data["type"].tolist()
+        for i in range(len(agents) - 1, -1, -1):
+            agent = agents[i] - 1
+            text = texts[i]
+            talk_type = types[i]
 
             #SEER updates his werewolves and villagers' lists, based on the divine info
             if talk_type == "divine":
-                match = re.match(RE_DIVINED, text)
-                if match is None:
+                utterance = parse_utterance(text)
+                if utterance is None or utterance.verb != "DIVINED" or utterance.target == ANY:
                     continue
                 
-                target_role = match.group("species")
-                target = match.group("target")
-                
-                target_id_match = re.match(RE_AGENT_GROUP, target)
-                if target_id_match is None:
-                    continue
-                target_id = int(target_id_match.group("id")) - 1
+                target_role = utterance.species
+                target_id = utterance.target - 1
 
                 self.divine_map[target_id] = target_role
                 
-                if target_role == "VILLAGER":
+                if target_role == "HUMAN":
                     self.villager_list.append(target_id)
                 else:
-                    self.black_list.append(target_id)
+                    self.conflicts.mark_black(target_id)
+                self.inference.species(target_id, target_role)
+                self.dirty = True
                 continue
 
             #MEDIUM updates his werewolves and villagers' lists, based on the divine info
             if talk_type == "identify":
-                match = re.match(RE_IDENTIFIED, text)
-                if match is None:
+                utterance = parse_utterance(text)
+                if utterance is None or utterance.verb != "IDENTIFIED" or utterance.target == ANY:
                     continue
                 
-                target_role = match.group("species")
-                target = match.group("target")
-                
-                target_id_match = re.match(RE_AGENT_GROUP, target)
-                if target_id_match is None:
-                    continue
-                target_id = int(target_id_match.group("id")) - 1
+                target_role = utterance.species
+                target_id = utterance.target - 1
 
                 self.divine_map[target_id] = target_role
                 
-                if target_role == "VILLAGER":
+                if target_role == "HUMAN":
                     self.villager_list.append(target_id)
                 else:
-                    self.black_list.append(target_id)
+                    self.conflicts.mark_black(target_id)
+                self.inference.species(target_id, target_role)
+                self.dirty = True
+                continue
+
+            #attacked players are not werewolves
+            if talk_type == "dead":
+                self.inference.attacked(agent)
+                self.dirty = True
                 continue
 
             #if it's our talking, we don't need to analyze it
@@ -357,62 +619,65 @@ class SampleAgent(object):
             target_role = None
             
             #find the target of sentence
-            match = None
-            if "ESTIMATE" in text:
-                match = re.match(RE_ESTIMATE, text[text.index("ESTIMATE"):])
-            elif "VOTE" in text:
-                match = re.match(RE_VOTE, text[text.index("VOTE"):])
-            elif "COMINGOUT" in text:
-                match = re.match(RE_COMINGOUT, text[text.index("COMINGOUT"):])
-            elif "DIVINED" in text:
-                match = re.match(RE_DIVINED, text[text.index("DIVINED"):])
-            elif "IDENTIFIED" in text:
-                match = re.match(RE_IDENTIFIED, text[text.index("IDENTIFIED"):])
-            elif "GUARDED" in text:
-                match = re.match(RE_GUARDED, text[text.index("GUARDED"):])
-            else:
+            match = talk_sentence(text)
+            if match is None or match.target == ANY:
                 continue
-            
-            if match is None:
-                continue
-                
-            target_role = match.group("role") if "role" in match.groupdict() else None
-            target = match.group("target")
-            
-            target_id_match = re.match(RE_AGENT_GROUP, target)
-            if target_id_match is None:
-                continue
-            target_id = int(target_id_match.group("id")) - 1
+            verb = match.verb
+            target_role = match.role
+            target_id = match.target - 1
+
+            #claims and reported results are facts for the inference, even if said again later
+            if verb == "DIVINED":
+                self.inference.report(agent, target_id, match.species, "SEER")
+            elif verb == "IDENTIFIED":
+                self.inference.report(agent, target_id, match.species, "MEDIUM")
+            elif verb == "GUARDED":
+                self.inference.claim(agent, "BODYGUARD")
+            elif verb == "COMINGOUT" and target_id == agent:
+                self.inference.claim(agent, target_role)
+            #talks are read backwards, so the first vote met is the latest
+            elif verb == "VOTE" and agent not in voted:
+                voted.add(agent)
+                self.declared_votes[agent] = target_id
+            #talks are read backwards, keep the earliest claim
+            if agent in self.inference.claims:
+                claimed = (self.base_info["day"], serial, i)
+                self.claim_time[agent] = min(self.claim_time.get(agent, claimed), claimed)
 
             #if we already saw the last things the agent had to say about the target,
             # no need to read previous talks
-            if [agent, target_id] in checked_pairs:
+            if seen[agent, target_id] == serial:
                 continue
             #if this is the 'last word' of the agent about the target, keep processing it
             else:
-                checked_pairs.append([agent, target_id])
-
-            if target != "ANY":
-                # this variable says whether we are unjustly targeted
-                if "ESTIMATE" in text or "DIVINED" in text:
-                    # Check if we're being accused of a role we are not
-                    lie = (target_id == self.id and self.base_info["myRole"] != target_role)
-                elif "VOTE" in text or "COMINGOUT" in text:
-                    # Check if we're being voted
-                    lie = target_id == self.id
+                seen[agent, target_id] = serial
+            self.dirty = True
+
+            # this variable says whether we are unjustly targeted
+            lie = False
+            if verb == "ESTIMATE":
+                # Check if we're being accused of a role we are not
+                lie = (target_id == self.id and self.base_info["myRole"] != target_role)
+            elif verb == "DIVINED":
+                # or divined of a species we are not
+                lie = (target_id == self.id and (match.species == "WEREWOLF") != (self.my_role == "WEREWOLF"))
+            elif verb == "VOTE" or verb == "COMINGOUT":
+                # Check if we're being voted
+                lie = target_id == self.id
                         
-            #we give 0.5 point for estimates - positive for "villager", negative for "werewolf"
-            if "ESTIMATE" in text and not lie:
+            #we give estimate_weight (0.5) points for estimates - positive for "villager", negative for "werewolf"
+            estimate, point = self.params.estimate_weight, self.params.vote_weight
+            if verb == "ESTIMATE" and not lie:
                 #add to score of the target the value we accord to seer
-                self.info_table[target_id][agent] += 0.5 if target_role == "VILLAGER" else -0.5
+                self.info_table[target_id][agent] += estimate if target_role == "VILLAGER" else -estimate
 
-            #we give 1 point for votes - positive for "villager", negative for "werewolf"
-            elif ("VOTE" in text or "COMINGOUT" in text) and not lie:
+            #we give vote_weight (1) points for votes - positive for "villager", negative for "werewolf"
+            elif (verb == "VOTE" or verb == "COMINGOUT") and not lie:
                 #add to score of the target the value we accord to seer
-                self.info_table[target_id][agent] += 1 if target_role == "VILLAGER" else -1
+                self.info_table[target_id][agent] += point if target_role == "VILLAGER" else -point
             
             
-            elif "DIVINED" in text:
+            elif verb == "DIVINED":
                 '''
                 Someone is pretending to be seer:
                 * if he tells about us wrong information, we know him for a werewolf
@@ -424,45 +689,40 @@ class SampleAgent(object):
                 if self.seer_id == self.id or lie:
                     if self.seer_id == agent:
                         self.seer_id = None
-                        self.seer_value = 2
-                    self.black_list.append(agent)
+                        self.seer_value = self.params.seer_value
+                    self.conflicts.mark_black(agent)
                 #if there's already a seer, and the current one contests him, put them in conflict
-                elif self.seer_id != agent and self.seer_id != None:
-                    self.conflict_list.append([self.seer_id, agent])
+                elif self.conflicts.claim("SEER", agent) > 1:
                     self.seer_value = 1
                     self.seer_id = -1
-                else:
-                    if self.seer_id == None:
-                        self.seer_id = agent
+                elif self.seer_id == None:
+                    self.seer_id = agent
 
-                #add to score of the target the value we accord to seer
-                self.info_table[target_id][agent] += 1 if target_role == "VILLAGER" else -1
+                #add to score of the target the value we accord to seer, by the species he reports
+                self.info_table[target_id][agent] += point if match.species == "HUMAN" else -point
 
 
             # medium works like seer approximately
-            elif "IDENTIFIED" in text:
+            elif verb == "IDENTIFIED":
                 if self.medium_id == self.id:
-                    self.black_list.append(agent)
-                elif self.medium_id != agent and self.medium_id != None:
-                    self.conflict_list.append([self.medium_id, agent])
+                    self.conflicts.mark_black(agent)
+                elif self.conflicts.claim("MEDIUM", agent) > 1:
                     self.medium_value = 1
                     self.medium_id = -1
-                else:
-                    if self.medium_id == None:
-                        self.medium_id = agent
+                elif self.medium_id == None:
+                    self.medium_id = agent
 
-                #add to score of the target the value we accord to seer
-                self.info_table[target_id][agent] += 1 if target_role == "VILLAGER" else -1
+                #add to score of the target the value we accord to seer, by the species he reports
+                self.info_table[target_id][agent] += point if match.species == "HUMAN" else -point
 
             # bodyguard works like seer approximately
-            elif "GUARDED" in text:
+            elif verb == "GUARDED":
                 if self.bg_id == self.id:
-                    self.black_list.append(agent)
+                    self.conflicts.mark_black(agent)
                 #if there are no dead
                 elif self.no_dead:
                     #bodyguard contested    
-                    if self.bg_id != agent and self.bg_id != None:
-                        self.conflict_list.append([self.bg_id, agent])
+                    if self.conflicts.claim("BODYGUARD", agent) > 1:
                         self.bg_value = 1
                         self.bg_id = -1
                     #bodyguard not contested
@@ -471,23 +731,8 @@ class SampleAgent(object):
                 #there were dead during night
                 else:
                     pass
-                self.info_table[target_id][agent] += 1
-            
-        self.updateConflicts()
-
-    #find conflicts that can be resolved and erase them
-    def updateConflicts(self):
-        #identify all those in conflict with werewolves as villagers
-        for ww in self.black_list:
-            for pair in self.conflict_list:
-                if ww in pair:
-                    for player in pair:
-                        if player != ww:
-                            self.white_list.append(player)
-                self.conflict_list.remove(pair)        
-            
-            
-                               
+                self.info_table[target_id][agent] += point
+
     def setTarget(self, id):
         self.current_target = id
 
@@ -505,12 +750,48 @@ def parseArgs(args):
         help="Port to connect in the server", default=None)
     parser.add_option('-r', action="store", type="string", dest="port", 
         help="Role request to the server", default=-1)
+    parser.add_option('-n', action="store", type="int", dest="agents",
+        help="Number of agents hosted in this process", default=1)
+    parser.add_option('-w', action="store", type="int", dest="workers",
+        help="Processes used by the Monte Carlo search (0: none)", default=0)
+    parser.add_option('-s', action="store", type="string", dest="scorer",
+        help="Directory of a learned suspicion scorer (aiwolfpy.scoring)", default=None)
+    parser.add_option('-b', action="store", type="string", dest="priors",
+        help="Directory of compiled priors and opening book (aiwolfpy.priors)", default=None)
+    parser.add_option('-P', action="store", type="string", dest="params",
+        help="JSON file of agent parameters (aiwolfpy.params)", default=None)
+    parser.add_option('-l', action="store", type="string", dest="log_level",
+        help="Log level: debug, info, warning, error or off", default=None)
+    parser.add_option('-L', action="store", type="string", dest="log_file",
+        help="Write the log as JSONL to this file instead of stdout", default=None)
+    parser.add_option('-G', action="store", type="int", dest="log_game",
+        help="Log this game (1 first) at debug level", default=None)
+    parser.add_option('--profile', action="store", type="string", dest="profile",
+        help="Write spans of the sampled requests to this directory at FINISH", default=None)
+    parser.add_option('--profile-format', action="store", type="string", dest="profile_format",
+        help="Spans as chrome (trace events) or collapsed (stacks)", default=None)
+    parser.add_option('--profile-sample', action="store", type="string", dest="profile_sample",
+        help="Profile one in N requests of a type, e.g. TALK=10,WHISPER=10,*=1", default=None)
+    parser.add_option('--profile-game', action="store", type="int", dest="profile_game",
+        help="Run cProfile on this game (1 first)", default=None)
     
     (opt, args) = parser.parse_args()
     if opt.hostname == None or opt.port == -1:
         parser.print_help()
         sys.exit()
+    return opt
 
 if __name__ == '__main__':    
-    parseArgs(sys.argv[1:])
-    aiwolfpy.connect_parse(SampleAgent("loupgarou"))
+    opt = parseArgs(sys.argv[1:])
+    LOG.configure(opt.log_level, path=opt.log_file, game=opt.log_game)
+    aiwolfpy.profiling.configure(opt.profile, opt.profile_format, opt.profile_sample, opt.profile_game)
+    # memory-mapped, shared by every seat of the process
+    scorer = aiwolfpy.scoring.load_scorer(opt.scorer) if opt.scorer else None
+    priors = aiwolfpy.priors.load_priors(opt.priors) if opt.priors else None
+    params = aiwolfpy.params.load_params(opt.params) if opt.params else None
+    if opt.agents > 1:
+        # one event loop for all seats instead of one interpreter per seat
+        aiwolfpy.serve_agents([SampleAgent("loupgarou" + str(i + 1), opt.workers, scorer, priors, params)
+                               for i in range(opt.agents)])
+    else:
+        aiwolfpy.connect_parse(SampleAgent("loupgarou", opt.workers, scorer, priors, params))